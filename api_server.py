@@ -1,11 +1,12 @@
 from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse
 from haystack.dataclasses import StreamingChunk
 from openai.types.chat import ChatCompletionChunk
 from haystack.dataclasses.chat_message import ChatMessage
 from haystack.components.generators.openai import OpenAIGenerator
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+from contextlib import asynccontextmanager
 import os
 import asyncio
 from rag import RAGSystem
@@ -35,7 +36,14 @@ except ImportError:
 logging.getLogger("haystack").setLevel(logging.ERROR)
 logger = logging.getLogger("haystack")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 服务启动时预热浏览器池，首个请求无需等待浏览器启动
+    await request_rag.start()
+    yield
+    await request_rag.close()
+
+app = FastAPI(lifespan=lifespan)
 
 model : Optional[str] = None
 
@@ -49,22 +57,85 @@ class ChatRequest(BaseModel):
     stream: bool = False
     temperature: Optional[float] = 0.7
     max_tokens: Optional[int] = None
+    # 搜索和抓取阶段的时间预算（秒），覆盖服务默认值，0为不限制
+    latency_budget: Optional[float] = None
+    # 回答模式："full"、"fast"、"hybrid"，覆盖服务默认值
+    mode: Optional[str] = None
+
+# 长时间没有数据时发送SSE注释行，防止代理或客户端因空闲断开连接
+KEEPALIVE_INTERVAL = float(os.getenv("STREAM_KEEPALIVE_INTERVAL", 10))
+
+class ProgressEvent(str):
+    """检索阶段的进度描述，以SSE注释行发送，兼容OpenAI客户端"""
 
-async def stream_response(response_queue: asyncio.Queue[ChatCompletionChunk]):
-    while True:
-        try:
-            streaming_chunk : ChatCompletionChunk = await response_queue.get()
+async def stream_response(response_queue: asyncio.Queue, task: asyncio.Task):
+    getter: Optional[asyncio.Future] = None
+    try:
+        while True:
+            # 复用同一个get任务，超时发送保活注释时不会丢失队列中的chunk
+            if getter is None:
+                getter = asyncio.ensure_future(response_queue.get())
+            done, _ = await asyncio.wait({getter}, timeout=KEEPALIVE_INTERVAL)
+            if not done:
+                yield b": keep-alive\n\n"
+                continue
+            streaming_chunk = getter.result()
+            getter = None
             if streaming_chunk is None:  # 结束信号
                 break
+            if isinstance(streaming_chunk, ProgressEvent):
+                yield f": {streaming_chunk}\n\n".encode('utf-8')
+                continue
             json_data = streaming_chunk.model_dump(mode="json")
             logger.info(f"data: {json_data}")
             yield f"data: {json.dumps(json_data, ensure_ascii=False)}\n\n".encode('utf-8')
-        except asyncio.CancelledError:
-            break
+    finally:
+        if getter is not None:
+            getter.cancel()
+        # 客户端断开时取消仍在运行的查询
+        if not task.done():
+            task.cancel()
+
+def parse_domain_ttls(value: Optional[str]) -> Dict[str, float]:
+    """解析"wikipedia.org=86400,github.com=600"格式的按域名有效期"""
+    ttls = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        domain, _, ttl = item.partition("=")
+        ttls[domain.strip().lower()] = float(ttl)
+    return ttls
 
 # 创建该请求专用的RAG系统实例
 request_rag : Optional[RAGSystem] = None
 
+@app.get("/health")
+async def health():
+    # 嵌入模型加载完成前返回503，供负载均衡或编排系统判断是否可以转发请求
+    if request_rag is not None and request_rag.is_ready():
+        return {"status": "ok"}
+    return JSONResponse(status_code=503, content={"status": "loading"})
+
+@app.get("/stats")
+async def stats():
+    # 抓取调度器的队列深度与排队耗时
+    stats = {
+        "crawl": request_rag.fetcher.scheduler.stats(),
+        "document_store": request_rag.document_store.stats(),
+        "dedup": request_rag.dedup.stats()
+    }
+    if request_rag.search_cache is not None:
+        stats["search_cache"] = request_rag.search_cache.stats()
+    if request_rag.embedding_cache is not None:
+        stats["embedding_cache"] = request_rag.embedding_cache.stats()
+    if request_rag.local_backend is not None:
+        stats["embedding_worker"] = request_rag.local_backend.worker.stats()
+    if request_rag.answer_cache is not None:
+        stats["answer_cache"] = request_rag.answer_cache.stats()
+    if request_rag.ranker is not None:
+        stats["reranker"] = request_rag.ranker.stats()
+    return stats
+
 @app.post("/v1/chat/completions")
 async def chat_completions(request: ChatRequest):
     # 获取最后一条用户消息
@@ -79,42 +150,38 @@ async def chat_completions(request: ChatRequest):
     if request.stream:
         # 为每个请求创建独立的响应队列
         request_queue = asyncio.Queue()
-        
+        loop = asyncio.get_running_loop()
+
+        def put_threadsafe(item):
+            # 同步组件在线程池中运行，回调需切回事件循环线程入队
+            loop.call_soon_threadsafe(request_queue.put_nowait, item)
+
         # 启动后台任务处理查询
         async def process_query():
-
             try:
-                await request_rag.process_query(query, streaming_callback=lambda x: request_queue.put_nowait(x))
-                await request_queue.put(None)  # 结束信号
+                await request_rag.process_query(
+                    query,
+                    streaming_callback=put_threadsafe,
+                    progress_callback=lambda stage: put_threadsafe(ProgressEvent(stage)),
+                    latency_budget=request.latency_budget,
+                    mode=request.mode
+                )
             except Exception as e:
                 exception(e, f"Error processing query: {e}")
-                await request_queue.put(None)
-        
-        # 启动后台任务
-        loop = asyncio.get_event_loop()
+            finally:
+                put_threadsafe(None)  # 结束信号
+
+        # 启动后台任务，不等待其完成，立即返回流式响应边生成边发送
         task = loop.create_task(process_query())
-        try:
-            await task  # Wait for the task to complete
-        except Exception as e:
-            print(f"Caught exception: {e}")
-            exception(e, f"Error processing query: {e}")
-        else:
-            print("Task succeeded")
-        finally:
-            if not task.cancelled():
-                # Check for unhandled exceptions
-                if task.exception() is not None:
-                    print(f"Unhandled exception: {task.exception()}")
-        # 返回流式响应
         return StreamingResponse(
-            stream_response(request_queue),
+            stream_response(request_queue, task),
             media_type="text/event-stream",
             headers={"Transfer-Encoding":"chunked"}
         )
     
     # 非流式请求
     try:
-        result = request_rag.process_query(query)
+        result = await request_rag.process_query(query, latency_budget=request.latency_budget, mode=request.mode)
         return {
             "id": "chatcmpl-123",
             "object": "chat.completion",
@@ -144,12 +211,37 @@ if __name__ == "__main__":
     language = os.getenv("LANGUAGE")
     logger.info(f"language: {language}")
     request_rag = RAGSystem(
-        split_lines=10,
+        chunk_tokens=int(os.getenv("CHUNK_TOKENS", 400)),
+        chunk_overlap=int(os.getenv("CHUNK_OVERLAP", 50)),
+        context_tokens=int(os.getenv("CONTEXT_TOKENS", 0)) or None,
+        embed_top_m=int(os.getenv("EMBED_TOP_M", 0)) or None,
         searxng_url=os.getenv("SEARXNG_URL", "http://127.0.0.1:8080/"),
         result_per_query=5,
         model=model,
         use_siliconflow_embedder=os.getenv("USE_SILICONFLOW_EMBEDDER", "true") == "true",
-        language=language
+        language=language,
+        page_cache_dir=os.getenv("PAGE_CACHE_DIR"),
+        page_cache_ttl=float(os.getenv("PAGE_CACHE_TTL", 3600)),
+        page_cache_domain_ttls=parse_domain_ttls(os.getenv("PAGE_CACHE_DOMAIN_TTLS")),
+        page_cache_revalidate=os.getenv("PAGE_CACHE_REVALIDATE", "true") == "true",
+        search_cache_ttl=float(os.getenv("SEARCH_CACHE_TTL", 600)),
+        search_cache_dir=os.getenv("SEARCH_CACHE_DIR"),
+        embedding_cache_dir=os.getenv("EMBEDDING_CACHE_DIR"),
+        embedding_cache_size=int(os.getenv("EMBEDDING_CACHE_SIZE", 1000000)),
+        answer_cache_ttl=float(os.getenv("ANSWER_CACHE_TTL", 0)),
+        keep_documents=os.getenv("KEEP_DOCUMENTS", "false") == "true",
+        retrieval_scope=os.getenv("RETRIEVAL_SCOPE", "request"),
+        lexical_retrieval=os.getenv("LEXICAL_RETRIEVAL", "true") == "true",
+        rerank_model=os.getenv("RERANK_MODEL"),
+        rerank_top_k=int(os.getenv("RERANK_TOP_K", 3)),
+        rerank_budget=float(os.getenv("RERANK_BUDGET", 1.0)) or None,
+        vector_index=os.getenv("VECTOR_INDEX", "numpy"),
+        index_snapshot_dir=os.getenv("INDEX_SNAPSHOT_DIR"),
+        snapshot_interval=float(os.getenv("SNAPSHOT_INTERVAL", 300)),
+        min_indexed_chunks=int(os.getenv("MIN_INDEXED_CHUNKS", 0)) or None,
+        latency_budget=float(os.getenv("LATENCY_BUDGET", 0)) or None,
+        drain_share=float(os.getenv("LATENCY_DRAIN_SHARE", 0.25)),
+        mode=os.getenv("RAG_MODE", "full")
     )
 
     host = os.getenv("HOST", "127.0.0.1")
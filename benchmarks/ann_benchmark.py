@@ -0,0 +1,75 @@
+"""
+对比HnswVectorIndex与NumpyVectorIndex（精确检索）的召回率和延迟
+
+用法：
+    python benchmarks/ann_benchmark.py --size 200000 --dim 1024 --queries 200 --ef 16 32 64 128
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from custom_haystack.document_stores import NumpyVectorIndex, HnswVectorIndex
+
+
+def make_corpus(size: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """生成带簇结构的随机向量，比均匀分布更接近真实文本向量"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assignments = rng.integers(0, clusters, size)
+    return centers[assignments] + 0.3 * rng.standard_normal((size, dim)).astype(np.float32)
+
+
+def timed_search(index, queries: np.ndarray, top_k: int):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append([doc_id for doc_id, _ in index.search(query, top_k=top_k)])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, np.asarray(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.size, args.dim, args.clusters, args.seed)
+    queries = make_corpus(args.queries, args.dim, args.clusters, args.seed + 1)
+    ids = [f"doc-{i}" for i in range(args.size)]
+
+    exact = NumpyVectorIndex(dim=args.dim, initial_capacity=args.size)
+    start = time.perf_counter()
+    exact.add(ids, corpus)
+    print(f"numpy  build: {time.perf_counter() - start:.1f}s")
+    truth, latencies = timed_search(exact, queries, args.top_k)
+    print(f"numpy  exact   recall@{args.top_k}=1.000  p50={np.percentile(latencies, 50):.2f}ms  "
+          f"p99={np.percentile(latencies, 99):.2f}ms")
+
+    ann = HnswVectorIndex(dim=args.dim, initial_capacity=args.size)
+    start = time.perf_counter()
+    batch = 10000
+    for offset in range(0, args.size, batch):
+        # 分批写入，模拟摄取管道的增量插入
+        ann.add(ids[offset:offset + batch], corpus[offset:offset + batch])
+    print(f"hnsw   build: {time.perf_counter() - start:.1f}s")
+    for ef in args.ef:
+        ann.ef_search = ef
+        results, latencies = timed_search(ann, queries, args.top_k)
+        recall = np.mean([len(set(r) & set(t)) / len(t) for r, t in zip(results, truth)])
+        print(f"hnsw   ef={ef:<5d} recall@{args.top_k}={recall:.3f}  p50={np.percentile(latencies, 50):.2f}ms  "
+              f"p99={np.percentile(latencies, 99):.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ from jinja2.sandbox import SandboxedEnvironment
 from typing import List, Optional, Dict, Any, Union, Literal, Set
 from haystack import default_to_dict
 
+from custom_haystack.utils import TokenCounter
+
 logger = logging.getLogger(__name__)
 
 @component
@@ -13,6 +15,9 @@ class DocsPromptBuilder:
     搭配DocumentSplitter输出Document中的doc.meta['source_id']
     将切分的文档去重并输出索引列表
 
+    设置max_tokens时按检索分数从高到低装入网页内容，放不下的分片丢弃；
+    同一来源中split_id相邻的分片合并为一段，并去掉分片之间的重叠文本
+
     使用示例：
     ```python
     from custom_haystack.components.fetcher.url_to_markdown import URLMarkdownFetcher
@@ -45,6 +50,8 @@ class DocsPromptBuilder:
         template: str,
         required_variables: Optional[Union[List[str], Literal["*"]]] = None,
         variables: Optional[List[str]] = None,
+        max_tokens: Optional[int] = None,
+        tokenizer: Optional[str] = None,
     ):
         """
         Constructs a PromptBuilder component.
@@ -56,12 +63,17 @@ class DocsPromptBuilder:
             The variables in the default template are input for PromptBuilder and are all optional,
             unless explicitly specified.
             If an optional variable is not provided, it's replaced with an empty string in the rendered prompt.
+        :param max_tokens: 网页内容（contents）的token上限，None为不限制
+        :param tokenizer: 计算token数的HuggingFace分词器名称，None为按字符估算
 
         """
         self._template_string = template
         self._variables = variables
         self._required_variables = required_variables
         self.required_variables = required_variables or []
+        self.max_tokens = max_tokens
+        self.tokenizer = tokenizer
+        self.counter = TokenCounter(tokenizer)
 
         self._env = SandboxedEnvironment()
 
@@ -110,10 +122,90 @@ class DocsPromptBuilder:
             Serialized dictionary representation of the component.
         """
         return default_to_dict(
-            self, template=self._template_string, variables=self._variables, required_variables=self._required_variables
+            self, template=self._template_string, variables=self._variables, required_variables=self._required_variables,
+            max_tokens=self.max_tokens, tokenizer=self.tokenizer
         )
 
-    @component.output_types(prompt=str)
+    @staticmethod
+    def _join_adjacent(previous: str, current: str, max_overlap: int = 2000) -> str:
+        """合并相邻分片，去掉切分时补上的章节标题和分片之间的重叠文本"""
+        lines = current.split("\n")
+        k = 0
+        while k < len(lines) and (lines[k].startswith("#") or not lines[k].strip()):
+            k += 1
+        if k and all(line in previous for line in lines[:k] if line.strip()):
+            current = "\n".join(lines[k:])
+        tail = previous[-max_overlap:]
+        probe = current[:32]
+        pos = tail.find(probe) if probe else -1
+        while pos != -1:
+            if current.startswith(tail[pos:]):
+                return previous + current[len(tail) - pos:]
+            pos = tail.find(probe, pos + 1)
+        return f"{previous}\n{current}"
+
+    @staticmethod
+    def _contents(blocks: List[tuple]) -> str:
+        return "\n".join([f"Document <{index}>:\n{content}" for index, content in blocks])
+
+    def _pack(self, documents: List[Document]) -> Dict[str, Any]:
+        """
+        按分数装入max_tokens以内的分片，再把同一来源相邻的分片合并
+
+        每个分片按"Document <编号>:"标题和块之间的换行一起计数；合并后的contents再整体计数一次，
+        超出max_tokens时继续丢弃分数最低的分片，保证渲染出的contents不超过max_tokens
+
+        :returns: 保留的分片（按编号和split_id排序后合并）、渲染好的contents、使用和丢弃的token数
+        """
+        # 编号不会超过分片数，按最长的编号计数
+        entries = [f"Document <{len(documents)}>:\n{doc.content}\n" for doc in documents]
+        tokens = self.counter.count_many(entries)
+        # 分数相同（或没有分数）时保持检索顺序
+        order = sorted(range(len(documents)), key=lambda i: -(documents[i].score or 0.0))
+        selected, kept, used, dropped = set(), [], 0, 0
+        for i in order:
+            if self.max_tokens is None or used + tokens[i] <= self.max_tokens:
+                selected.add(i)
+                kept.append(i)
+                used += tokens[i]
+            else:
+                dropped += tokens[i]
+
+        while True:
+            groups, blocks = self._blocks(documents, selected)
+            contents = self._contents(blocks)
+            used = self.counter.count(contents) if contents else 0
+            if self.max_tokens is None or used <= self.max_tokens or not kept:
+                break
+            i = kept.pop()
+            selected.discard(i)
+            dropped += tokens[i]
+        return {"groups": groups, "blocks": blocks, "contents": contents, "used": used, "dropped": dropped}
+
+    def _blocks(self, documents: List[Document], selected: Set[int]):
+        """把保留的分片按来源分组，同一来源split_id相邻的分片合并为一段"""
+        # 编号按保留的分片在检索结果中首次出现的顺序分配
+        groups: Dict[str, Dict[str, Any]] = {}
+        for i, doc in enumerate(documents):
+            if i in selected:
+                groups.setdefault(doc.meta["source_id"], {"docs": [], "index": len(groups)})["docs"].append(doc)
+
+        blocks = []
+        for group in groups.values():
+            docs = sorted(group["docs"], key=lambda d: d.meta.get("split_id", 0))
+            content, last_split = docs[0].content, docs[0].meta.get("split_id")
+            for doc in docs[1:]:
+                split_id = doc.meta.get("split_id")
+                if last_split is not None and split_id == last_split + 1:
+                    content = self._join_adjacent(content, doc.content)
+                else:
+                    blocks.append((group["index"], content))
+                    content = doc.content
+                last_split = split_id
+            blocks.append((group["index"], content))
+        return groups, blocks
+
+    @component.output_types(prompt=str, context_tokens=int, dropped_tokens=int)
     def run(self, template: Optional[str] = None, documents: List[Document] = None, **kwargs):
         """
         Run the InMemoryEmbeddingRetriever on the given input data.
@@ -121,27 +213,24 @@ class DocsPromptBuilder:
         :param documents:
             A list of Document objects.
         :returns:
-            One Giant Document objects combined with the prompt template.
+            One Giant Document objects combined with the prompt template,
+            plus context_tokens (tokens of the rendered contents, headings and separators included, never above max_tokens)
+            and dropped_tokens (tokens of chunks left out).
 
         :raises ValueError:
             If the specified DocumentStore is not found or is not an InMemoryDocumentStore instance.
         """
         kwargs = kwargs or {}
         template_variables = {"contents": "", "references": ""}
-        source_ids_map = {}
-        index = 0
-        for doc in documents:
-            source_id = doc.meta["source_id"]
-            if source_id not in source_ids_map:
-                source_ids_map[source_id] = {"docs": [doc], "index": index}
-                index += 1
-            else:
-                source_ids_map[source_id]["docs"].append(doc)
+        packed = self._pack(documents or [])
+        source_ids_map = packed["groups"]
 
         template_variables = {**kwargs, **template_variables}
 
-        template_variables["contents"] = "\n".join([f"Document <{source_ids_map[doc.meta['source_id']]['index']}>:\n{doc.content}" for doc in documents])
+        template_variables["contents"] = packed["contents"]
         template_variables["references"] = "\n".join([f"Document <{v['index']}>[{v['docs'][0].meta['title']}]({v['docs'][0].meta['url']})" for k, v in source_ids_map.items()])
+        if packed["dropped"]:
+            logger.info(f"网页内容使用token: {packed['used']}，超出max_tokens丢弃: {packed['dropped']}")
 
         logger.info(f"template_variables: {template_variables['contents']}")
         
@@ -152,7 +241,7 @@ class DocsPromptBuilder:
             compiled_template = self._env.from_string(template)
 
         result = compiled_template.render(template_variables)
-        return {"prompt": result}
+        return {"prompt": result, "context_tokens": packed["used"], "dropped_tokens": packed["dropped"]}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,130 @@
+from haystack import component, logging
+from haystack import Document
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from .EmbeddingCache import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+
+async def _run_inner_async(embedder: Any, **kwargs) -> Dict[str, Any]:
+    """优先调用被包装组件的run_async，否则在线程池中执行run，避免阻塞事件循环"""
+    if hasattr(embedder, "run_async"):
+        return await embedder.run_async(**kwargs)
+    return await asyncio.to_thread(embedder.run, **kwargs)
+
+
+@component
+class CachedDocumentEmbedder:
+    """
+    在任意文档嵌入器前加一层EmbeddingCache，只有未命中的文档才会交给被包装的嵌入器
+
+    使用示例：
+    ```python
+    cache = EmbeddingCache("./cache/embeddings")
+    embedder = CachedDocumentEmbedder(SiliconFlowDocumentEmberdder(api_key=api_key), cache)
+    result = await embedder.run_async(documents=documents)
+    ```
+    """
+    def __init__(self, embedder: Any, cache: EmbeddingCache, model: Optional[str] = None):
+        """
+        :param embedder: 被包装的文档嵌入器
+        :param cache: 向量缓存
+        :param model: 缓存键中的模型名，默认取embedder.model
+        """
+        self.embedder = embedder
+        self.cache = cache
+        self.model = model or getattr(embedder, "model")
+
+    def warm_up(self):
+        if hasattr(self.embedder, "warm_up"):
+            self.embedder.warm_up()
+
+    async def close(self):
+        if hasattr(self.embedder, "close"):
+            await self.embedder.close()
+
+    def _lookup(self, documents: List[Document]) -> List[Document]:
+        """填充命中的向量，返回未命中的文档"""
+        embeddings = self.cache.get_many(self.model, [doc.content or "" for doc in documents])
+        misses = []
+        for doc, embedding in zip(documents, embeddings):
+            if embedding is None:
+                misses.append(doc)
+            else:
+                doc.embedding = embedding
+        logger.info(f"向量缓存命中 {len(documents) - len(misses)}/{len(documents)}")
+        return misses
+
+    def _store(self, embedded: List[Document]):
+        self.cache.put_many(self.model, [doc.content or "" for doc in embedded], [doc.embedding for doc in embedded])
+
+    @staticmethod
+    def _merge(documents: List[Document], result: Dict[str, Any]) -> Dict[str, List[Document]]:
+        # 被包装的嵌入器可能返回新的Document对象，按id回填；嵌入失败的文档单独输出
+        embedded_by_id = {doc.id: doc for doc in result["documents"] if doc.embedding is not None}
+        merged, failed = [], list(result.get("failed_documents", []))
+        failed_ids = {doc.id for doc in failed}
+        for doc in documents:
+            doc = embedded_by_id.get(doc.id, doc)
+            if doc.embedding is not None:
+                merged.append(doc)
+            elif doc.id not in failed_ids:
+                failed.append(doc)
+        return {"documents": merged, "failed_documents": failed}
+
+    @component.output_types(documents=List[Document], failed_documents=List[Document])
+    def run(self, documents: List[Document]):
+        misses = self._lookup(documents)
+        if not misses:
+            return {"documents": documents, "failed_documents": []}
+        result = self.embedder.run(documents=misses)
+        self._store([doc for doc in result["documents"] if doc.embedding is not None])
+        return self._merge(documents, result)
+
+    @component.output_types(documents=List[Document], failed_documents=List[Document])
+    async def run_async(self, documents: List[Document]):
+        misses = await asyncio.to_thread(self._lookup, documents)
+        if not misses:
+            return {"documents": documents, "failed_documents": []}
+        result = await _run_inner_async(self.embedder, documents=misses)
+        await asyncio.to_thread(self._store, [doc for doc in result["documents"] if doc.embedding is not None])
+        return self._merge(documents, result)
+
+
+@component
+class CachedTextEmbedder:
+    """
+    在任意文本嵌入器前加一层EmbeddingCache，重复的查询无需再次嵌入
+
+    查询向量存放在缓存中单独的有界存储，不占用文档向量的容量
+    """
+    def __init__(self, embedder: Any, cache: EmbeddingCache, model: Optional[str] = None):
+        self.embedder = embedder
+        self.cache = cache
+        self.model = model or getattr(embedder, "model")
+
+    def warm_up(self):
+        if hasattr(self.embedder, "warm_up"):
+            self.embedder.warm_up()
+
+    async def close(self):
+        if hasattr(self.embedder, "close"):
+            await self.embedder.close()
+
+    @component.output_types(embedding=List[float])
+    def run(self, text: str):
+        embedding = self.cache.get_many(self.model, [text], query=True)[0]
+        if embedding is None:
+            embedding = self.embedder.run(text=text)["embedding"]
+            self.cache.put_many(self.model, [text], [embedding], query=True)
+        return {"embedding": embedding}
+
+    @component.output_types(embedding=List[float])
+    async def run_async(self, text: str):
+        embedding = (await asyncio.to_thread(self.cache.get_many, self.model, [text], True))[0]
+        if embedding is None:
+            embedding = (await _run_inner_async(self.embedder, text=text))["embedding"]
+            await asyncio.to_thread(self.cache.put_many, self.model, [text], [embedding], True)
+        return {"embedding": embedding}
@@ -0,0 +1,224 @@
+from haystack import logging
+import hashlib
+import json
+import os
+import re
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class _ModelVectors:
+    """
+    单个模型的向量文件
+
+    - vectors.bin：按行存放的定长向量，用np.memmap映射，容量不足时翻倍扩展，最多max_entries行
+    - index.tsv：追加写入的"文本哈希\\t行号"，启动时读入内存字典；同一行号以最后一次登记为准
+    - meta.json：向量维度和数据类型
+
+    写满max_entries行后按写入顺序循环复用，覆盖最旧的向量；index.tsv的行数超过存活条目数的两倍时重写
+    """
+    def __init__(self, path: str, dim: int, dtype: str, initial_capacity: int, max_entries: int):
+        self.path = path
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.max_entries = max_entries
+        self.index: Dict[str, int] = {}
+        self._row_keys: Dict[int, str] = {}
+        # 下一个写入的行号，写满后回到0
+        self._next_row = 0
+        self._log_lines = 0
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.bin")
+        self._index_path = os.path.join(path, "index.tsv")
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"dim": dim, "dtype": self.dtype.name}, f)
+        if os.path.exists(self._index_path):
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) == 2 and int(parts[1]) < max_entries:
+                        self._assign(parts[0], int(parts[1]))
+                        self._next_row = (int(parts[1]) + 1) % max_entries
+                        self._log_lines += 1
+        row_bytes = self.dim * self.dtype.itemsize
+        existing = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+        used = max(self._row_keys, default=-1) + 1
+        self.capacity = min(max(existing, initial_capacity, used), max_entries)
+        self._resize(self.capacity)
+        self._index_file = open(self._index_path, "a", encoding="utf-8")
+
+    @property
+    def count(self) -> int:
+        return len(self.index)
+
+    @classmethod
+    def open_existing(cls, path: str, initial_capacity: int, max_entries: int) -> Optional["_ModelVectors"]:
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(path, meta["dim"], meta["dtype"], initial_capacity, max_entries)
+
+    def _assign(self, key: str, row: int):
+        """登记key在row，覆盖该行原来的key以及key原来的行"""
+        old_key = self._row_keys.get(row)
+        if old_key is not None:
+            del self.index[old_key]
+        old_row = self.index.get(key)
+        if old_row is not None:
+            del self._row_keys[old_row]
+        self.index[key] = row
+        self._row_keys[row] = key
+
+    def _resize(self, capacity: int):
+        size = capacity * self.dim * self.dtype.itemsize
+        with open(self._vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self.capacity = capacity
+        self.vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+
+    def append(self, key: str, vector: Sequence[float]):
+        row = self._next_row
+        if row >= self.capacity:
+            self.vectors.flush()
+            self._resize(min(self.capacity * 2, self.max_entries))
+        self.vectors[row] = np.asarray(vector, dtype=self.dtype)
+        self._assign(key, row)
+        self._next_row = (row + 1) % self.max_entries
+        # 向量写入后再记录索引，进程中断时最多丢失未登记的行
+        self._index_file.write(f"{key}\t{row}\n")
+        self._log_lines += 1
+        if self._log_lines > 2 * max(len(self.index), 1024):
+            self._compact_log()
+
+    def _compact_log(self):
+        """按写入顺序（从最旧的行开始）重写index.tsv，最后一行仍是最新写入的行"""
+        self._index_file.close()
+        rows = sorted(self._row_keys, key=lambda row: (row - self._next_row) % self.max_entries)
+        with open(f"{self._index_path}.tmp", "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(f"{self._row_keys[row]}\t{row}\n")
+        os.replace(f"{self._index_path}.tmp", self._index_path)
+        self._log_lines = len(rows)
+        self._index_file = open(self._index_path, "a", encoding="utf-8")
+
+    def flush(self):
+        self.vectors.flush()
+        self._index_file.flush()
+
+    def close(self):
+        self.flush()
+        self._index_file.close()
+
+
+class EmbeddingCache:
+    """
+    持久化的向量缓存，键为(模型名, 文本sha256)
+
+    每个模型一个目录，向量以float16（或float32）紧凑存放在内存映射文件中，
+    同一页面短时间内再次被抓取时只需嵌入未命中的分片。
+    每个模型最多保存max_entries个文档向量，超出后覆盖最旧的；查询向量（query=True）
+    存放在单独的目录，上限为max_query_entries，不会挤掉文档向量。
+
+    使用示例：
+    ```python
+    cache = EmbeddingCache("./cache/embeddings")
+    embeddings = cache.get_many("BAAI/bge-m3", ["文本1", "文本2"])
+    misses = [i for i, e in enumerate(embeddings) if e is None]
+    cache.put_many("BAAI/bge-m3", [texts[i] for i in misses], new_embeddings)
+    ```
+    """
+    def __init__(self, cache_dir: str, dtype: str = "float16", initial_capacity: int = 4096,
+                 max_entries: int = 1000000, max_query_entries: int = 100000):
+        """
+        :param max_entries: 每个模型保存的文档向量数上限
+        :param max_query_entries: 每个模型保存的查询向量数上限
+        """
+        self.cache_dir = cache_dir
+        self.dtype = dtype
+        self.initial_capacity = initial_capacity
+        self.max_entries = max_entries
+        self.max_query_entries = max_query_entries
+        # (模型名, 是否查询) -> 向量文件
+        self._models: Dict[Tuple[str, bool], _ModelVectors] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _model_path(self, model: str, query: bool = False) -> str:
+        name = re.sub(r"[^\w.-]", "_", model)
+        return os.path.join(self.cache_dir, "_queries", name) if query else os.path.join(self.cache_dir, name)
+
+    def _get_model(self, model: str, dim: Optional[int] = None, query: bool = False) -> Optional[_ModelVectors]:
+        store = self._models.get((model, query))
+        if store is None:
+            path = self._model_path(model, query)
+            max_entries = self.max_query_entries if query else self.max_entries
+            store = _ModelVectors.open_existing(path, self.initial_capacity, max_entries)
+            if store is None and dim is not None:
+                store = _ModelVectors(path, dim, self.dtype, self.initial_capacity, max_entries)
+            if store is not None:
+                self._models[(model, query)] = store
+        return store
+
+    def get_many(self, model: str, texts: List[str], query: bool = False) -> List[Optional[List[float]]]:
+        """批量查询，未命中的位置为None；query=True时查询向量的缓存"""
+        with self._lock:
+            store = self._get_model(model, query=query)
+            results: List[Optional[List[float]]] = []
+            for text in texts:
+                row = store.index.get(self.text_hash(text)) if store is not None else None
+                if row is None:
+                    results.append(None)
+                else:
+                    results.append(store.vectors[row].astype(np.float32).tolist())
+            hit_count = sum(1 for r in results if r is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+            return results
+
+    def put_many(self, model: str, texts: List[str], embeddings: List[Optional[List[float]]], query: bool = False):
+        """批量写入，embedding为None的条目跳过；query=True时写入查询向量的缓存"""
+        with self._lock:
+            store = None
+            for text, embedding in zip(texts, embeddings):
+                if embedding is None:
+                    continue
+                if store is None:
+                    store = self._get_model(model, dim=len(embedding), query=query)
+                key = self.text_hash(text)
+                if key in store.index:
+                    continue
+                if len(embedding) != store.dim:
+                    logger.warning(f"向量维度不一致，跳过缓存: {len(embedding)} != {store.dim}")
+                    continue
+                store.append(key, embedding)
+            if store is not None:
+                store.flush()
+
+    def close(self):
+        with self._lock:
+            for store in self._models.values():
+                store.close()
+            self._models.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "models": {model: store.count for (model, query), store in self._models.items() if not query},
+            "queries": {model: store.count for (model, query), store in self._models.items() if query},
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
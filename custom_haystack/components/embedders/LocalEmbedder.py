@@ -0,0 +1,171 @@
+from haystack import component, logging
+from haystack import Document
+import asyncio
+import threading
+import time
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from .MicroBatchWorker import MicroBatchEmbeddingWorker
+
+logger = logging.getLogger(__name__)
+
+
+class LocalEmbeddingBackend:
+    """
+    进程内共享的SentenceTransformer模型
+
+    同一(model, device)只加载一次，文档嵌入器和查询嵌入器通过`get`拿到同一个实例，
+    避免同一模型在内存中存在两份。服务启动时调用`warm_up`显式加载，`is_ready`表示是否加载完成。
+    所有推理都提交给同一个MicroBatchEmbeddingWorker，并发请求的文本合并成批次计算。
+
+    使用示例：
+    ```python
+    backend = LocalEmbeddingBackend.get("BAAI/bge-m3")
+    backend.warm_up()
+    embeddings = backend.embed(["文本1", "文本2"])
+    embeddings = await backend.embed_async(["文本3"])
+    ```
+    """
+    _instances: Dict[Tuple[str, Optional[str]], "LocalEmbeddingBackend"] = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, model: str = "BAAI/bge-m3", device: Optional[str] = None) -> "LocalEmbeddingBackend":
+        with cls._instances_lock:
+            backend = cls._instances.get((model, device))
+            if backend is None:
+                backend = cls(model, device)
+                cls._instances[(model, device)] = backend
+            return backend
+
+    def __init__(self, model: str, device: Optional[str] = None):
+        self.model = model
+        self.device = device
+        self._model = None
+        self._load_lock = threading.Lock()
+        self.worker = MicroBatchEmbeddingWorker(self._encode, tokenizer=model)
+
+    @property
+    def is_ready(self) -> bool:
+        return self._model is not None
+
+    def warm_up(self):
+        """加载模型，并发调用时只加载一次"""
+        if self._model is not None:
+            return
+        with self._load_lock:
+            if self._model is not None:
+                return
+            from sentence_transformers import SentenceTransformer
+            start = time.time()
+            self._model = SentenceTransformer(self.model, device=self.device)
+            self.worker.max_text_tokens = self._model.max_seq_length
+            logger.info(f"加载本地嵌入模型 {self.model} 耗时: {time.time() - start:.2f}秒")
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """在工作线程中对一个合并后的批次做一次前向计算"""
+        self.warm_up()
+        return self._model.encode(
+            texts,
+            batch_size=len(texts),
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+
+    @staticmethod
+    def _collect(embeddings: List[np.ndarray], normalize_embeddings: bool) -> List[List[float]]:
+        if not embeddings:
+            return []
+        matrix = np.stack(embeddings).astype(np.float32)
+        if normalize_embeddings:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix = matrix / norms
+        return matrix.tolist()
+
+    def embed(self, texts: List[str], normalize_embeddings: bool = False) -> List[List[float]]:
+        futures = self.worker.submit(texts)
+        return self._collect([future.result() for future in futures], normalize_embeddings)
+
+    async def embed_async(self, texts: List[str], normalize_embeddings: bool = False) -> List[List[float]]:
+        futures = self.worker.submit(texts)
+        embeddings = await asyncio.gather(*[asyncio.wrap_future(future) for future in futures])
+        return self._collect(list(embeddings), normalize_embeddings)
+
+    def close(self):
+        self.worker.close()
+
+
+@component
+class LocalDocumentEmbedder:
+    """
+    使用共享LocalEmbeddingBackend的文档嵌入器，替代SentenceTransformersDocumentEmbedder
+
+    文本提交给后端的合并批次工作线程，与其它请求的文档和查询一起计算
+    """
+    def __init__(self,
+                 model: str = "BAAI/bge-m3",
+                 device: Optional[str] = None,
+                 normalize_embeddings: bool = False,
+                 ):
+        self.model = model
+        self.normalize_embeddings = normalize_embeddings
+        self.backend = LocalEmbeddingBackend.get(model, device)
+
+    @property
+    def is_ready(self) -> bool:
+        return self.backend.is_ready
+
+    def warm_up(self):
+        self.backend.warm_up()
+
+    @staticmethod
+    def _fill(documents: List[Document], embeddings: List[List[float]]) -> List[Document]:
+        for doc, embedding in zip(documents, embeddings):
+            doc.embedding = embedding
+        return documents
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        if not documents:
+            return {"documents": documents}
+        embeddings = self.backend.embed([doc.content or "" for doc in documents], self.normalize_embeddings)
+        return {"documents": self._fill(documents, embeddings)}
+
+    @component.output_types(documents=List[Document])
+    async def run_async(self, documents: List[Document]):
+        if not documents:
+            return {"documents": documents}
+        embeddings = await self.backend.embed_async([doc.content or "" for doc in documents], self.normalize_embeddings)
+        return {"documents": self._fill(documents, embeddings)}
+
+
+@component
+class LocalTextEmbedder:
+    """
+    使用共享LocalEmbeddingBackend的查询嵌入器，替代SentenceTransformersTextEmbedder
+    """
+    def __init__(self,
+                 model: str = "BAAI/bge-m3",
+                 device: Optional[str] = None,
+                 normalize_embeddings: bool = False,
+                 ):
+        self.model = model
+        self.normalize_embeddings = normalize_embeddings
+        self.backend = LocalEmbeddingBackend.get(model, device)
+
+    @property
+    def is_ready(self) -> bool:
+        return self.backend.is_ready
+
+    def warm_up(self):
+        self.backend.warm_up()
+
+    @component.output_types(embedding=List[float])
+    def run(self, text: str):
+        return {"embedding": self.backend.embed([text], self.normalize_embeddings)[0]}
+
+    @component.output_types(embedding=List[float])
+    async def run_async(self, text: str):
+        return {"embedding": (await self.backend.embed_async([text], self.normalize_embeddings))[0]}
@@ -0,0 +1,150 @@
+from haystack import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from custom_haystack.utils import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatchEmbeddingWorker:
+    """
+    把所有进行中请求提交的文本合并成批次再推理的后台线程
+
+    - 调用方`submit`文本后拿到Future，同步调用方`result()`等待，异步调用方用`asyncio.wrap_future`
+    - 工作线程取到第一条文本后最多再等待max_wait_ms，收集其它请求的文本
+    - 批次大小按填充后的token数（最长文本token数 × 文本数）限制在max_batch_tokens以内，
+      token数由模型的分词器对收集到的文本一次批量计算（encode_batch），分词器不可用时按字符估算
+    - 一个批次一次前向计算，结果按顺序回填到各自的Future
+
+    使用示例：
+    ```python
+    worker = MicroBatchEmbeddingWorker(encode=lambda texts: model.encode(texts).tolist(), tokenizer="BAAI/bge-m3")
+    futures = worker.submit(["文本1", "文本2"])
+    embeddings = [f.result() for f in futures]
+    ```
+    """
+    def __init__(self,
+                 encode,
+                 max_batch_tokens: int = 16384,
+                 max_batch_size: int = 128,
+                 max_wait_ms: float = 5,
+                 max_text_tokens: Optional[int] = 8192,
+                 tokenizer: Optional[str] = None,
+                 ):
+        """
+        :param encode: 接收文本列表、返回向量列表的函数，只在工作线程中调用
+        :param max_batch_tokens: 单批填充后的token上限
+        :param max_batch_size: 单批最多文本数
+        :param max_wait_ms: 取到第一条文本后等待更多文本的最长时间
+        :param max_text_tokens: 模型截断长度，超过部分不计入
+        :param tokenizer: HuggingFace分词器名称，与嵌入模型一致；None为按字符估算
+        """
+        self.encode = encode
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_text_tokens = max_text_tokens
+        self.counter = TokenCounter(tokenizer)
+        self._queue: "queue.Queue[Optional[Tuple[str, Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # 上一批放不下的(文本, Future, token数)，留给下一批
+        self._carry: List[Tuple[str, Future, int]] = []
+        self.batches = 0
+        self.texts = 0
+
+    def _tokens_many(self, texts: List[str]) -> List[int]:
+        counts = [max(tokens, 1) for tokens in self.counter.count_many(texts)] if texts else []
+        return [min(tokens, self.max_text_tokens) for tokens in counts] if self.max_text_tokens else counts
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="embedding-worker", daemon=True)
+                self._thread.start()
+
+    def submit(self, texts: List[str]) -> List[Future]:
+        self._ensure_started()
+        futures = []
+        for text in texts:
+            future: Future = Future()
+            self._queue.put((text, future))
+            futures.append(future)
+        return futures
+
+    def close(self):
+        """处理完已提交的文本后停止工作线程"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _next_batch(self) -> Optional[List[Tuple[str, Future]]]:
+        """
+        阻塞到有文本为止，然后在max_wait_ms内尽量收集文本，一次批量计算token数后按token预算取出一批；
+        放不下的文本留给下一批。收到停止信号返回None
+        """
+        carried, self._carry = self._carry, []
+        if not carried:
+            first = self._queue.get()
+            if first is None:
+                return None
+            received = [first]
+        else:
+            received = []
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(carried) + len(received) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # 先处理当前批次，再让循环收到停止信号
+                self._queue.put(None)
+                break
+            received.append(item)
+        counts = self._tokens_many([text for text, _ in received])
+        items = carried + [(text, future, tokens) for (text, future), tokens in zip(received, counts)]
+        batch, longest = [], 0
+        for index, (text, future, tokens) in enumerate(items):
+            if batch and max(longest, tokens) * (len(batch) + 1) > self.max_batch_tokens:
+                self._carry = items[index:]
+                break
+            batch.append((text, future))
+            longest = max(longest, tokens)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            # 调用方取消的Future不再计算
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                embeddings = self.encode([text for text, _ in batch])
+            except Exception as e:
+                logger.error(f"Error embedding batch of {len(batch)} texts: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(batch)
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": self.texts / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
@@ -1,10 +1,15 @@
 from haystack import component, logging 
 from haystack import Document
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import aiohttp
 import asyncio
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from haystack.core.serialization import default_to_dict, default_from_dict
 
+from custom_haystack.utils import TokenCounter
+
 logger = logging.getLogger(__name__)
 
 @component
@@ -14,36 +19,143 @@ class SiliconFlowDocumentEmberdder:
     """
     def __init__(self, 
                  api_key: str,
-                 model: str = "BAAI/bge-large-zh-v1.5"
+                 model: str = "BAAI/bge-large-zh-v1.5",
+                 batch_size: int = 32,
+                 max_batch_tokens: int = 8192,
+                 max_concurrency: int = 4,
+                 max_retries: int = 3,
+                 timeout: float = 30.0,
+                 max_retry_after: float = 30.0
                  ):
+        """
+        :param batch_size: 单次请求最多包含的文本数
+        :param max_batch_tokens: 单次请求的token上限，按模型的分词器计算，分词器不可用时按字符估算
+        :param max_concurrency: 同时进行的批量请求数
+        :param max_retries: 429/5xx或网络错误时的最大重试次数，指数退避
+        :param timeout: 建立连接和两次读取之间的超时秒数，不包含在连接池中排队的时间
+        :param max_retry_after: 服务端Retry-After的等待上限（秒）
+        """
         self.siliconflow_url = "https://api.siliconflow.cn/v1/embeddings"
         self.api_key = api_key
         self.model = model
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.counter = TokenCounter(model)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.max_retry_after = max_retry_after
+        # 组件生命周期内复用的keep-alive会话，首次请求时在事件循环中创建
+        self._session: Optional[aiohttp.ClientSession] = None
 
-    async def async_embed_text(self, text):
-        try:
-            async with aiohttp.ClientSession() as session:
-                headers = {
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60),
+                headers={
                     "Authorization": f"Bearer {self.api_key}",
                     "Content-Type": "application/json"
-                }
-                payload = {
-                    "model": self.model,
-                    "input": text,
-                    "encoding_format": "float"
-                }
-                async with session.post(self.siliconflow_url, headers=headers, json=payload) as response:
-                        response.raise_for_status()
-                        obj = await response.json()
-                        return obj['data'][0]['embedding']
-        except Exception as e:
-            logger.error(f"Error embedding text: {e}")
+                },
+                # 不设total：它包含等待连接池的时间，并发请求多时排队中的正常请求也会超时
+                timeout=aiohttp.ClientTimeout(total=None, connect=self.timeout, sock_read=self.timeout)
+            )
+        return self._session
+
+    async def close(self):
+        """关闭共享的HTTP会话"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _post_batch(self, texts: List[str]) -> List[List[float]]:
+        """发送一次批量嵌入请求，按响应中的index还原顺序"""
+        payload = {
+            "model": self.model,
+            "input": texts,
+            "encoding_format": "float"
+        }
+        async with self._get_session().post(self.siliconflow_url, json=payload) as response:
+            response.raise_for_status()
+            obj = await response.json()
+            data = sorted(obj['data'], key=lambda item: item.get('index', 0))
+            return [item['embedding'] for item in data]
+
+    def _retry_after(self, headers) -> Optional[float]:
+        """解析Retry-After（秒数或HTTP日期），不超过max_retry_after；没有或无法解析时返回None"""
+        value = (headers or {}).get("Retry-After", "").strip()
+        if not value:
             return None
+        if value.isdigit():
+            delay = float(value)
+        else:
+            try:
+                retry_at = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+            if retry_at.tzinfo is None:
+                retry_at = retry_at.replace(tzinfo=timezone.utc)
+            delay = max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+        return min(delay, self.max_retry_after)
+
+    async def _post_with_retries(self, texts: List[str]) -> Tuple[Optional[List[List[float]]], Optional[Exception]]:
+        """发送一个批次，429/5xx和网络错误按指数退避重试，返回(向量, None)或(None, 最后一次的错误)"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                embeddings = await self._post_batch(texts)
+                if len(embeddings) != len(texts):
+                    raise ValueError(f"返回向量数{len(embeddings)}与输入数{len(texts)}不一致")
+                return embeddings, None
+            except aiohttp.ClientResponseError as e:
+                retryable = e.status == 429 or e.status >= 500
+                delay = self._retry_after(e.headers)
+                error = e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                retryable, delay, error = True, None, e
+            except (KeyError, IndexError, ValueError) as e:
+                retryable, delay, error = False, None, e
+            if not retryable or attempt == self.max_retries:
+                return None, error
+            delay = delay if delay is not None else 0.5 * 2 ** attempt + random.uniform(0, 0.1)
+            logger.warning(f"Embedding请求失败，{delay:.1f}秒后重试({attempt + 1}/{self.max_retries}): {error}")
+            await asyncio.sleep(delay)
+
+    async def _embed_batch(self, texts: List[str], semaphore: asyncio.Semaphore) -> List[Optional[List[float]]]:
+        """
+        嵌入一个批次，失败的文本对应None
+
+        不可重试的4xx通常由个别文本（如超长文本）引起，把批次二分后分别重试，只丢弃出错的文本
+        """
+        async with semaphore:
+            embeddings, error = await self._post_with_retries(texts)
+        if embeddings is not None:
+            return embeddings
+        client_error = isinstance(error, aiohttp.ClientResponseError) and 400 <= error.status < 500 and error.status != 429
+        if client_error and len(texts) > 1:
+            middle = len(texts) // 2
+            left, right = await asyncio.gather(
+                self._embed_batch(texts[:middle], semaphore),
+                self._embed_batch(texts[middle:], semaphore)
+            )
+            return left + right
+        logger.error(f"Error embedding batch of {len(texts)} texts: {error}")
+        return [None] * len(texts)
+
+    def _make_batches(self, texts: List[str]) -> List[List[int]]:
+        """按文本数和token数切分批次，返回每批的下标"""
+        batches, current, current_tokens = [], [], 0
+        for i, tokens in enumerate(self.counter.count_many(texts)):
+            if current and (len(current) >= self.batch_size or current_tokens + tokens > self.max_batch_tokens):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
 
-    async def _gather_tasks(self, texts: list):
-        """异步任务聚合执行"""
-        tasks = [self.async_embed_text(text) for text in texts]
-        return await asyncio.gather(*tasks, return_exceptions=True)
+    async def async_embed_text(self, text):
+        """嵌入单个文本，失败返回None"""
+        return (await self._embed_batch([text], asyncio.Semaphore(1)))[0]
 
     def _get_telemetry_data(self) -> Dict[str, Any]:
         """
@@ -63,6 +175,12 @@ class SiliconFlowDocumentEmberdder:
             siliconflow_url=self.siliconflow_url,
             model=self.model,
             api_key=self.api_key,
+            batch_size=self.batch_size,
+            max_batch_tokens=self.max_batch_tokens,
+            max_concurrency=self.max_concurrency,
+            max_retries=self.max_retries,
+            timeout=self.timeout,
+            max_retry_after=self.max_retry_after,
         )
 
         return serialization_dict
@@ -80,11 +198,11 @@ class SiliconFlowDocumentEmberdder:
 
         return default_from_dict(cls, data)
 
-    @component.output_types(documents=List[Document])
+    @component.output_types(documents=List[Document], failed_documents=List[Document])
     def run(self, documents: List[Document]):
         pass
 
-    @component.output_types(documents=List[Document])
+    @component.output_types(documents=List[Document], failed_documents=List[Document])
     async def run_async(self, documents: List[Document]):
         """
         Embed a list of documents.
@@ -95,6 +213,7 @@ class SiliconFlowDocumentEmberdder:
         :returns:
             A dictionary with the following keys:
             - `documents`: Documents with embeddings.
+            - `failed_documents`: Documents that could not be embedded after retries.
         """
         if not isinstance(documents, list) or documents and not isinstance(documents[0], Document):
             raise TypeError(
@@ -102,21 +221,32 @@ class SiliconFlowDocumentEmberdder:
                 "In case you want to embed a list of strings, please use the SiliconFlowTextEmbedder."
             )
         
+        # 页面的分片可能全部被去重或过滤掉
         if len(documents) == 0:
-            raise ValueError("SiliconFlowDocumentEmberdder expects a list of Documents as input.")
+            return {"documents": [], "failed_documents": []}
 
-        texts_to_embed = [doc.content for doc in documents]
+        texts_to_embed = [doc.content or "" for doc in documents]
+        batches = self._make_batches(texts_to_embed)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(
+            *[self._embed_batch([texts_to_embed[i] for i in batch], semaphore) for batch in batches]
+        )
 
-        embeddings = []
-            
-        embeddings = await self._gather_tasks(texts_to_embed)
-        
-        for doc, embedding in zip(documents, embeddings):
-            doc.embedding = embedding
-        
-        logger.info(f"documents: {documents}")
+        embedded, failed = [], []
+        for batch, embeddings in zip(batches, results):
+            for i, embedding in zip(batch, embeddings):
+                doc = documents[i]
+                if embedding is None:
+                    failed.append(doc)
+                else:
+                    doc.embedding = embedding
+                    embedded.append(doc)
+
+        if failed:
+            logger.warning(f"{len(failed)}/{len(documents)} documents failed to embed and are not written to the store")
+        logger.info(f"embedded {len(embedded)} documents in {len(batches)} batches")
         
-        return {"documents": documents}
+        return {"documents": embedded, "failed_documents": failed}
     
 if __name__ == "__main__":
     # 添加模块搜索路径
@@ -1,6 +1,9 @@
 from haystack import component, logging
+import aiohttp
 import requests
-from typing import List
+from typing import List, Optional
+
+from custom_haystack.utils import LRUCache
 
 logger = logging.getLogger(__name__)
 
@@ -8,43 +11,83 @@ logger = logging.getLogger(__name__)
 class SiliconFlowTextEmbedder:
     """
     使用SiliconFlow进行文本嵌入的组件
+
+    最近的查询向量保存在内存LRU中，重复或热门查询不产生网络请求
     """
     def __init__(self, 
                  api_key: str,
                  model: str = "BAAI/bge-large-zh-v1.5",
+                 timeout: float = 10.0,
+                 cache_size: int = 1024,
                  ):
+        """
+        :param timeout: 单次请求超时秒数
+        :param cache_size: 查询向量LRU的容量，0为关闭
+        """
         self.siliconflow_url = "https://api.siliconflow.cn/v1/embeddings"
         self.api_key = api_key
         self.model = model
+        self.timeout = timeout
+        self._cache = LRUCache(maxsize=cache_size) if cache_size else None
+        # 组件生命周期内复用的keep-alive会话，首次请求时在事件循环中创建
+        self._session: Optional[aiohttp.ClientSession] = None
 
-    @component.output_types(embedding=List[float])
-    def run(self, text: str):
-        """
-        使用SiliconFlow进行文本嵌入
-        """
-        headers = {
+    def _headers(self) -> dict:
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
-        
-        payload = {
+
+    def _payload(self, text: str) -> dict:
+        return {
             "model": self.model,
             "input": text,
             "encoding_format": "float"
         }
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers=self._headers(),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def close(self):
+        """关闭共享的HTTP会话"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _cached(self, text: str) -> Optional[List[float]]:
+        return self._cache.get(text) if self._cache is not None else None
+
+    def _remember(self, text: str, embedding: List[float]):
+        if self._cache is not None:
+            self._cache.put(text, embedding)
+
+    @component.output_types(embedding=List[float])
+    def run(self, text: str):
+        """
+        使用SiliconFlow进行文本嵌入
+        """
+        embedding = self._cached(text)
+        if embedding is not None:
+            return {"embedding": embedding}
         
         try:
             response = requests.post(
                 self.siliconflow_url,
-                headers=headers,
-                json=payload
+                headers=self._headers(),
+                json=self._payload(text),
+                timeout=self.timeout
             )
-            logger.info(f"api_key: {self.api_key}")
             response.raise_for_status()
             
             obj = response.json()
             # 提取第一个embedding结果
             embedding = obj['data'][0]['embedding']
+            self._remember(text, embedding)
             return {"embedding": embedding}
             
         except requests.exceptions.RequestException as e:
@@ -54,6 +97,31 @@ class SiliconFlowTextEmbedder:
             logger.error(f"响应格式解析错误: {str(e)}")
             raise
 
+    @component.output_types(embedding=List[float])
+    async def run_async(self, text: str):
+        """
+        使用共享的异步会话进行文本嵌入，不阻塞事件循环
+        """
+        embedding = self._cached(text)
+        if embedding is not None:
+            return {"embedding": embedding}
+
+        try:
+            async with self._get_session().post(self.siliconflow_url, json=self._payload(text)) as response:
+                response.raise_for_status()
+                obj = await response.json()
+            # 提取第一个embedding结果
+            embedding = obj['data'][0]['embedding']
+            self._remember(text, embedding)
+            return {"embedding": embedding}
+
+        except aiohttp.ClientError as e:
+            logger.error(f"Embedding请求失败: {str(e)}")
+            raise
+        except (KeyError, IndexError) as e:
+            logger.error(f"响应格式解析错误: {str(e)}")
+            raise
+
 if __name__ == "__main__":
     # 添加模块搜索路径
     import sys
@@ -1,8 +1,19 @@
 from custom_haystack.components.embedders.SiliconFlowTextEmbedder import SiliconFlowTextEmbedder
 from custom_haystack.components.embedders.SiliconFlowDocumentEmberdder import SiliconFlowDocumentEmberdder
+from custom_haystack.components.embedders.EmbeddingCache import EmbeddingCache
+from custom_haystack.components.embedders.CachedEmbedder import CachedDocumentEmbedder, CachedTextEmbedder
+from custom_haystack.components.embedders.MicroBatchWorker import MicroBatchEmbeddingWorker
+from custom_haystack.components.embedders.LocalEmbedder import LocalEmbeddingBackend, LocalDocumentEmbedder, LocalTextEmbedder
 
 
 __all__ = [
     "SiliconFlowTextEmbedder",
     "SiliconFlowDocumentEmberdder",
+    "EmbeddingCache",
+    "CachedDocumentEmbedder",
+    "CachedTextEmbedder",
+    "MicroBatchEmbeddingWorker",
+    "LocalEmbeddingBackend",
+    "LocalDocumentEmbedder",
+    "LocalTextEmbedder",
 ]
\ No newline at end of file
@@ -0,0 +1,139 @@
+from haystack import logging
+import asyncio
+import time
+from collections import OrderedDict, defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict
+from urllib.parse import urlparse
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Waiter:
+    """排队等待抓取的单个URL"""
+    def __init__(self, host: str, future: asyncio.Future):
+        self.host = host
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class CrawlScheduler:
+    """
+    抓取调度器，限制全局和单个域名的并发页面数
+
+    每个请求拥有独立的等待队列，空出槽位时按请求轮询分配，
+    避免结果很多的查询占满浏览器而饿死其他请求。
+
+    使用示例：
+    ```python
+    scheduler = CrawlScheduler(max_concurrency=16, max_per_host=2)
+    async with scheduler.slot("https://example.com/a", request_id="req-1"):
+        result = await crawler.arun(...)
+    print(scheduler.stats())
+    ```
+    """
+    def __init__(self,
+                 max_concurrency: int = 16,
+                 max_per_host: int = 2,
+                 stats_window: int = 1000,
+                 ):
+        self.max_concurrency = max_concurrency
+        self.max_per_host = max_per_host
+        # request_id -> 该请求的等待队列，按插入顺序轮询
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._in_flight = 0
+        self._host_in_flight: Dict[str, int] = defaultdict(int)
+        self._wait_times: Deque[float] = deque(maxlen=stats_window)
+        self._completed = 0
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return (urlparse(url).hostname or "").lower()
+
+    def _has_capacity(self, host: str) -> bool:
+        return self._host_in_flight[host] < self.max_per_host
+
+    def _grant(self, waiter: _Waiter):
+        self._in_flight += 1
+        self._host_in_flight[waiter.host] += 1
+        waiter.future.set_result(None)
+
+    def _release(self, host: str):
+        self._in_flight -= 1
+        self._host_in_flight[host] -= 1
+        if self._host_in_flight[host] <= 0:
+            del self._host_in_flight[host]
+        self._completed += 1
+
+    def _dispatch(self):
+        """在容量允许时，轮流从各请求队列中取出第一个可执行的URL"""
+        while self._in_flight < self.max_concurrency and self._queues:
+            granted = False
+            for request_id in list(self._queues.keys()):
+                queue = self._queues[request_id]
+                waiter = next(
+                    (w for w in queue if not w.future.done() and self._has_capacity(w.host)),
+                    None
+                )
+                if waiter is None:
+                    continue
+                queue.remove(waiter)
+                # 被服务的请求移到队尾，下一个槽位优先给其他请求
+                if queue:
+                    self._queues.move_to_end(request_id)
+                else:
+                    del self._queues[request_id]
+                self._grant(waiter)
+                granted = True
+                break
+            if not granted:
+                break
+
+    def _remove(self, request_id: str, waiter: _Waiter):
+        queue = self._queues.get(request_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            return
+        if not queue:
+            del self._queues[request_id]
+
+    @asynccontextmanager
+    async def slot(self, url: str, request_id: str):
+        """等待并占用一个抓取槽位，退出时释放"""
+        waiter = _Waiter(self._host(url), asyncio.get_running_loop().create_future())
+        self._queues.setdefault(request_id, deque()).append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 已分配槽位但调用方被取消，归还槽位
+                self._release(waiter.host)
+                self._dispatch()
+            else:
+                self._remove(request_id, waiter)
+            raise
+        self._wait_times.append(time.monotonic() - waiter.enqueued_at)
+        try:
+            yield
+        finally:
+            self._release(waiter.host)
+            self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        """队列深度与排队耗时统计"""
+        wait_times = sorted(self._wait_times)
+        return {
+            "queue_depth": sum(len(queue) for queue in self._queues.values()),
+            "waiting_requests": len(self._queues),
+            "in_flight": self._in_flight,
+            "in_flight_hosts": len(self._host_in_flight),
+            "completed": self._completed,
+            "avg_wait": sum(wait_times) / len(wait_times) if wait_times else 0.0,
+            "p95_wait": wait_times[int(len(wait_times) * 0.95)] if wait_times else 0.0,
+            "max_wait": wait_times[-1] if wait_times else 0.0,
+        }
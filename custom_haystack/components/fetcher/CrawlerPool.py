@@ -0,0 +1,272 @@
+from haystack import logging
+from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig
+import asyncio
+import multiprocessing
+import time
+from typing import List, Optional, Set
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+logger = logging.getLogger(__name__)
+
+# 健康检查使用的本地页面，不产生网络请求
+HEALTH_CHECK_URL = "raw:<html><body>ok</body></html>"
+
+
+class _PooledCrawler:
+    """池中的单个浏览器实例及其使用统计"""
+    def __init__(self, crawler: AsyncWebCrawler):
+        self.crawler = crawler
+        self.pages = 0
+        self.in_flight = 0
+        self.failures = 0
+        self.retiring = False
+        self.closed = False
+        self.created_at = time.time()
+
+
+class CrawlerPool:
+    """
+    常驻的crawl4ai浏览器池，避免每次查询都启动、关闭浏览器
+
+    - 应用启动时调用`start()`预热size个浏览器，之后所有请求共享
+    - 每个浏览器可同时打开多个页面，请求分配给当前负载最小的实例
+    - 抓取超过max_pages_per_crawler个页面、连续失败或浏览器进程内存超过max_memory_mb时，
+      在后台启动替换实例；替换期间旧实例不再接收新页面，换下后等其上的页面完成再关闭。
+      所有实例都在替换中时，新页面等待替换实例启动（或替换失败、旧实例恢复服务）
+    - 后台定期对空闲实例做健康检查
+
+    使用示例：
+    ```python
+    pool = CrawlerPool(BrowserConfig(light_mode=True, text_mode=True), size=2)
+    await pool.start()
+    result = await pool.arun("https://example.com", CrawlerRunConfig())
+    await pool.close()
+    ```
+    """
+    def __init__(self,
+                 browser_config: Optional[BrowserConfig] = None,
+                 size: int = 2,
+                 max_pages_per_crawler: int = 200,
+                 max_failures: int = 5,
+                 max_memory_mb: Optional[float] = None,
+                 health_check_interval: float = 60.0,
+                 health_check_timeout: float = 10.0,
+                 ):
+        self.browser_config = browser_config or BrowserConfig(light_mode=True, text_mode=True)
+        self.size = size
+        self.max_pages_per_crawler = max_pages_per_crawler
+        self.max_failures = max_failures
+        self.max_memory_mb = max_memory_mb
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self._slots: List[_PooledCrawler] = []
+        self._lock = asyncio.Lock()
+        # 实例被替换或恢复服务时通知等待可用实例的页面
+        self._available = asyncio.Condition()
+        self._health_task: Optional[asyncio.Task] = None
+        # 后台进行的替换和关闭
+        self._tasks: Set[asyncio.Task] = set()
+        self._started = False
+        # 启动浏览器时新出现的子进程（playwright驱动，浏览器进程在其之下），只统计这些进程的内存
+        self._browser_processes: Set["psutil.Process"] = set()
+        if max_memory_mb is not None and psutil is None:
+            logger.warning("未安装psutil，max_memory_mb不会生效")
+
+    @property
+    def is_ready(self) -> bool:
+        return self._started and len(self._slots) > 0
+
+    def _tracks_memory(self) -> bool:
+        return self.max_memory_mb is not None and psutil is not None
+
+    @staticmethod
+    def _child_processes() -> Set["psutil.Process"]:
+        """当前进程的直接子进程，不含multiprocessing启动的工作进程（如重排子进程）"""
+        workers = {process.pid for process in multiprocessing.active_children()}
+        return {child for child in psutil.Process().children() if child.pid not in workers}
+
+    async def _new_slot(self) -> _PooledCrawler:
+        before = self._child_processes() if self._tracks_memory() else set()
+        crawler = AsyncWebCrawler(config=self.browser_config)
+        await crawler.start()
+        if self._tracks_memory():
+            self._browser_processes |= self._child_processes() - before
+        return _PooledCrawler(crawler)
+
+    async def start(self):
+        """启动浏览器池，重复调用无副作用"""
+        async with self._lock:
+            if self._started:
+                return
+            time_start = time.time()
+            self._slots = list(await asyncio.gather(*[self._new_slot() for _ in range(self.size)]))
+            self._started = True
+            if self.health_check_interval:
+                self._health_task = asyncio.create_task(self._health_loop())
+            logger.info(f"浏览器池启动完成，实例数: {self.size}，耗时: {time.time() - time_start}秒")
+
+    async def close(self):
+        """关闭所有浏览器实例"""
+        async with self._lock:
+            if self._health_task is not None:
+                self._health_task.cancel()
+                self._health_task = None
+            slots, self._slots = self._slots, []
+            self._started = False
+        await self._notify_available()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for slot in slots:
+            await self._close_slot(slot)
+
+    async def _close_slot(self, slot: _PooledCrawler):
+        if slot.closed:
+            return
+        slot.closed = True
+        try:
+            await slot.crawler.close()
+        except Exception as e:
+            logger.warning(f"关闭浏览器失败: {str(e)}")
+
+    def _candidates(self) -> List[_PooledCrawler]:
+        return [slot for slot in self._slots if not slot.retiring and not slot.closed]
+
+    async def _notify_available(self):
+        async with self._available:
+            self._available.notify_all()
+
+    async def _acquire(self) -> _PooledCrawler:
+        """
+        选择当前打开页面最少的实例并占用，正在替换的实例不再接收新页面
+
+        所有实例都在替换中时等待替换完成，不会把页面分配给即将关闭的实例
+        """
+        async with self._available:
+            await self._available.wait_for(lambda: not self._started or self._candidates())
+            candidates = self._candidates()
+            if not candidates:
+                raise RuntimeError("No available crawler in the pool")
+            slot = min(candidates, key=lambda slot: slot.in_flight)
+            slot.in_flight += 1
+            return slot
+
+    def _background(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def arun(self, url: str, config: CrawlerRunConfig):
+        """使用池中的浏览器抓取单个URL"""
+        if not self._started:
+            await self.start()
+        slot = await self._acquire()
+        try:
+            result = await slot.crawler.arun(url=url, config=config)
+            slot.failures = 0
+            return result
+        except Exception:
+            slot.failures += 1
+            raise
+        finally:
+            slot.in_flight -= 1
+            slot.pages += 1
+            self._maybe_recycle(slot)
+
+    def _browser_memory_mb(self) -> Optional[float]:
+        """
+        池中浏览器进程树的常驻内存总和
+
+        只统计启动浏览器时新出现的子进程及其后代，重排子进程等其它子进程不计入
+        """
+        if psutil is None:
+            return None
+        total = 0
+        for root in list(self._browser_processes):
+            try:
+                if not root.is_running():
+                    # 浏览器已关闭
+                    self._browser_processes.discard(root)
+                    continue
+                processes = [root, *root.children(recursive=True)]
+            except psutil.Error:
+                self._browser_processes.discard(root)
+                continue
+            for process in processes:
+                try:
+                    total += process.memory_info().rss
+                except psutil.Error:
+                    continue
+        return total / 1024 / 1024
+
+    def _needs_recycle(self, slot: _PooledCrawler) -> bool:
+        if slot.pages >= self.max_pages_per_crawler or slot.failures >= self.max_failures:
+            return True
+        if self.max_memory_mb is not None:
+            memory_mb = self._browser_memory_mb()
+            # 超出内存阈值时回收已抓取页面最多的实例
+            if memory_mb is not None and memory_mb > self.max_memory_mb:
+                return slot is max(self._slots, key=lambda s: s.pages)
+        return False
+
+    def _maybe_recycle(self, slot: _PooledCrawler):
+        """页面完成后检查是否需要替换，替换和关闭都在后台进行，不阻塞当前请求"""
+        if not slot.retiring and self._started and self._needs_recycle(slot):
+            slot.retiring = True
+            self._background(self._replace(slot))
+        # 已换下的实例等最后一个页面完成后再关闭
+        elif slot.retiring and slot.in_flight == 0 and slot not in self._slots:
+            self._background(self._close_slot(slot))
+
+    async def _replace(self, slot: _PooledCrawler):
+        """启动新实例并换下slot，调用前slot.retiring已置为True"""
+        slot.retiring = True
+        logger.info(f"回收浏览器实例，已抓取页面: {slot.pages}，连续失败: {slot.failures}")
+        # 启动浏览器需要数秒，不持有锁，其余实例照常服务
+        try:
+            new_slot = await self._new_slot()
+        except Exception as e:
+            # 无法启动新实例时保留旧实例继续服务
+            logger.error(f"启动替换浏览器失败: {str(e)}")
+            slot.retiring = False
+            await self._notify_available()
+            return
+        async with self._lock:
+            if not self._started or slot not in self._slots:
+                replaced = False
+            else:
+                self._slots[self._slots.index(slot)] = new_slot
+                replaced = True
+        await self._notify_available()
+        if not replaced:
+            await self._close_slot(new_slot)
+            return
+        if slot.in_flight == 0:
+            await self._close_slot(slot)
+
+    async def _health_check(self, slot: _PooledCrawler) -> bool:
+        try:
+            result = await asyncio.wait_for(
+                slot.crawler.arun(url=HEALTH_CHECK_URL, config=CrawlerRunConfig()),
+                timeout=self.health_check_timeout
+            )
+            return bool(result.success)
+        except Exception as e:
+            logger.warning(f"浏览器健康检查失败: {str(e)}")
+            return False
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            for slot in list(self._slots):
+                # 只检查空闲实例，避免与正常抓取争抢
+                if slot.in_flight > 0 or slot.retiring:
+                    continue
+                if not await self._health_check(slot) or self._needs_recycle(slot):
+                    if not slot.retiring:
+                        await self._replace(slot)
@@ -0,0 +1,221 @@
+from haystack import logging
+import aiohttp
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+logger = logging.getLogger(__name__)
+
+# 不影响页面内容的跟踪参数，归一化时去掉；只列明确的跟踪参数，
+# from、spm等在不少站点上有实际含义（分页、日期范围、跳转），不能去掉
+TRACKING_PARAMS = {"fbclid", "gclid", "yclid"}
+TRACKING_PREFIXES = ("utm_", "mc_")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """
+    归一化URL，作为缓存键：协议和域名小写、去掉默认端口、片段和跟踪参数，查询参数排序
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PREFIXES) and k.lower() not in TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+class PageCache:
+    """
+    以归一化URL的sha256为键的本地页面缓存，缓存命中时无需启动浏览器
+
+    - 每个条目是一个JSON文件，保存markdown_with_citations内容及title/description/author等元数据
+    - 过期时间按域名配置（domain_ttls，按域名后缀匹配），未配置的使用default_ttl
+    - 缓存总大小超过max_bytes时按最近访问时间淘汰
+    - 条目过期且保存了ETag/Last-Modified时，可发送条件请求，304则续期继续使用
+
+    使用示例：
+    ```python
+    cache = PageCache("./cache/pages", default_ttl=3600, domain_ttls={"wikipedia.org": 86400})
+    entry = cache.get("https://zh.wikipedia.org/wiki/Python")
+    if entry is None:
+        cache.put(url, content=markdown, meta={"title": "..."})
+    ```
+    """
+    def __init__(self,
+                 cache_dir: str,
+                 default_ttl: float = 3600,
+                 domain_ttls: Optional[Dict[str, float]] = None,
+                 max_bytes: int = 512 * 1024 * 1024,
+                 revalidate: bool = True,
+                 revalidate_timeout: float = 5.0,
+                 ):
+        self.cache_dir = cache_dir
+        self.default_ttl = default_ttl
+        self.domain_ttls = domain_ttls or {}
+        self.max_bytes = max_bytes
+        self.revalidate = revalidate
+        self.revalidate_timeout = revalidate_timeout
+        self._lock = threading.Lock()
+        self._session: Optional[aiohttp.ClientSession] = None
+        # key -> (文件大小, 最近访问时间)
+        self._index: Dict[str, list] = {}
+        self._total_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        """启动时扫描缓存目录重建索引，文件mtime即最近访问时间"""
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if not entry.name.endswith(".json"):
+                    continue
+                stat = entry.stat()
+                self._index[entry.name[:-5]] = [stat.st_size, stat.st_mtime]
+                self._total_bytes += stat.st_size
+        logger.info(f"页面缓存条目: {len(self._index)}，占用: {self._total_bytes / 1024 / 1024:.1f}MB")
+
+    def ttl_for(self, url: str) -> float:
+        host = (urlsplit(url).hostname or "").lower()
+        for domain, ttl in self.domain_ttls.items():
+            if host == domain or host.endswith("." + domain):
+                return ttl
+        return self.default_ttl
+
+    def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            self._remove(key)
+            return None
+
+    def _remove(self, key: str):
+        with self._lock:
+            item = self._index.pop(key, None)
+            if item is not None:
+                self._total_bytes -= item[0]
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _touch(self, key: str):
+        now = time.time()
+        with self._lock:
+            if key in self._index:
+                self._index[key][1] = now
+        try:
+            os.utime(self._path(key), (now, now))
+        except OSError:
+            pass
+
+    def get(self, url: str, allow_stale: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存条目
+
+        :param allow_stale: 为True时返回过期条目（调用方负责revalidate）
+        :returns: 条目字典，未命中或已过期返回None
+        """
+        key = self.key(url)
+        if key not in self._index:
+            return None
+        entry = self._read(key)
+        if entry is None:
+            return None
+        entry["stale"] = time.time() - entry["fetched_at"] > self.ttl_for(url)
+        if entry["stale"] and not allow_stale:
+            return None
+        self._touch(key)
+        return entry
+
+    def put(self, url: str, content: str, meta: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        """写入缓存条目，headers中的ETag/Last-Modified用于之后的条件请求"""
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        key = self.key(url)
+        entry = {
+            "url": url,
+            "content": content,
+            "meta": meta,
+            "etag": headers.get("etag") or None,
+            "last_modified": headers.get("last-modified") or None,
+            "fetched_at": time.time(),
+        }
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再替换，避免并发读到半个文件
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            old = self._index.get(key)
+            if old is not None:
+                self._total_bytes -= old[0]
+            self._index[key] = [len(data), time.time()]
+            self._total_bytes += len(data)
+        self._evict()
+
+    def refresh(self, url: str, entry: Dict[str, Any]):
+        """条件请求返回304时续期"""
+        self.put(url, entry["content"], entry["meta"], {
+            "etag": entry.get("etag") or "",
+            "last-modified": entry.get("last_modified") or "",
+        })
+
+    def _evict(self):
+        """超过max_bytes时淘汰最久未访问的条目"""
+        with self._lock:
+            if self._total_bytes <= self.max_bytes:
+                return
+            victims = []
+            freed = 0
+            for key, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+                if self._total_bytes - freed <= self.max_bytes:
+                    break
+                victims.append(key)
+                freed += size
+        for key in victims:
+            self._remove(key)
+
+    async def is_not_modified(self, entry: Dict[str, Any]) -> bool:
+        """对过期条目发送条件请求，页面未修改（304）返回True"""
+        if not self.revalidate or not (entry.get("etag") or entry.get("last_modified")):
+            return False
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.revalidate_timeout))
+        try:
+            async with self._session.get(entry["url"], headers=headers, allow_redirects=True) as response:
+                return response.status == 304
+        except Exception as e:
+            logger.warning(f"缓存条件请求失败 {entry['url']}: {str(e)}")
+            return False
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,186 @@
+from haystack import logging
+import asyncio
+import hashlib
+import json
+import os
+import time
+import unicodedata
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from custom_haystack.utils import LRUCache
+
+
+logger = logging.getLogger(__name__)
+
+
+# 词首词尾可以去掉的标点：括号、引号和句读；"#"、"+"以及词首的"."可能属于标识符（C#、.NET），保留
+_LEADING_PUNCTUATION = "\"'¿¡"
+_TRAILING_PUNCTUATION = "\"'.,;:!?…"
+# 全角标点中可能属于标识符的，按半角处理而不是当作分隔
+_IDENTIFIER_PUNCTUATION = "#%&*@/\\_-"
+
+
+def _is_cjk_separator(ch: str) -> bool:
+    return (unicodedata.category(ch).startswith("P") and unicodedata.east_asian_width(ch) in ("W", "F")
+            and unicodedata.normalize("NFKC", ch) not in _IDENTIFIER_PUNCTUATION)
+
+
+def _is_edge_punctuation(ch: str, extra: str) -> bool:
+    return ch in extra or unicodedata.category(ch) in ("Ps", "Pe", "Pi", "Pf")
+
+
+def _strip_token(token: str) -> str:
+    start, end = 0, len(token)
+    while start < end and _is_edge_punctuation(token[start], _LEADING_PUNCTUATION):
+        start += 1
+    while end > start and _is_edge_punctuation(token[end - 1], _TRAILING_PUNCTUATION):
+        end -= 1
+    return token[start:end]
+
+
+def normalize_query(query: str) -> str:
+    """
+    大小写、全半角、空白和词首词尾标点不同的查询视为同一个
+
+    词内的标点保留，"C#"和"C"、".NET 8"和"NET 8"是不同的查询；
+    中文标点（全角宽度的标点）不会出现在标识符中，按空白处理
+    """
+    query = "".join(" " if _is_cjk_separator(ch) else ch for ch in query)
+    query = unicodedata.normalize("NFKC", query).casefold()
+    return " ".join(token for token in map(_strip_token, query.split()) if token)
+
+
+class SearchResultCache:
+    """
+    SearXNG搜索结果缓存，内存LRU加可选的磁盘缓存
+
+    - 缓存键由归一化查询、language、safe_search、categories和页码组成
+    - 未超过ttl的结果直接返回
+    - 超过ttl但未超过ttl + stale_ttl的结果仍然返回，同时在后台刷新（stale-while-revalidate）
+    - 设置cache_dir时结果同时写入磁盘，服务重启后仍可命中；事件循环中使用get_async/put_async，
+      磁盘读写在工作线程中进行
+
+    使用示例：
+    ```python
+    cache = SearchResultCache(ttl=600, stale_ttl=3600)
+    key = cache.key("今天 星期几?", "zh-CN", 1, "general", 1)
+    cached = await cache.get_async(key)
+    if cached is None:
+        await cache.put_async(key, results)
+    ```
+    """
+    def __init__(self,
+                 ttl: float = 600,
+                 stale_ttl: float = 3600,
+                 maxsize: int = 2048,
+                 cache_dir: Optional[str] = None,
+                 ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.cache_dir = cache_dir
+        # 值为(结果列表, 获取时间)，超过ttl + stale_ttl后完全失效
+        self._memory = LRUCache(maxsize=maxsize, ttl=ttl + stale_ttl)
+        self._refreshing: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(query: str, language: str, safe_search: int, categories: str, pageno: int) -> str:
+        raw = json.dumps([normalize_query(query), language, safe_search, categories, pageno], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[Tuple[List[Dict], float]]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["fetched_at"] > self.ttl + self.stale_ttl:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            return None
+        return entry["results"], entry["fetched_at"]
+
+    def _write_disk(self, key: str, results: List[Dict], fetched_at: float):
+        tmp_path = f"{self._path(key)}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"results": results, "fetched_at": fetched_at}, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"写入搜索缓存失败: {str(e)}")
+
+    def _promote(self, key: str, entry: Optional[Tuple[List[Dict], float]]) -> Optional[Tuple[List[Dict], float]]:
+        """磁盘命中的结果放入内存"""
+        if entry is not None:
+            # 保留原来的获取时间，过期时间不因提升到内存而重新计算
+            self._memory.put(key, entry, stored_at=entry[1])
+        return entry
+
+    def _result(self, entry: Optional[Tuple[List[Dict], float]]) -> Optional[Tuple[List[Dict], bool]]:
+        if entry is None:
+            return None
+        results, fetched_at = entry
+        return results, time.time() - fetched_at > self.ttl
+
+    def get(self, key: str) -> Optional[Tuple[List[Dict], bool]]:
+        """
+        :returns: (结果列表, 是否已过期需要刷新)，未命中返回None
+        """
+        entry = self._memory.get(key)
+        if entry is None and self.cache_dir:
+            entry = self._promote(key, self._read_disk(key))
+        return self._result(entry)
+
+    async def get_async(self, key: str) -> Optional[Tuple[List[Dict], bool]]:
+        """与get相同，内存未命中时在工作线程中读磁盘"""
+        entry = self._memory.get(key)
+        if entry is None and self.cache_dir:
+            entry = self._promote(key, await asyncio.to_thread(self._read_disk, key))
+        return self._result(entry)
+
+    def _put_memory(self, key: str, results: List[Dict]) -> float:
+        fetched_at = time.time()
+        self._memory.put(key, (results, fetched_at), stored_at=fetched_at)
+        return fetched_at
+
+    def put(self, key: str, results: List[Dict]):
+        fetched_at = self._put_memory(key, results)
+        if self.cache_dir:
+            self._write_disk(key, results, fetched_at)
+
+    async def put_async(self, key: str, results: List[Dict]):
+        """与put相同，磁盘写入在工作线程中进行"""
+        fetched_at = self._put_memory(key, results)
+        if self.cache_dir:
+            await asyncio.to_thread(self._write_disk, key, results, fetched_at)
+
+    def refresh_in_background(self, key: str, fetch: Callable[[], Awaitable[List[Dict]]]):
+        """后台重新获取过期结果，同一个键同时只刷新一次"""
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                results = await fetch()
+                if results:
+                    await self.put_async(key, results)
+            except Exception as e:
+                logger.warning(f"后台刷新搜索缓存失败: {str(e)}")
+            finally:
+                self._refreshing.discard(key)
+
+        self._refreshing.add(key)
+        task = asyncio.create_task(refresh())
+        # 保留任务引用，避免被垃圾回收
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def stats(self) -> Dict:
+        return {**self._memory.stats(), "refreshing": len(self._refreshing)}
@@ -3,11 +3,14 @@
 
 from haystack import component, logging
 from haystack.dataclasses import Document
-import requests
-from typing import List, Dict
+import aiohttp
+import asyncio
+from typing import List, Dict, Optional, Callable
 from urllib.parse import urljoin
 import time
 from .URLMarkdownFetcher import URLMarkdownFetcher
+from .PageCache import PageCache
+from .SearchResultCache import SearchResultCache
 
 
 logger = logging.getLogger(__name__)
@@ -37,55 +40,119 @@ class SearXNGQueryFetcher(URLMarkdownFetcher):
         result_per_query: int = 5,
         timeout: float = 30.0,
         safe_search: int = 1,
-        language: str = "zh-CN"
+        language: str = "zh-CN",
+        max_concurrent_queries: int = 4,
+        max_pages: int = 3,
+        pool_size: int = 2,
+        page_cache: Optional[PageCache] = None,
+        search_cache: Optional[SearchResultCache] = None,
+        categories: str = "general"
     ):
         # 显式调用父类初始化
-        URLMarkdownFetcher.__init__(self)
+        URLMarkdownFetcher.__init__(self, pool_size=pool_size, page_cache=page_cache)
         self.base_url = searxng_url
         self.result_per_query = result_per_query
         self.timeout = timeout
         self.safe_search = safe_search
         self.language = language
+        self.max_concurrent_queries = max_concurrent_queries
+        self.max_pages = max_pages
+        self.search_cache = search_cache
+        self.categories = categories
+        # 组件生命周期内复用的keep-alive会话，首次请求时在事件循环中创建
+        self._session: Optional[aiohttp.ClientSession] = None
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36",
             "Accept": "*/*;"
         }
         logger.info(f"searxng_url: {self.base_url} language: {self.language}")
 
-    def _fetch_single_query(self, query: str) -> List[Dict]:
-        """同步获取单个查询的结果"""
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享的HTTP会话，连接池上限与查询并发数一致"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrent_queries, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def close(self):
+        """关闭共享的HTTP会话及浏览器池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        await URLMarkdownFetcher.close(self)
+
+    async def _fetch_page(self, query: str, pageno: int) -> List[Dict]:
+        """获取单个查询某一页的结果，优先使用搜索缓存，过期结果在后台刷新"""
+        if self.search_cache is None:
+            return await self._request_page(query, pageno)
+        key = self.search_cache.key(query, self.language, self.safe_search, self.categories, pageno)
+        cached = await self.search_cache.get_async(key)
+        if cached is not None:
+            results, stale = cached
+            if stale:
+                self.search_cache.refresh_in_background(key, lambda: self._request_page(query, pageno))
+            logger.info(f"搜索缓存命中: {query} 第{pageno}页")
+            return results
+        results = await self._request_page(query, pageno)
+        if results:
+            await self.search_cache.put_async(key, results)
+        return results
+
+    async def _request_page(self, query: str, pageno: int) -> List[Dict]:
+        """异步请求SearXNG获取单个查询某一页的结果"""
         params = {
             "q": query,
             "format": "json",
             "language": self.language,
             "safesearch": self.safe_search,
-            "pageno": 1,
+            "pageno": pageno,
             "time_range": None,
-            "categories": "general"
+            "categories": self.categories
         }
         
         # 过滤掉值为None的参数
         params = {k: v for k, v in params.items() if v is not None}
         
         try:
-            response = requests.get(
+            async with self._get_session().get(
                 url=urljoin(self.base_url, "/search"),
-                params=params,
-                headers=self.headers,
-                timeout=self.timeout
-            )
-                
-            if response.status_code != 200:
-                logger.warning(f"搜索失败: HTTP {response.status_code} - {query} - {response.text}")
-                return []
-                    
-            data = response.json()
-            return data.get("results", [])[:self.result_per_query]
+                params=params
+            ) as response:
+                if response.status != 200:
+                    text = await response.text()
+                    logger.warning(f"搜索失败: HTTP {response.status} - {query} - {text}")
+                    return []
+
+                data = await response.json(content_type=None)
+                return data.get("results", [])
                 
         except Exception as e:
             logger.exception(f"搜索异常: {str(e)} - {query}")
             return []
 
+    async def _fetch_single_query(self, query: str, semaphore: asyncio.Semaphore) -> List[Dict]:
+        """获取单个查询的结果，单页不足result_per_query时继续翻页"""
+        results = []
+        seen_urls = set()
+        async with semaphore:
+            for pageno in range(1, self.max_pages + 1):
+                page_results = await self._fetch_page(query, pageno)
+                if not page_results:
+                    break
+                for result in page_results:
+                    url = result.get("url")
+                    if url in seen_urls:
+                        continue
+                    seen_urls.add(url)
+                    results.append(result)
+                if len(results) >= self.result_per_query:
+                    break
+        return results[:self.result_per_query]
+
     def _result_to_document(self, result: Dict) -> Document:
         """将搜索结果转换为Haystack文档格式"""
         content = f"{result.get('content', '')}"
@@ -99,34 +166,64 @@ class SearXNGQueryFetcher(URLMarkdownFetcher):
         }
         return Document(content=content, meta=metadata)
 
+    def snippet_documents(self, results: List[Dict], request_id: Optional[str] = None) -> List[Document]:
+        """把搜索结果的摘要转换为文档，用于页面未抓取完成时代替正文，或在fast模式下直接构造提示词"""
+        documents = []
+        for result in results:
+            doc = self._result_to_document(result)
+            if not doc.content:
+                continue
+            doc.meta["request_id"] = request_id
+            # 不经过DocumentSplitter直接交给DocsPromptBuilder时按source_id编号
+            doc.meta["source_id"] = doc.id
+            documents.append(doc)
+        return documents
+
     @component.output_types(documents=List[Document])
-    def run(self, queries: List[str]):
+    def run(self, queries: List[str], progress_callback: Optional[Callable[[str], None]] = None,
+            request_id: Optional[str] = None):
         pass
 
+    async def search(self, queries: List[str],
+                     progress_callback: Optional[Callable[[str], None]] = None) -> List[Dict]:
+        """
+        并发执行所有查询，返回按URL去重的搜索结果
+
+        :param progress_callback: 进度回调，开始搜索时收到"searching"
+        """
+        if progress_callback:
+            progress_callback("searching")
+        # 所有查询并发执行，并发数受max_concurrent_queries限制
+        semaphore = asyncio.Semaphore(self.max_concurrent_queries)
+        search_results = await asyncio.gather(
+            *[self._fetch_single_query(query, semaphore) for query in queries]
+        )
+        results, seen_urls = [], set()
+        for sublist in search_results:
+            for result in sublist:
+                if isinstance(result, dict) and "url" in result and result["url"] not in seen_urls:
+                    seen_urls.add(result["url"])
+                    results.append(result)
+        return results
+
     @component.output_types(documents=List[Document])
-    async def run_async(self, queries: List[str]):
+    async def run_async(self, queries: List[str], progress_callback: Optional[Callable[[str], None]] = None,
+                        request_id: Optional[str] = None):
         """
         执行批量搜索查询
         
         :param queries: 搜索关键词列表
+        :param progress_callback: 进度回调，接收如"searching"、"crawled 3/5"的阶段描述
+        :param request_id: 请求标识，用于抓取调度并写入文档meta
         :return: 包含Document对象的字典
         """
         # 执行任务
         time_start = time.time()
+        results = await self.search(queries, progress_callback=progress_callback)
         
-        search_results = []
-        for query in queries:
-            search_results.append(self._fetch_single_query(query))
-
-        # 2. 提取所有结果URL
-        urls = []
-        for sublist in search_results:
-            for result in sublist:
-                if isinstance(result, dict) and "url" in result:
-                    urls.append(result["url"])
-        
-        # 3. 使用基类爬取能力
-        all_results = await self._gather_tasks(urls)
+        # 使用基类爬取能力
+        urls = [result["url"] for result in results]
+        all_results = await self._gather_tasks(urls, progress_callback=progress_callback, request_id=request_id)
         
         time_end = time.time()
         logger.info(f"完成搜索及爬虫，耗时: {time_end - time_start}秒")
@@ -2,9 +2,13 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from haystack import Document, component, logging
-from crawl4ai import AsyncWebCrawler, CrawlerRunConfig, CacheMode, BrowserConfig
+from crawl4ai import CrawlerRunConfig, CacheMode, BrowserConfig
+from .CrawlerPool import CrawlerPool
+from .CrawlScheduler import CrawlScheduler
+from .PageCache import PageCache
 import asyncio
-from typing import List, Optional
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
 import concurrent.futures
 import traceback
 
@@ -26,42 +30,144 @@ class URLMarkdownFetcher:
     """
     def __init__(self,
                  timeout: int = 5000,
+                 crawler_pool: Optional[CrawlerPool] = None,
+                 pool_size: int = 2,
+                 max_pages_per_crawler: int = 200,
+                 scheduler: Optional[CrawlScheduler] = None,
+                 max_concurrency: int = 16,
+                 max_per_host: int = 2,
+                 page_cache: Optional[PageCache] = None,
                  ):
-        browser_cfg = BrowserConfig(
-            light_mode=True,
-            text_mode=True
+        """
+        :param crawler_pool: 共享的浏览器池，不传时按pool_size创建
+        :param pool_size: 常驻浏览器实例数
+        :param max_pages_per_crawler: 单个浏览器抓取多少页面后回收重启
+        :param scheduler: 共享的抓取调度器，不传时按max_concurrency、max_per_host创建
+        :param max_concurrency: 全局同时打开的页面数上限
+        :param max_per_host: 单个域名同时打开的页面数上限
+        :param page_cache: 本地页面缓存，命中时跳过浏览器
+        """
+        if crawler_pool is None:
+            browser_cfg = BrowserConfig(
+                light_mode=True,
+                text_mode=True
+            )
+            crawler_pool = CrawlerPool(
+                browser_config=browser_cfg,
+                size=pool_size,
+                max_pages_per_crawler=max_pages_per_crawler
+            )
+        self.crawler_pool = crawler_pool
+        self.scheduler = scheduler or CrawlScheduler(
+            max_concurrency=max_concurrency,
+            max_per_host=max_per_host
         )
-        self.crawler = AsyncWebCrawler(config=browser_cfg)
+        self.page_cache = page_cache
         self.crawler_config = CrawlerRunConfig(
             cache_mode=CacheMode.BYPASS,
             page_timeout=timeout 
         )
 
-    async def _async_crawl(self, url: str) -> Optional[Document]:
-        """异步抓取单个URL并转换为Markdown文档"""
-        logger.info(f"开始抓取 {url}")
+    async def start(self):
+        """预热浏览器池，应在应用启动时调用"""
+        await self.crawler_pool.start()
+
+    async def close(self):
+        """关闭浏览器池"""
+        await self.crawler_pool.close()
+        if self.page_cache is not None:
+            await self.page_cache.close()
+
+    async def _cached_document(self, url: str) -> Optional[Dict[str, Any]]:
+        """查询页面缓存，过期条目经条件请求确认未修改时续期使用"""
+        entry = await asyncio.to_thread(self.page_cache.get, url, True)
+        if entry is None:
+            return None
+        if entry["stale"]:
+            if not await self.page_cache.is_not_modified(entry):
+                return None
+            await asyncio.to_thread(self.page_cache.refresh, url, entry)
+        logger.info(f"页面缓存命中 {url}")
+        return entry
+
+    async def _async_crawl(self, url: str, request_id: str = "default") -> Optional[Document]:
+        """
+        异步抓取单个URL并转换为Markdown文档
+
+        文档meta中的request_id用于文档存储按请求划分命名空间
+        """
         try:
-            result = await self.crawler.arun(url=url, config=self.crawler_config)
+            if self.page_cache is not None:
+                entry = await self._cached_document(url)
+                if entry is not None:
+                    return Document(
+                        content=entry["content"],
+                        meta={"url": url, **entry["meta"], "request_id": request_id}
+                    )
+            async with self.scheduler.slot(url, request_id):
+                logger.info(f"开始抓取 {url}")
+                result = await self.crawler_pool.arun(url, self.crawler_config)
             logger.info(f"抓取完成 {url} result: {result}")
-            return Document(
-                content=result.markdown.markdown_with_citations,
-                meta={
-                    "url": url,
-                    "title": result.metadata.get("title", ""),
-                    "description": result.metadata.get("description", ""),
-                    "author": result.metadata.get("author", "")
-                }
-            )
+            meta = {
+                "title": result.metadata.get("title", ""),
+                "description": result.metadata.get("description", ""),
+                "author": result.metadata.get("author", "")
+            }
+            content = result.markdown.markdown_with_citations
+            # crawl4ai对4xx/5xx错误页也报告success，只缓存2xx响应，避免错误页在整个TTL内被复用
+            status_code = getattr(result, "status_code", None)
+            if self.page_cache is not None and result.success and status_code is not None and 200 <= status_code < 300:
+                await asyncio.to_thread(
+                    self.page_cache.put, url, content, meta, getattr(result, "response_headers", None)
+                )
+            return Document(content=content, meta={"url": url, **meta, "request_id": request_id})
         except Exception as e:
             logger.warning(f"抓取失败 {url}. 错误: {str(e)}")
             return None
 
-    async def _gather_tasks(self, urls: list):
-        """异步任务聚合执行"""
+    async def _gather_tasks(self, urls: list, progress_callback: Optional[Callable[[str], None]] = None,
+                            request_id: Optional[str] = None):
+        """异步任务聚合执行，每完成一个URL通过progress_callback上报进度"""
+        # 同一次调用的URL共享一个调度队列，与其他请求公平轮转
+        request_id = request_id or uuid.uuid4().hex
+        total = len(urls)
+        finished = 0
+
+        async def crawl_with_progress(url: str) -> Optional[Document]:
+            nonlocal finished
+            try:
+                return await self._async_crawl(url, request_id)
+            finally:
+                finished += 1
+                if progress_callback:
+                    progress_callback(f"crawled {finished}/{total}")
+
+        tasks = [ crawl_with_progress(url) for url in urls ]
+        return await asyncio.gather(*tasks, return_exceptions=True)
 
-        tasks = [ self._async_crawl(url) for url in urls ]
-        async with self.crawler:
-            return await asyncio.gather(*tasks, return_exceptions=True)
+    async def iter_crawls(self, urls: List[str], progress_callback: Optional[Callable[[str], None]] = None,
+                          request_id: Optional[str] = None) -> AsyncIterator[Document]:
+        """
+        按完成顺序逐个产出抓取成功的文档，下游无需等待最慢的页面
+
+        迭代提前结束（break或aclose）时取消尚未完成的抓取
+        """
+        request_id = request_id or uuid.uuid4().hex
+        tasks = [asyncio.create_task(self._async_crawl(url, request_id)) for url in urls]
+        total = len(tasks)
+        try:
+            for finished, next_done in enumerate(asyncio.as_completed(tasks), 1):
+                doc = await next_done
+                if progress_callback:
+                    progress_callback(f"crawled {finished}/{total}")
+                if isinstance(doc, Document):
+                    yield doc
+        finally:
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
 
     def _thread_pool_run(self, urls: List[str]):
         """线程池运行"""
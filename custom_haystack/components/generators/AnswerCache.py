@@ -0,0 +1,59 @@
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+from custom_haystack.utils import LRUCache
+
+
+class AnswerCache:
+    """
+    LLM回答的内存缓存，键为(模型, 生成参数, 系统提示词, 提示词)的哈希
+
+    提示词由检索到的网页内容渲染而成，内容变化时键随之变化；ttl控制回答的新鲜度，maxsize控制内存占用。
+    每个条目保存回答文本、元数据和流式生成时的各段增量，命中时可以按原来的分段重放。
+
+    使用示例：
+    ```python
+    cache = AnswerCache(maxsize=1024, ttl=600)
+    key = cache.key("qwen-qwq-32b", {"temperature": 0.6}, None, prompt)
+    cache.put(key, reply, meta, pieces)
+    entry = cache.get(key)
+    ```
+    """
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 600):
+        """
+        :param maxsize: 缓存的回答数
+        :param ttl: 回答的有效期（秒），None为不过期
+        """
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def key(model: str, generation_kwargs: Dict[str, Any], system_prompt: Optional[str], prompt: str) -> str:
+        payload = json.dumps(
+            {"model": model, "generation_kwargs": generation_kwargs, "system_prompt": system_prompt},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str
+        )
+        digest = hashlib.sha256(payload.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._cache.get(key)
+
+    def put(self, key: str, reply: str, meta: Dict[str, Any], pieces: Optional[List[str]] = None):
+        """
+        :param pieces: 流式生成时各chunk的增量文本，None时重放为一整段
+        """
+        self._cache.put(key, {"reply": reply, "meta": meta, "pieces": pieces or [reply]})
+
+    def clear(self):
+        self._cache.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
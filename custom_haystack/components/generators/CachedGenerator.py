@@ -0,0 +1,148 @@
+from haystack import component, logging
+import asyncio
+import inspect
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from openai.types.chat import ChatCompletionChunk
+from openai.types.chat.chat_completion_chunk import Choice, ChoiceDelta
+
+from .AnswerCache import AnswerCache
+
+logger = logging.getLogger(__name__)
+
+
+@component
+class CachedGenerator:
+    """
+    在生成器前加一层AnswerCache，提示词完全相同的请求直接返回缓存的回答
+
+    - 只缓存自然结束（finish_reason为stop）的单个回答，被截断、过滤或取消的回答不缓存
+    - 命中时如果有流式回调，把缓存的回答按原来的分段重放为ChatCompletionChunk，流式客户端的行为不变
+
+    使用示例：
+    ```python
+    cache = AnswerCache(maxsize=1024, ttl=600)
+    llm = CachedGenerator(CustomOpenAIGenerator(api_key=api_key, model=model), cache)
+    result = await llm.run_async(prompt=prompt, streaming_callback=callback)
+    ```
+    """
+    def __init__(self, generator: Any, cache: AnswerCache):
+        """
+        :param generator: 被包装的生成器，需要有model、generation_kwargs和system_prompt属性
+        :param cache: 回答缓存
+        """
+        self.generator = generator
+        self.cache = cache
+
+    async def close(self):
+        if hasattr(self.generator, "close"):
+            await self.generator.close()
+
+    def _key(self, prompt: str, system_prompt: Optional[str], generation_kwargs: Optional[Dict[str, Any]]) -> str:
+        return self.cache.key(
+            self.generator.model,
+            {**self.generator.generation_kwargs, **(generation_kwargs or {})},
+            system_prompt if system_prompt is not None else self.generator.system_prompt,
+            prompt
+        )
+
+    def _chunks(self, key: str, entry: Dict[str, Any]) -> List[ChatCompletionChunk]:
+        """把缓存的回答转换成与OpenAI流式响应相同格式的chunk"""
+        model = entry["meta"].get("model", self.generator.model)
+        created = int(time.time())
+
+        def chunk(delta: ChoiceDelta, finish_reason: Optional[str] = None) -> ChatCompletionChunk:
+            return ChatCompletionChunk(
+                id=f"chatcmpl-cache-{key[:24]}",
+                object="chat.completion.chunk",
+                created=created,
+                model=model,
+                choices=[Choice(index=0, delta=delta, finish_reason=finish_reason)]
+            )
+
+        chunks = [chunk(ChoiceDelta(role="assistant", content=piece)) for piece in entry["pieces"]]
+        chunks.append(chunk(ChoiceDelta(), entry["meta"].get("finish_reason", "stop")))
+        return chunks
+
+    @staticmethod
+    def _hit(entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {"replies": [entry["reply"]], "meta": [{**entry["meta"], "cache_hit": True}]}
+
+    @staticmethod
+    def _recording(streaming_callback: Optional[Callable], pieces: List[str]) -> Optional[Callable]:
+        """包装流式回调，记录每个chunk的增量文本用于重放"""
+        if streaming_callback is None:
+            return None
+
+        def callback(chunk: ChatCompletionChunk):
+            if chunk.choices and chunk.choices[0].delta.content:
+                pieces.append(chunk.choices[0].delta.content)
+            return streaming_callback(chunk)
+        return callback
+
+    def _store(self, key: str, result: Dict[str, Any], pieces: List[str]):
+        replies, meta = result.get("replies", []), result.get("meta", [])
+        if len(replies) != 1 or not meta or meta[0].get("finish_reason") != "stop":
+            return
+        self.cache.put(key, replies[0], meta[0], pieces or None)
+
+    @component.output_types(replies=List[str], meta=List[Dict[str, Any]])
+    def run(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        streaming_callback: Optional[Callable] = None,
+        generation_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        key = self._key(prompt, system_prompt, generation_kwargs)
+        streaming_callback = streaming_callback or self.generator.streaming_callback
+        entry = self.cache.get(key)
+        if entry is not None:
+            logger.info("回答缓存命中")
+            if streaming_callback is not None:
+                for chunk in self._chunks(key, entry):
+                    streaming_callback(chunk)
+            return self._hit(entry)
+        pieces: List[str] = []
+        result = self.generator.run(
+            prompt=prompt,
+            system_prompt=system_prompt,
+            streaming_callback=self._recording(streaming_callback, pieces),
+            generation_kwargs=generation_kwargs
+        )
+        self._store(key, result, pieces)
+        return result
+
+    @component.output_types(replies=List[str], meta=List[Dict[str, Any]])
+    async def run_async(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        streaming_callback: Optional[Callable] = None,
+        generation_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        key = self._key(prompt, system_prompt, generation_kwargs)
+        streaming_callback = streaming_callback or self.generator.streaming_callback
+        entry = self.cache.get(key)
+        if entry is not None:
+            logger.info("回答缓存命中")
+            if streaming_callback is not None:
+                for chunk in self._chunks(key, entry):
+                    result = streaming_callback(chunk)
+                    if inspect.isawaitable(result):
+                        await result
+            return self._hit(entry)
+        pieces: List[str] = []
+        kwargs = dict(
+            prompt=prompt,
+            system_prompt=system_prompt,
+            streaming_callback=self._recording(streaming_callback, pieces),
+            generation_kwargs=generation_kwargs
+        )
+        if hasattr(self.generator, "run_async"):
+            result = await self.generator.run_async(**kwargs)
+        else:
+            result = await asyncio.to_thread(self.generator.run, **kwargs)
+        self._store(key, result, pieces)
+        return result
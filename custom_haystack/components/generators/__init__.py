@@ -1,3 +1,5 @@
 from .openai import CustomOpenAIGenerator
+from .AnswerCache import AnswerCache
+from .CachedGenerator import CachedGenerator
 
-__all__ = ["CustomOpenAIGenerator"]
\ No newline at end of file
+__all__ = ["CustomOpenAIGenerator", "AnswerCache", "CachedGenerator"]
@@ -4,18 +4,64 @@ from typing import List, Dict, Any, Optional, Callable, Union
 from haystack.dataclasses import StreamingChunk
 from haystack.dataclasses import ChatMessage
 from openai.types.chat import ChatCompletionChunk, ChatCompletion
-from openai import Stream
+from openai import AsyncOpenAI, AsyncStream, Stream
+import asyncio
+import httpx
+import inspect
 
 logger = logging.getLogger(__name__)
 
 class CustomOpenAIGenerator(OpenAIGenerator):
-    def __init__(self, *args, **kwargs):
+    """
+    OpenAIGenerator的扩展
+
+    - `run_async`使用AsyncOpenAI异步迭代流式响应，生成期间不阻塞事件循环；
+      HTTP连接池在首次调用时创建并复用，`close`时释放
+    - 请求被取消时关闭流式响应，不再继续接收token
+    - 流式回调收到原始的ChatCompletionChunk，回调可以是普通函数或协程函数
+    """
+    def __init__(self, *args, max_connections: int = 100, max_keepalive_connections: int = 20, **kwargs):
+        """
+        :param max_connections: 异步客户端连接池的最大连接数
+        :param max_keepalive_connections: 连接池保持的空闲连接数
+        """
         super().__init__(*args, **kwargs)
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.async_client: Optional[AsyncOpenAI] = None
+
+    def _get_async_client(self) -> AsyncOpenAI:
+        if self.async_client is None:
+            # 与同步客户端使用相同的地址、密钥、超时和重试设置
+            self.async_client = AsyncOpenAI(
+                api_key=self.client.api_key,
+                organization=self.client.organization,
+                base_url=self.client.base_url,
+                timeout=self.client.timeout,
+                max_retries=self.client.max_retries,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_keepalive_connections
+                    ),
+                    timeout=self.client.timeout
+                )
+            )
+        return self.async_client
+
+    async def close(self):
+        """释放异步客户端的连接池"""
+        if self.async_client is not None:
+            await self.async_client.close()
+            self.async_client = None
 
     @staticmethod
     def _connect_chunks(chunk: Any, chunks: List[StreamingChunk]) -> ChatMessage:
         """
         Connects the streaming chunks into a single ChatMessage.
+
+        :param chunk:
+            The last ChatCompletionChunk that carried choices, used for the model and finish reason.
         """
         complete_response = ChatMessage.from_assistant("".join([chunk.content for chunk in chunks]))
         complete_response.meta.update(
@@ -48,7 +94,8 @@ class CustomOpenAIGenerator(OpenAIGenerator):
                 "model": completion.model,
                 "index": choice.index,
                 "finish_reason": choice.finish_reason,
-                "usage": dict(completion.usage),
+                # usage中的*_tokens_details是pydantic对象，model_dump转成可以JSON序列化的dict
+                "usage": completion.usage.model_dump() if completion.usage is not None else {},
             }
         )
         return chat_message
@@ -77,6 +124,50 @@ class CustomOpenAIGenerator(OpenAIGenerator):
                 finish_reason=message.meta["finish_reason"],
             )
 
+    def _prepare_messages(self, prompt: str, system_prompt: Optional[str]) -> List[Dict[str, Any]]:
+        """
+        Builds the OpenAI formatted messages from the prompt and the system prompt.
+        """
+        message = ChatMessage.from_user(prompt)
+        if system_prompt is not None:
+            messages = [ChatMessage.from_system(system_prompt), message]
+        elif self.system_prompt:
+            messages = [ChatMessage.from_system(self.system_prompt), message]
+        else:
+            messages = [message]
+
+        def convert_message_to_openai_format(message: ChatMessage) -> Dict[str, Any]:
+            openai_msg = {"role": message.role.value, "content": message.text}
+            if message.name:
+                openai_msg["name"] = message.name
+
+            return openai_msg
+        # adapt ChatMessage(s) to the format expected by the OpenAI API
+        return [convert_message_to_openai_format(message) for message in messages]
+
+    @staticmethod
+    def _check_streaming(generation_kwargs: Dict[str, Any]) -> None:
+        if generation_kwargs.get("n", 1) > 1:
+            raise ValueError("Cannot stream multiple responses, please set n=1.")
+
+    @staticmethod
+    def _to_streaming_chunk(chunk: ChatCompletionChunk) -> StreamingChunk:
+        choice = chunk.choices[0]
+        return StreamingChunk(
+            content=choice.delta.content or "",
+            meta={"model": chunk.model, "index": choice.index, "finish_reason": choice.finish_reason},
+        )
+
+    def _finish(self, completions: List[ChatMessage]) -> Dict[str, Any]:
+        # before returning, do post-processing of the completions
+        for response in completions:
+            self._check_finish_reason(response)
+
+        return {
+            "replies": [message.text for message in completions],
+            "meta": [message.meta for message in completions],
+        }
+
     @component.output_types(replies=List[str], meta=List[Dict[str, Any]])
     def run(
         self,
@@ -103,27 +194,15 @@ class CustomOpenAIGenerator(OpenAIGenerator):
             A list of strings containing the generated responses and a list of dictionaries containing the metadata
         for each response.
         """
-        message = ChatMessage.from_user(prompt)
-        if system_prompt is not None:
-            messages = [ChatMessage.from_system(system_prompt), message]
-        elif self.system_prompt:
-            messages = [ChatMessage.from_system(self.system_prompt), message]
-        else:
-            messages = [message]
+        openai_formatted_messages = self._prepare_messages(prompt, system_prompt)
 
         # update generation kwargs by merging with the generation kwargs passed to the run method
         generation_kwargs = {**self.generation_kwargs, **(generation_kwargs or {})}
 
         # check if streaming_callback is passed
         streaming_callback = streaming_callback or self.streaming_callback
-        def convert_message_to_openai_format(message: ChatMessage) -> Dict[str, Any]:
-            openai_msg = {"role": message.role.value, "content": message.text}
-            if message.name:
-                openai_msg["name"] = message.name
-
-            return openai_msg
-        # adapt ChatMessage(s) to the format expected by the OpenAI API
-        openai_formatted_messages = [convert_message_to_openai_format(message) for message in messages]
+        if streaming_callback is not None:
+            self._check_streaming(generation_kwargs)
 
         completion: Union[Stream[ChatCompletionChunk], ChatCompletion] = self.client.chat.completions.create(
             model=self.model,
@@ -134,25 +213,70 @@ class CustomOpenAIGenerator(OpenAIGenerator):
 
         completions: List[ChatMessage] = []
         if isinstance(completion, Stream):
-            num_responses = generation_kwargs.pop("n", 1)
-            if num_responses > 1:
-                raise ValueError("Cannot stream multiple responses, please set n=1.")
             chunks: List[StreamingChunk] = []
-            chunk = None
+            last = None
 
             # pylint: disable=not-an-iterable
             for chunk in completion:
-                if chunk.choices and streaming_callback:
-                    streaming_callback(chunk)  # invoke callback with the chunk_delta
-            completions = [self._connect_chunks(chunk, chunks)]
+                # 开启usage统计时最后一个chunk没有choices
+                if not chunk.choices:
+                    continue
+                last = chunk
+                chunks.append(self._to_streaming_chunk(chunk))
+                streaming_callback(chunk)  # invoke callback with the chunk_delta
+            completions = [self._connect_chunks(last, chunks)] if last is not None else []
         elif isinstance(completion, ChatCompletion):
             completions = [self._build_message(completion, choice) for choice in completion.choices]
 
-        # before returning, do post-processing of the completions
-        for response in completions:
-            self._check_finish_reason(response)
+        return self._finish(completions)
 
-        return {
-            "replies": [message.text for message in completions],
-            "meta": [message.meta for message in completions],
-        }
\ No newline at end of file
+    @component.output_types(replies=List[str], meta=List[Dict[str, Any]])
+    async def run_async(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        streaming_callback: Optional[Callable[[StreamingChunk], None]] = None,
+        generation_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Asynchronous version of `run`, using AsyncOpenAI so that generation does not block the event loop.
+
+        If the task is cancelled while streaming, the HTTP response is closed and no further tokens are read.
+        """
+        openai_formatted_messages = self._prepare_messages(prompt, system_prompt)
+        generation_kwargs = {**self.generation_kwargs, **(generation_kwargs or {})}
+        streaming_callback = streaming_callback or self.streaming_callback
+        if streaming_callback is not None:
+            self._check_streaming(generation_kwargs)
+
+        completion: Union[AsyncStream[ChatCompletionChunk], ChatCompletion] = await self._get_async_client().chat.completions.create(
+            model=self.model,
+            messages=openai_formatted_messages,  # type: ignore
+            stream=streaming_callback is not None,
+            **generation_kwargs,
+        )
+
+        completions: List[ChatMessage] = []
+        if isinstance(completion, AsyncStream):
+            chunks: List[StreamingChunk] = []
+            last = None
+            try:
+                async for chunk in completion:
+                    if not chunk.choices:
+                        continue
+                    last = chunk
+                    chunks.append(self._to_streaming_chunk(chunk))
+                    result = streaming_callback(chunk)
+                    if inspect.isawaitable(result):
+                        await result
+            except asyncio.CancelledError:
+                logger.info("生成被取消，关闭流式响应")
+                raise
+            finally:
+                # 正常结束时流已读完，取消或出错时释放连接
+                await completion.close()
+            completions = [self._connect_chunks(last, chunks)] if last is not None else []
+        elif isinstance(completion, ChatCompletion):
+            completions = [self._build_message(completion, choice) for choice in completion.choices]
+
+        return self._finish(completions)
\ No newline at end of file
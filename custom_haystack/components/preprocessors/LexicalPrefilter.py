@@ -0,0 +1,118 @@
+from haystack import Document, component, logging
+from collections import Counter
+import heapq
+import threading
+import numpy as np
+from typing import Dict, List, Optional
+
+from custom_haystack.utils import lexical_terms
+
+logger = logging.getLogger(__name__)
+
+
+class _RequestStats:
+    """单个请求目前为止所有分片的BM25统计，以及送去嵌入的分数中最高的top_m个"""
+    def __init__(self):
+        self.documents = 0
+        self.total_length = 0.0
+        self.df: Counter = Counter()
+        # 最小堆，堆顶是进入前top_m的门槛
+        self.top: List[float] = []
+
+
+@component
+class LexicalPrefilter:
+    """
+    嵌入前按查询对分片做BM25粗排，每个请求只有进入前top_m的分片送去嵌入
+
+    - 打分只看查询中的词项：分片词频组成(分片数, 查询词项数)矩阵，向量化计算；
+      IDF和平均长度按该请求（meta[namespace_field]）目前为止的全部分片累计，不同页面的分数可以比较
+    - 页面逐个到达，已嵌入的分片无法撤回：分片的分数进入该请求目前为止的前top_m时才嵌入。
+      第一个页面最多嵌入top_m个，之后的页面只有超过当前门槛的分片才嵌入，
+      嵌入总数随页面数大致按对数增长，而不是按页面数线性增长
+    - 分数相同时保留靠前的分片，页面开头通常是正文摘要
+    - 其余分片从skipped输出，可以不经嵌入直接写入文档存储，仍能被BM25检索到
+    - 请求内统计随命名空间的生命周期释放，调用方在请求结束时调用`release`
+
+    使用示例：
+    ```python
+    prefilter = LexicalPrefilter(top_m=20)
+    result = prefilter.run(documents=chunks, query="0x80070005 错误怎么解决")
+    result["documents"], result["skipped"]
+    prefilter.release(request_id)
+    ```
+    """
+    def __init__(self, top_m: int = 20, k1: float = 1.5, b: float = 0.75, namespace_field: str = "request_id"):
+        """
+        :param top_m: 每个请求送去嵌入的分片数（按分数的前top_m名计）
+        :param k1: BM25词频饱和参数
+        :param b: BM25文档长度归一化参数
+        :param namespace_field: 区分请求的meta字段
+        """
+        self.top_m = top_m
+        self.k1 = k1
+        self.b = b
+        self.namespace_field = namespace_field
+        self._requests: Dict[Optional[str], _RequestStats] = {}
+        self._lock = threading.Lock()
+
+    def score(self, documents: List[Document], query: str, stats: Optional[_RequestStats] = None) -> np.ndarray:
+        """
+        每个分片对查询的BM25分数
+
+        :param stats: 请求内累计的统计，本批分片先计入再打分；None为只按本批分片计算
+        """
+        stats = stats if stats is not None else _RequestStats()
+        vocabulary = {term: column for column, term in enumerate(dict.fromkeys(lexical_terms(query)))}
+        tf = np.zeros((len(documents), len(vocabulary)), dtype=np.float32)
+        lengths = np.zeros(len(documents), dtype=np.float32)
+        for row, doc in enumerate(documents):
+            terms = lexical_terms(doc.content or "")
+            lengths[row] = len(terms)
+            for term, freq in Counter(terms).items():
+                column = vocabulary.get(term)
+                if column is not None:
+                    tf[row, column] = freq
+        stats.documents += len(documents)
+        stats.total_length += float(lengths.sum())
+        stats.df.update({term: int(count) for term, count in zip(vocabulary, (tf > 0).sum(axis=0))})
+        if not vocabulary:
+            return np.zeros(len(documents), dtype=np.float32)
+        df = np.array([stats.df[term] for term in vocabulary], dtype=np.float32)
+        idf = np.log(1 + (stats.documents - df + 0.5) / (df + 0.5))
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(stats.total_length / stats.documents, 1.0))
+        return (idf * tf * (self.k1 + 1) / (tf + norm[:, None])).sum(axis=1)
+
+    @component.output_types(documents=List[Document], skipped=List[Document])
+    def run(self, documents: List[Document], query: str):
+        """
+        :param documents: 同一请求的一批分片，通常是一个页面
+        :returns: documents为按原顺序排列、进入该请求前top_m的分片，skipped为其余分片
+        """
+        if not documents:
+            return {"documents": [], "skipped": []}
+        namespace = (documents[0].meta or {}).get(self.namespace_field)
+        selected = set()
+        # 同一请求的多个页面可能在不同线程中同时运行
+        with self._lock:
+            stats = self._requests.setdefault(namespace, _RequestStats())
+            scores = self.score(documents, query, stats)
+            # 稳定排序，分数相同时保留靠前的分片
+            for i in np.argsort(-scores, kind="stable").tolist():
+                score = float(scores[i])
+                if len(stats.top) < self.top_m:
+                    heapq.heappush(stats.top, score)
+                elif score > stats.top[0]:
+                    heapq.heapreplace(stats.top, score)
+                else:
+                    break
+                selected.add(i)
+        kept = [doc for i, doc in enumerate(documents) if i in selected]
+        skipped = [doc for i, doc in enumerate(documents) if i not in selected]
+        logger.debug(f"粗排保留分片 {len(kept)}/{len(documents)}")
+        return {"documents": kept, "skipped": skipped}
+
+    def release(self, namespace: str):
+        """请求结束，释放请求内统计"""
+        with self._lock:
+            self._requests.pop(namespace, None)
@@ -0,0 +1,218 @@
+from haystack import Document, component, logging
+import re
+from typing import List, Optional, Tuple
+
+from custom_haystack.utils import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+_HEADING = re.compile(r"^#{1,6}\s")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{3,}")
+_SENTENCE = re.compile(r".*?(?:[。！？；!?;]+|\.\s+|\n|$)", re.S)
+
+
+@component
+class MarkdownTokenSplitter:
+    """
+    按token预算切分Markdown文档，替代按固定行数切分
+
+    - 先按Markdown结构切成块：标题、代码块、表格、段落，块内不切断
+    - 相邻块合并到max_tokens以内；遇到标题且当前分片不少于min_tokens时另起一片
+    - 超长块继续细分：表格按行（每片重复表头）、代码块按行（每片补全围栏）、段落按句子，
+      仍然超长的（如压缩过的页面）按token硬切
+    - 同一章节内的相邻分片重叠overlap_tokens个token，分片不以标题开头时在开头补上所在章节的标题
+    - 输出文档的meta带source_id和split_id，与DocumentSplitter一致
+
+    使用示例：
+    ```python
+    splitter = MarkdownTokenSplitter(max_tokens=400, overlap_tokens=50, tokenizer="BAAI/bge-m3")
+    result = splitter.run(documents=[Document(content=markdown)])
+    ```
+    """
+    def __init__(self,
+                 max_tokens: int = 400,
+                 overlap_tokens: int = 50,
+                 min_tokens: Optional[int] = None,
+                 tokenizer: Optional[str] = None,
+                 heading_context: bool = True,
+                 ):
+        """
+        :param max_tokens: 单个分片的token上限，应小于嵌入模型的输入上限
+        :param overlap_tokens: 同一章节内相邻分片的重叠token数
+        :param min_tokens: 分片达到该token数后遇到标题才另起一片，默认max_tokens的四分之一
+        :param tokenizer: HuggingFace分词器名称，通常与嵌入模型一致；None为按字符估算
+        :param heading_context: 分片开头补上所在章节的标题
+        """
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.min_tokens = min_tokens if min_tokens is not None else max_tokens // 4
+        self.tokenizer = tokenizer
+        self.heading_context = heading_context
+        self.counter = TokenCounter(tokenizer)
+
+    @staticmethod
+    def _blocks(text: str) -> List[Tuple[str, str]]:
+        """把Markdown切成(类型, 文本)块，类型为heading、code、table、text"""
+        lines = text.split("\n")
+        blocks, paragraph = [], []
+
+        def flush():
+            if paragraph:
+                blocks.append(("text", "\n".join(paragraph)))
+                paragraph.clear()
+
+        i = 0
+        while i < len(lines):
+            line = lines[i]
+            stripped = line.strip()
+            if stripped.startswith("```") or stripped.startswith("~~~"):
+                flush()
+                fence = stripped[:3]
+                j = i + 1
+                while j < len(lines) and not lines[j].strip().startswith(fence):
+                    j += 1
+                blocks.append(("code", "\n".join(lines[i:j + 1])))
+                i = j + 1
+            elif _HEADING.match(line):
+                flush()
+                blocks.append(("heading", stripped))
+                i += 1
+            elif stripped.startswith("|"):
+                flush()
+                j = i
+                while j < len(lines) and lines[j].strip().startswith("|"):
+                    j += 1
+                blocks.append(("table", "\n".join(lines[i:j])))
+                i = j
+            elif not stripped:
+                flush()
+                i += 1
+            else:
+                paragraph.append(line)
+                i += 1
+        flush()
+        return blocks
+
+    def _group(self, units: List[str], budget: int, joiner: str) -> List[str]:
+        """把单元按顺序合并成不超过budget个token的组，单个超长单元按token硬切"""
+        groups, current, current_tokens = [], [], 0
+        # 连接符也计入token数
+        for unit, tokens in zip(units, self.counter.count_many([unit + joiner for unit in units])):
+            if tokens > budget:
+                if current:
+                    groups.append(joiner.join(current))
+                    current, current_tokens = [], 0
+                groups.extend(self.counter.split(unit, budget))
+                continue
+            if current and current_tokens + tokens > budget:
+                groups.append(joiner.join(current))
+                current, current_tokens = [], 0
+            current.append(unit)
+            current_tokens += tokens
+        if current:
+            groups.append(joiner.join(current))
+        return groups
+
+    def _pieces(self, kind: str, text: str, reserve: int = 0) -> List[str]:
+        """
+        把超长块细分成不超过max_tokens的片段
+
+        :param reserve: 段落片段为章节标题和重叠预留的token数
+        """
+        lines = text.split("\n")
+        if kind == "table":
+            header_size = 2 if len(lines) > 1 and _TABLE_SEPARATOR.match(lines[1]) else 1
+            header = "\n".join(lines[:header_size])
+            budget = max(self.max_tokens - self.counter.count(header), 1)
+            return [f"{header}\n{rows}" for rows in self._group(lines[header_size:], budget, "\n")]
+        if kind == "code" and len(lines) > 2:
+            opening = lines[0]
+            closing = lines[-1] if lines[-1].strip().startswith(opening.strip()[:3]) else opening.strip()[:3]
+            body = lines[1:-1] if closing == lines[-1] else lines[1:]
+            budget = max(self.max_tokens - self.counter.count(f"{opening}\n\n{closing}"), 1)
+            return [f"{opening}\n{group}\n{closing}" for group in self._group(body, budget, "\n")]
+        sentences = [sentence for sentence in _SENTENCE.findall(text) if sentence]
+        return self._group(sentences, max(self.max_tokens - reserve, 1), "")
+
+    def _split_text(self, text: str) -> List[str]:
+        chunks: List[str] = []
+        current: List[str] = []
+        current_tokens = 0
+        headings: List[Tuple[int, str]] = []
+        previous_kind = None
+
+        def emit():
+            if current:
+                chunks.append("\n\n".join(current))
+
+        def heading_context() -> Tuple[str, int]:
+            if not self.heading_context or not headings:
+                return "", 0
+            context = "\n".join(heading for _, heading in headings)
+            tokens = self.counter.count(f"{context}\n\n")
+            return (context, tokens) if tokens <= self.max_tokens // 4 else ("", 0)
+
+        def start_chunk(overlap: str = ""):
+            """新分片以章节标题和上一分片的末尾开头"""
+            nonlocal current, current_tokens
+            current, current_tokens = [], 0
+            context, tokens = heading_context()
+            if context:
+                current.append(context)
+                current_tokens += tokens
+            if overlap:
+                current.append(overlap)
+                current_tokens += self.counter.count(f"{overlap}\n\n")
+
+        blocks = self._blocks(text)
+        block_tokens = self.counter.count_many([f"{block}\n\n" for _, block in blocks])
+        for (kind, block), tokens in zip(blocks, block_tokens):
+            if kind == "heading":
+                level = len(block) - len(block.lstrip("#"))
+                if current_tokens >= self.min_tokens:
+                    emit()
+                    current, current_tokens = [], 0
+                headings = [h for h in headings if h[0] < level] + [(level, block)]
+                current.append(block)
+                current_tokens += tokens
+                previous_kind = kind
+                continue
+            if tokens > self.max_tokens:
+                pieces = self._pieces(kind, block, reserve=heading_context()[1] + self.overlap_tokens + 2)
+                piece_tokens = self.counter.count_many([f"{piece}\n\n" for piece in pieces])
+            else:
+                pieces, piece_tokens = [block], [tokens]
+            for piece, piece_token_count in zip(pieces, piece_tokens):
+                if current and current_tokens + piece_token_count > self.max_tokens:
+                    previous = current[-1]
+                    emit()
+                    overlap = ""
+                    # 只在段落之间重叠，表格和代码块的片段截断后不再完整
+                    if (self.overlap_tokens and kind == "text" and previous_kind == "text"
+                            and piece_token_count + self.overlap_tokens <= self.max_tokens):
+                        overlap = self.counter.tail(previous, self.overlap_tokens)
+                    start_chunk(overlap)
+                    if current and current_tokens + piece_token_count > self.max_tokens:
+                        # 标题和重叠放不下时只保留片段本身
+                        current, current_tokens = [], 0
+                current.append(piece)
+                current_tokens += piece_token_count
+                previous_kind = kind
+        emit()
+        return chunks
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        split_docs = []
+        for doc in documents:
+            if not doc.content:
+                logger.warning(f"跳过空文档 {doc.id}")
+                continue
+            for split_id, chunk in enumerate(self._split_text(doc.content)):
+                split_docs.append(Document(
+                    content=chunk,
+                    meta={**(doc.meta or {}), "source_id": doc.id, "split_id": split_id}
+                ))
+        return {"documents": split_docs}
@@ -0,0 +1,278 @@
+from haystack import Document, component, logging
+import hashlib
+import re
+import threading
+import time
+import numpy as np
+from typing import Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def simhash(text: str, shingle: int = 4) -> int:
+    """
+    64位SimHash签名，特征为字符shingle
+
+    字符shingle对中文和英文同样适用；大小写和空白差异不影响签名
+    """
+    text = re.sub(r"\s+", " ", text.casefold()).strip()
+    if len(text) <= shingle:
+        grams = [text]
+    else:
+        grams = [text[i:i + shingle] for i in range(len(text) - shingle + 1)]
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "little") for gram in grams),
+        dtype=np.uint64,
+        count=len(grams)
+    )
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    weights = bits.sum(axis=0, dtype=np.int64) * 2 - len(grams)
+    return int(np.packbits(weights > 0, bitorder="little").view(np.uint64)[0])
+
+
+class SimHashIndex:
+    """
+    SimHash近重复查找
+
+    签名切成max_distance + 1段，海明距离不超过max_distance的两个签名至少有一段完全相同（抽屉原理），
+    只需比较同段相同的候选。设置ttl时过期的签名不再参与比较，超过maxsize时淘汰最旧的一半。
+    加入签名时可以带一个标签（分片id、命名空间），之后用`remove`按标签删除。
+    """
+    def __init__(self, max_distance: int = 3, ttl: Optional[float] = None, maxsize: Optional[int] = None):
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._bands = max_distance + 1
+        self._width = 64 // self._bands
+        # 条目为(签名, 加入时间, 标签, 序号)，序号保证条目互不相等，按序号可以从桶中删除
+        self._buckets: Dict[Tuple[int, int], List[tuple]] = {}
+        self._entries: Dict[int, tuple] = {}
+        self._tags: Dict[Hashable, List[tuple]] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _keys(self, signature: int):
+        mask = (1 << self._width) - 1
+        for band in range(self._bands):
+            yield band, (signature >> (band * self._width)) & mask
+
+    def _alive(self, added_at: float, now: float) -> bool:
+        return self.ttl is None or now - added_at <= self.ttl
+
+    def _find(self, signature: int, now: float) -> bool:
+        for key in self._keys(signature):
+            for other, added_at, _, _ in self._buckets.get(key, ()):
+                if self._alive(added_at, now) and bin(signature ^ other).count("1") <= self.max_distance:
+                    return True
+        return False
+
+    def _add(self, signature: int, now: float, tag: Hashable):
+        self._seq += 1
+        entry = (signature, now, tag, self._seq)
+        self._entries[self._seq] = entry
+        for key in self._keys(signature):
+            self._buckets.setdefault(key, []).append(entry)
+        if tag is not None:
+            self._tags.setdefault(tag, []).append(entry)
+        if self.maxsize and len(self._entries) > self.maxsize:
+            entries = list(self._entries.values())
+            self._rebuild(entries[len(entries) // 2:])
+
+    def _remove(self, entry: tuple):
+        if self._entries.pop(entry[3], None) is None:
+            return
+        for key in self._keys(entry[0]):
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                continue
+            bucket.remove(entry)
+            if not bucket:
+                del self._buckets[key]
+
+    def find(self, signature: int) -> bool:
+        """是否已有海明距离不超过max_distance的签名"""
+        with self._lock:
+            return self._find(signature, time.time())
+
+    def add(self, signature: int, tag: Hashable = None):
+        with self._lock:
+            self._add(signature, time.time(), tag)
+
+    def add_if_new(self, signature: int, tag: Hashable = None) -> bool:
+        """没有近似重复时加入并返回True，并发调用时检查和加入是原子的"""
+        now = time.time()
+        with self._lock:
+            if self._find(signature, now):
+                return False
+            self._add(signature, now, tag)
+            return True
+
+    def remove(self, tag: Hashable):
+        """删除带该标签的所有签名"""
+        with self._lock:
+            for entry in self._tags.pop(tag, ()):
+                self._remove(entry)
+
+    def _rebuild(self, entries: List[tuple]):
+        now = time.time()
+        self._entries = {entry[3]: entry for entry in entries if self._alive(entry[1], now)}
+        self._buckets = {}
+        self._tags = {}
+        for entry in self._entries.values():
+            for key in self._keys(entry[0]):
+                self._buckets.setdefault(key, []).append(entry)
+            if entry[2] is not None:
+                self._tags.setdefault(entry[2], []).append(entry)
+
+
+class _RequestSignatures:
+    """单个请求的签名索引：已写入分片的签名，以及已通过去重、等待写入结果的签名"""
+    def __init__(self, max_distance: int):
+        # 等待写入的签名以分片id为标签，写入失败时按标签删除
+        self.index = SimHashIndex(max_distance)
+        self.pending: Dict[str, int] = {}
+
+
+@component
+class NearDuplicateFilter:
+    """
+    在嵌入前去掉近似重复的分片（镜像站、转载、导航栏、Cookie提示、页脚等）
+
+    - 同一请求（meta[namespace_field]）内的分片互相去重，每个页面单独运行管道时也能跨页面去重。
+      通过去重的分片立即占住请求内索引，同时抓取完成、仍在嵌入的镜像页面也会被去掉
+    - cross_request=True时还与之前请求保留下来的分片去重，只应在检索范围包含所有保留文档时开启，
+      签名按document_ttl过期，与文档存储的淘汰时间对齐；命名空间被删除时调用`forget`删除它的签名，
+      从快照恢复保留的文档后调用`restore`重建签名
+    - 只有写入文档存储成功的分片才进入跨请求索引：写入成功后调用方用`commit`确认；
+      运行时传入batch，处理结束后用`discard(batch)`删除这一批中未确认的签名，
+      嵌入或写入失败的分片不会挡住它的近似重复
+    - 请求内索引随命名空间的生命周期释放，调用方在请求结束或命名空间被淘汰时调用`release`
+
+    使用示例：
+    ```python
+    dedup = NearDuplicateFilter(max_distance=3)
+    document_store.add_release_listener(dedup.release)
+    result = dedup.run(documents=chunks, batch="page-1")
+    result["documents"], result["dropped"]
+    # 写入成功后
+    dedup.commit(written)
+    dedup.discard("page-1")
+    ```
+    """
+    def __init__(self,
+                 max_distance: int = 3,
+                 shingle: int = 4,
+                 namespace_field: str = "request_id",
+                 cross_request: bool = False,
+                 document_ttl: Optional[float] = 3600,
+                 max_signatures: int = 1000000,
+                 ):
+        """
+        :param max_distance: 64位签名的海明距离不超过该值视为重复
+        :param shingle: 字符shingle长度
+        :param namespace_field: 区分请求的meta字段
+        :param cross_request: 是否与之前请求的分片去重
+        :param document_ttl: 跨请求签名的过期时间，应与文档存储一致
+        :param max_signatures: 跨请求签名数上限
+        """
+        self.max_distance = max_distance
+        self.shingle = shingle
+        self.namespace_field = namespace_field
+        self.cross_request = cross_request
+        self._requests: Dict[Optional[str], _RequestSignatures] = {}
+        # batch -> 这一批通过去重的(命名空间, 分片id)
+        self._batches: Dict[str, List[Tuple[Optional[str], str]]] = {}
+        self._requests_lock = threading.Lock()
+        # 跨请求签名以命名空间为标签
+        self._corpus = SimHashIndex(max_distance, ttl=document_ttl, maxsize=max_signatures) if cross_request else None
+        self.checked = 0
+        self.dropped = 0
+
+    def _request(self, namespace: Optional[str]) -> _RequestSignatures:
+        with self._requests_lock:
+            request = self._requests.get(namespace)
+            if request is None:
+                request = self._requests[namespace] = _RequestSignatures(self.max_distance)
+            return request
+
+    @component.output_types(documents=List[Document], dropped=int)
+    def run(self, documents: List[Document], batch: Optional[str] = None):
+        """
+        :param batch: 本次运行的标识，处理结束后用`discard(batch)`删除未确认的签名；
+            None时未确认的签名保留到请求结束
+        """
+        kept, dropped = [], 0
+        for doc in documents:
+            if not doc.content:
+                kept.append(doc)
+                continue
+            namespace = (doc.meta or {}).get(self.namespace_field)
+            signature = simhash(doc.content, self.shingle)
+            request = self._request(namespace)
+            # 请求内索引包含等待写入的签名，同一批和同时在处理的其它页面的分片都参与比较
+            if (self._corpus is not None and self._corpus.find(signature)) \
+                    or not request.index.add_if_new(signature, tag=doc.id):
+                dropped += 1
+                continue
+            with self._requests_lock:
+                request.pending[doc.id] = signature
+                if batch is not None:
+                    self._batches.setdefault(batch, []).append((namespace, doc.id))
+            kept.append(doc)
+        self.checked += len(documents)
+        self.dropped += dropped
+        if dropped:
+            logger.info(f"去掉近似重复分片 {dropped}/{len(documents)}")
+        return {"documents": kept, "dropped": dropped}
+
+    def commit(self, documents: List[Document]):
+        """分片写入成功后确认签名，cross_request时还加入跨请求索引"""
+        for doc in documents:
+            namespace = (doc.meta or {}).get(self.namespace_field)
+            with self._requests_lock:
+                request = self._requests.get(namespace)
+                signature = request.pending.pop(doc.id, None) if request is not None else None
+            if signature is not None and self._corpus is not None:
+                self._corpus.add(signature, tag=namespace)
+
+    def discard(self, batch: str):
+        """删除这一批中未commit的签名（嵌入或写入失败），让它们的近似重复之后还能写入"""
+        with self._requests_lock:
+            entries = self._batches.pop(batch, [])
+            failed = []
+            for namespace, doc_id in entries:
+                request = self._requests.get(namespace)
+                if request is not None and request.pending.pop(doc_id, None) is not None:
+                    failed.append((request, doc_id))
+        for request, doc_id in failed:
+            request.index.remove(doc_id)
+
+    def restore(self, documents: List[Document]):
+        """从快照恢复保留的文档后重建跨请求签名"""
+        if self._corpus is None:
+            return
+        for doc in documents:
+            if doc.content:
+                self._corpus.add(simhash(doc.content, self.shingle), tag=(doc.meta or {}).get(self.namespace_field))
+
+    def release(self, namespace: str):
+        """请求结束或命名空间被淘汰，释放请求内索引和未commit的签名"""
+        with self._requests_lock:
+            self._requests.pop(namespace, None)
+
+    def forget(self, namespace: str):
+        """命名空间的文档被删除，跨请求索引中删除它的签名"""
+        self.release(namespace)
+        if self._corpus is not None:
+            self._corpus.remove(namespace)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "checked": self.checked,
+            "dropped": self.dropped,
+            "requests": len(self._requests),
+            "corpus_signatures": len(self._corpus) if self._corpus is not None else 0,
+        }
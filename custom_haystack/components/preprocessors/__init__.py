@@ -0,0 +1,5 @@
+from .MarkdownTokenSplitter import MarkdownTokenSplitter
+from .NearDuplicateFilter import NearDuplicateFilter, SimHashIndex, simhash
+from .LexicalPrefilter import LexicalPrefilter
+
+__all__ = ["MarkdownTokenSplitter", "NearDuplicateFilter", "SimHashIndex", "simhash", "LexicalPrefilter"]
@@ -0,0 +1,205 @@
+from haystack import Document, component, logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import replace
+import asyncio
+import hashlib
+import multiprocessing
+import threading
+import time
+from typing import List, Optional
+
+from custom_haystack.utils import LRUCache
+from custom_haystack.utils.cross_encoder_worker import init_worker, predict, spawn_main
+
+logger = logging.getLogger(__name__)
+
+
+@component
+class CrossEncoderRanker:
+    """
+    在CPU上用小型交叉编码器对检索结果重排，只保留前top_k个分片
+
+    - 模型在单独的子进程中运行，max_threads只限制该进程的torch推理线程数，
+      不影响同一进程内的本地嵌入模型和合并批次工作线程；子进程的入口在cross_encoder_worker模块，
+      不会重新执行父进程的主模块
+    - 查询与分片成对按batch_size分批打分，所有请求共用一个调度线程依次提交给子进程
+    - 分数按(查询哈希, 分片哈希)缓存，重复的查询和保留的文档不再计算
+    - 超过time_budget时放弃重排，按检索器的顺序取前top_k个；已算出的分数仍写入缓存
+    - 重排是可选的：模型由`load`在工作线程中加载，未加载完成、加载失败或子进程异常退出时
+      直接按检索器的顺序取前top_k个；不提供warm_up，管道运行时不会在事件循环中同步启动子进程
+
+    使用示例：
+    ```python
+    ranker = CrossEncoderRanker(model="BAAI/bge-reranker-base", top_k=3, time_budget=1.0)
+    ranker.load()
+    result = ranker.run(documents=retrieved, query="0x80070005 错误怎么解决")
+    ```
+    """
+    def __init__(self,
+                 model: str = "BAAI/bge-reranker-base",
+                 top_k: int = 3,
+                 batch_size: int = 16,
+                 max_threads: Optional[int] = 2,
+                 time_budget: Optional[float] = 1.0,
+                 device: str = "cpu",
+                 max_length: int = 512,
+                 cache_size: int = 100000,
+                 retry_interval: float = 300,
+                 ):
+        """
+        :param model: sentence-transformers交叉编码器模型
+        :param top_k: 重排后保留的分片数
+        :param batch_size: 每批打分的(查询, 分片)对数，批次之间检查时间预算
+        :param max_threads: 重排子进程的torch推理线程数上限，None为不限制
+        :param time_budget: 单次重排的时间预算（秒），包括排队时间，None为不限制
+        :param device: 推理设备
+        :param max_length: 查询和分片拼接后的token上限
+        :param cache_size: 缓存的分数个数
+        :param retry_interval: 加载失败后多久（秒）才允许再次加载
+        """
+        self.model = model
+        self.top_k = top_k
+        self.batch_size = batch_size
+        self.max_threads = max_threads
+        self.time_budget = time_budget
+        self.device = device
+        self.max_length = max_length
+        self.cache = LRUCache(maxsize=cache_size)
+        self.retry_interval = retry_interval
+        self._process: Optional[ProcessPoolExecutor] = None
+        self._load_lock = threading.Lock()
+        self._loading = False
+        self._failed_at: Optional[float] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reranker")
+        self.timeouts = 0
+        self.fallbacks = 0
+
+    @property
+    def is_ready(self) -> bool:
+        return self._process is not None
+
+    @property
+    def should_load(self) -> bool:
+        """子进程未启动、没有正在加载，且距上次加载失败已超过retry_interval"""
+        if self._process is not None or self._loading:
+            return False
+        return self._failed_at is None or time.time() - self._failed_at > self.retry_interval
+
+    def load(self):
+        """
+        启动重排子进程并加载模型，并发调用时只启动一次；会阻塞到模型加载完成，应在工作线程中调用
+
+        加载失败只记录日志，重排退化为检索顺序
+        """
+        with self._load_lock:
+            if self._process is not None:
+                return
+            self._loading = True
+            start = time.time()
+            # spawn启动，不继承父进程的线程和torch状态
+            process = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(self.model, self.device, self.max_length, self.max_threads)
+            )
+            try:
+                # 子进程在第一次submit时启动
+                with spawn_main():
+                    future = process.submit(predict, [])
+                future.result()
+            except Exception as e:
+                process.shutdown(wait=False, cancel_futures=True)
+                self._failed_at = time.time()
+                logger.error(f"加载重排模型 {self.model} 失败，使用检索顺序: {str(e)}")
+                return
+            finally:
+                self._loading = False
+            self._process = process
+            self._failed_at = None
+            logger.info(f"加载重排模型 {self.model} 耗时: {time.time() - start:.2f}秒")
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _record_timeout(self):
+        self.timeouts += 1
+        logger.warning(f"重排超过时间预算 {self.time_budget}秒，使用检索顺序")
+
+    def _scores(self, process: ProcessPoolExecutor, query: str, documents: List[Document],
+                deadline: Optional[float]) -> Optional[List[float]]:
+        """逐批计算未缓存的分数，超过deadline或子进程退出时返回None"""
+        query_hash = self._hash(query)
+        keys = [(query_hash, self._hash(doc.content or "")) for doc in documents]
+        scores = [self.cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        for start in range(0, len(missing), self.batch_size):
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                self._record_timeout()
+                return None
+            batch = missing[start:start + self.batch_size]
+            try:
+                future = process.submit(predict, [(query, documents[i].content or "") for i in batch])
+                batch_scores = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                # 子进程继续算完这一批，结果丢弃
+                self._record_timeout()
+                return None
+            except BrokenProcessPool:
+                # 子进程异常退出（如内存不足），由调用方通过load在工作线程中重新启动
+                logger.error("重排子进程已退出，使用检索顺序")
+                self.fallbacks += 1
+                if self._process is process:
+                    self._process = None
+                process.shutdown(wait=False, cancel_futures=True)
+                return None
+            for i, score in zip(batch, batch_scores):
+                scores[i] = score
+                self.cache.put(keys[i], scores[i])
+        return scores
+
+    def _rank(self, query: str, documents: List[Document], top_k: int, deadline: Optional[float]) -> List[Document]:
+        if not documents:
+            return []
+        process = self._process
+        if process is None:
+            # 模型未加载完成、加载失败或子进程已退出
+            self.fallbacks += 1
+            return documents[:top_k]
+        scores = self._scores(process, query, documents, deadline)
+        if scores is None:
+            # 超时或子进程退出，按检索顺序
+            return documents[:top_k]
+        order = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)[:top_k]
+        return [replace(documents[i], score=scores[i]) for i in order]
+
+    def _deadline(self) -> Optional[float]:
+        return time.monotonic() + self.time_budget if self.time_budget else None
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document], query: str, top_k: Optional[int] = None):
+        """
+        :param documents: 检索器按相关性排序的文档
+        :param query: 查询文本
+        :param top_k: 保留的文档数，默认使用初始化参数
+        :returns: 按交叉编码器分数降序、score已替换的文档；超时或模型不可用时为检索顺序的前top_k个
+        """
+        future = self._executor.submit(self._rank, query, documents, top_k or self.top_k, self._deadline())
+        return {"documents": future.result()}
+
+    @component.output_types(documents=List[Document])
+    async def run_async(self, documents: List[Document], query: str, top_k: Optional[int] = None):
+        future = self._executor.submit(self._rank, query, documents, top_k or self.top_k, self._deadline())
+        return {"documents": await asyncio.wrap_future(future)}
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), "ready": self.is_ready, "timeouts": self.timeouts, "fallbacks": self.fallbacks}
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._process is not None:
+            self._process.shutdown(wait=False, cancel_futures=True)
+            self._process = None
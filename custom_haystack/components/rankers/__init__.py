@@ -0,0 +1,3 @@
+from .CrossEncoderRanker import CrossEncoderRanker
+
+__all__ = ["CrossEncoderRanker"]
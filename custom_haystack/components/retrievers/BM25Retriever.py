@@ -0,0 +1,54 @@
+from haystack import Document, component, logging
+from dataclasses import replace
+import asyncio
+from typing import List, Optional, Union
+
+from custom_haystack.document_stores import ScopedInMemoryDocumentStore
+
+logger = logging.getLogger(__name__)
+
+
+@component
+class BM25Retriever:
+    """
+    基于ScopedInMemoryDocumentStore.lexical_index的BM25检索组件
+
+    补充向量检索对错误码、版本号、型号等精确标识符召回差的问题，通常与NumpyEmbeddingRetriever
+    并行运行，再用DocumentJoiner按倒数排名融合（RRF）。
+
+    使用示例：
+    ```python
+    retriever = BM25Retriever(document_store, top_k=10)
+    result = retriever.run(query="0x80070005 错误", namespace=request_id)
+    documents = result["documents"]
+    ```
+    """
+    def __init__(self, document_store: ScopedInMemoryDocumentStore, top_k: int = 10):
+        self.document_store = document_store
+        self.top_k = top_k
+
+    @component.output_types(documents=List[Document])
+    def run(self, query: str, namespace: Optional[Union[str, List[str]]] = None, top_k: Optional[int] = None,
+            include_kept: bool = False):
+        """
+        :param query: 查询文本
+        :param namespace: 只检索该命名空间（或这组命名空间）的文档，None为全部
+        :param top_k: 返回的文档数，默认使用初始化参数
+        :param include_kept: 同时检索文档存储中所有保留的命名空间
+        :returns: 按BM25分数降序、score已填充的文档
+        """
+        hits = self.document_store.lexical_index.search(query, top_k or self.top_k, namespace, include_kept)
+        storage = self.document_store.storage
+        documents = []
+        for doc_id, score in hits:
+            doc = storage.get(doc_id)
+            if doc is not None:
+                documents.append(replace(doc, score=score))
+        return {"documents": documents}
+
+    @component.output_types(documents=List[Document])
+    async def run_async(self, query: str, namespace: Optional[Union[str, List[str]]] = None, top_k: Optional[int] = None,
+            include_kept: bool = False):
+        # 倒排表遍历是纯Python计算，放到线程中，与查询嵌入并行
+        return await asyncio.to_thread(self.run, query=query, namespace=namespace, top_k=top_k,
+                                       include_kept=include_kept)
@@ -0,0 +1,52 @@
+from haystack import Document, component, logging
+from dataclasses import replace
+from typing import List, Optional, Union
+
+from custom_haystack.document_stores import ScopedInMemoryDocumentStore
+
+logger = logging.getLogger(__name__)
+
+
+@component
+class NumpyEmbeddingRetriever:
+    """
+    基于ScopedInMemoryDocumentStore.vector_index的向量检索组件
+
+    与InMemoryEmbeddingRetriever逐个文档计算相似度不同，这里一次矩阵向量乘法完成打分，
+    namespace限定只检索某个请求写入的文档。
+
+    使用示例：
+    ```python
+    retriever = NumpyEmbeddingRetriever(document_store, top_k=10)
+    result = retriever.run(query_embedding=embedding, namespace=request_id)
+    documents = result["documents"]
+    ```
+    """
+    def __init__(self, document_store: ScopedInMemoryDocumentStore, top_k: int = 10):
+        self.document_store = document_store
+        self.top_k = top_k
+
+    @component.output_types(documents=List[Document])
+    def run(self, query_embedding: List[float], namespace: Optional[Union[str, List[str]]] = None, top_k: Optional[int] = None,
+            include_kept: bool = False):
+        """
+        :param query_embedding: 查询向量
+        :param namespace: 只检索该命名空间（或这组命名空间）的文档，None为全部
+        :param top_k: 返回的文档数，默认使用初始化参数
+        :param include_kept: 同时检索文档存储中所有保留的命名空间
+        :returns: 按余弦相似度降序、score已填充的文档
+        """
+        hits = self.document_store.vector_index.search(query_embedding, top_k or self.top_k, namespace, include_kept)
+        storage = self.document_store.storage
+        documents = []
+        for doc_id, score in hits:
+            doc = storage.get(doc_id)
+            # 索引与存储之间的删除存在短暂窗口，跳过已删除的文档
+            if doc is not None:
+                documents.append(replace(doc, score=score))
+        return {"documents": documents}
+
+    @component.output_types(documents=List[Document])
+    async def run_async(self, query_embedding: List[float], namespace: Optional[Union[str, List[str]]] = None, top_k: Optional[int] = None,
+            include_kept: bool = False):
+        return self.run(query_embedding=query_embedding, namespace=namespace, top_k=top_k, include_kept=include_kept)
@@ -0,0 +1,4 @@
+from .NumpyEmbeddingRetriever import NumpyEmbeddingRetriever
+from .BM25Retriever import BM25Retriever
+
+__all__ = ["NumpyEmbeddingRetriever", "BM25Retriever"]
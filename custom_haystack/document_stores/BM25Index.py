@@ -0,0 +1,150 @@
+import heapq
+import math
+import threading
+from collections import Counter
+from typing import Any, Collection, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from custom_haystack.utils import lexical_terms
+
+
+# 保留语料的分区键，与任何命名空间都不相等
+_KEPT = object()
+
+
+class BM25Index:
+    """
+    增量更新的BM25倒排索引
+
+    - 写入和删除只更新涉及的倒排表以及文档数、总长度，不重建整个索引
+    - 检索只遍历查询词项的倒排表，IDF和平均文档长度按当前语料实时计算
+    - 倒排表按命名空间分区，与NumpyVectorIndex一样按命名空间限定检索范围，只遍历相关分区；
+      `keep`把命名空间的倒排表并入保留语料分区，include_kept=True时检索保留语料加上指定的命名空间，
+      不会遍历其它请求的倒排表
+
+    使用示例：
+    ```python
+    index = BM25Index()
+    index.add(["doc-1", "doc-2"], ["错误码 0x80070005", "版本 v1.2.3"], namespaces=["req-1", "req-1"])
+    hits = index.search("0x80070005", top_k=1, namespace="req-1")  # [("doc-1", score)]
+    ```
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        :param k1: 词频饱和参数
+        :param b: 文档长度归一化参数
+        """
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        # 分区（命名空间或_KEPT） -> 词项 -> {文档id: 词频}
+        self._postings: Dict[Any, Dict[str, Dict[str, int]]] = {}
+        # 词项的全局文档频率
+        self._df: Counter = Counter()
+        self._terms: Dict[str, Tuple[str, ...]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._namespaces: Dict[str, Optional[str]] = {}
+        self._kept: Set[Optional[str]] = set()
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self._lengths.keys())
+
+    def _partition(self, namespace: Optional[str]) -> Any:
+        return _KEPT if namespace in self._kept else namespace
+
+    def add(self, ids: Sequence[str], texts: Sequence[str],
+            namespaces: Optional[Sequence[Optional[str]]] = None):
+        """写入文档，已存在的id先删除再写入"""
+        if not ids:
+            return
+        namespaces = namespaces or [None] * len(ids)
+        # 分词在锁外完成
+        counts = [Counter(lexical_terms(text or "")) for text in texts]
+        with self._lock:
+            self.delete([doc_id for doc_id in ids if doc_id in self._lengths])
+            for doc_id, tf, namespace in zip(ids, counts, namespaces):
+                postings = self._postings.setdefault(self._partition(namespace), {})
+                for term, freq in tf.items():
+                    postings.setdefault(term, {})[doc_id] = freq
+                self._df.update(tf.keys())
+                length = sum(tf.values())
+                self._terms[doc_id] = tuple(tf)
+                self._lengths[doc_id] = length
+                self._namespaces[doc_id] = namespace
+                self._total_length += length
+
+    def delete(self, ids: Sequence[str]):
+        with self._lock:
+            for doc_id in ids:
+                length = self._lengths.pop(doc_id, None)
+                if length is None:
+                    continue
+                partition = self._partition(self._namespaces.pop(doc_id))
+                postings = self._postings[partition]
+                for term in self._terms.pop(doc_id):
+                    posting = postings[term]
+                    del posting[doc_id]
+                    if not posting:
+                        del postings[term]
+                    self._df[term] -= 1
+                    if not self._df[term]:
+                        del self._df[term]
+                if not postings:
+                    del self._postings[partition]
+                self._total_length -= length
+
+    def keep(self, namespace: str):
+        """把命名空间的倒排表并入保留语料分区"""
+        with self._lock:
+            if namespace in self._kept:
+                return
+            self._kept.add(namespace)
+            postings = self._postings.pop(namespace, None)
+            if not postings:
+                return
+            kept = self._postings.setdefault(_KEPT, {})
+            for term, posting in postings.items():
+                kept.setdefault(term, {}).update(posting)
+
+    def drop_namespace(self, namespace: str):
+        """命名空间的文档删除后调用"""
+        with self._lock:
+            self._kept.discard(namespace)
+
+    def search(self, query: str, top_k: int = 10,
+               namespace: Optional[Union[str, Collection[str]]] = None,
+               include_kept: bool = False) -> List[Tuple[str, float]]:
+        """
+        :param namespace: 只在该命名空间（或这组命名空间）内检索，None且include_kept为False时检索全部
+        :param include_kept: 同时检索保留语料
+        :returns: 按BM25分数降序的(id, 分数)列表
+        """
+        terms = set(lexical_terms(query))
+        names = [] if namespace is None else [namespace] if isinstance(namespace, str) else namespace
+        with self._lock:
+            count = len(self._lengths)
+            if count == 0 or top_k <= 0 or not terms:
+                return []
+            if namespace is None and not include_kept:
+                partitions = list(self._postings.values())
+            else:
+                keys = {self._partition(name) for name in names}
+                if include_kept:
+                    keys.add(_KEPT)
+                partitions = [self._postings[key] for key in keys if key in self._postings]
+            average_length = self._total_length / count or 1.0
+            scores: Dict[str, float] = {}
+            for term in terms:
+                df = self._df.get(term)
+                if not df:
+                    continue
+                idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+                for postings in partitions:
+                    for doc_id, freq in postings.get(term, {}).items():
+                        norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average_length)
+                        scores[doc_id] = scores.get(doc_id, 0.0) + idf * freq * (self.k1 + 1) / (freq + norm)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
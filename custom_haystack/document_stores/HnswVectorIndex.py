@@ -0,0 +1,285 @@
+from haystack import logging
+import json
+import os
+import threading
+import numpy as np
+from typing import Collection, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+
+class HnswVectorIndex:
+    """
+    基于hnswlib（CPU）的近似最近邻索引，接口与NumpyVectorIndex一致，用于跨请求积累的大规模语料
+
+    - 增量写入，容量不足时resize_index翻倍
+    - 删除使用mark_deleted，新写入复用已删除元素的存储位置
+    - 限定命名空间且候选数不超过brute_force_threshold时，直接取出候选向量做精确计算，
+      否则在HNSW图上带过滤条件检索
+    - `keep`标记的命名空间组成保留语料，增量维护保留/未保留的向量数。include_kept=True时
+      在HNSW图上不带过滤回调检索，按未保留向量的比例多取一些结果，再从这少量结果中去掉未保留的，
+      指定命名空间中未保留的向量另外精确计算后合并
+    - save/load把图和id映射写入目录，重启后恢复
+
+    使用示例：
+    ```python
+    index = HnswVectorIndex(ef_search=64)
+    index.add(["doc-1"], [[0.1, 0.2]], namespaces=[None])
+    hits = index.search([0.1, 0.2], top_k=10)
+    index.save("./data/ann")
+    ```
+    """
+    def __init__(self,
+                 dim: Optional[int] = None,
+                 M: int = 16,
+                 ef_construction: int = 200,
+                 ef_search: int = 64,
+                 initial_capacity: int = 10000,
+                 brute_force_threshold: int = 2000,
+                 ):
+        if hnswlib is None:
+            raise ImportError("HnswVectorIndex requires hnswlib, install it with `pip install hnswlib`")
+        self.dim = dim
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.initial_capacity = initial_capacity
+        self.brute_force_threshold = brute_force_threshold
+        self._lock = threading.RLock()
+        self._index = None
+        # 文档id与hnswlib label的双向映射，label单调递增，删除后的存储位置由hnswlib复用
+        self._labels: Dict[str, int] = {}
+        self._ids: Dict[int, str] = {}
+        self._next_label = 0
+        # 命名空间编码 -> 该命名空间的label集合
+        self._members: Dict[int, Set[int]] = {}
+        self._label_codes: Dict[int, int] = {}
+        self._namespace_codes: Dict[Optional[str], int] = {None: 0}
+        self._next_code = 1
+        # 保留语料的命名空间编码及其向量数
+        self._kept_codes: Set[int] = set()
+        self._kept_count = 0
+        if dim is not None:
+            self._init_index(initial_capacity)
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self._labels.keys())
+
+    def _init_index(self, capacity: int):
+        self._index = hnswlib.Index(space="cosine", dim=self.dim)
+        self._index.init_index(max_elements=capacity, ef_construction=self.ef_construction, M=self.M,
+                               allow_replace_deleted=True)
+        self._index.set_ef(self.ef_search)
+
+    def _namespace_code(self, namespace: Optional[str]) -> int:
+        code = self._namespace_codes.get(namespace)
+        if code is None:
+            code = self._next_code
+            self._next_code += 1
+            self._namespace_codes[namespace] = code
+        return code
+
+    def _reserve(self, count: int):
+        """确保索引能容纳count个新元素（已删除的位置会被复用）"""
+        needed = len(self._labels) + count
+        capacity = self._index.get_max_elements()
+        if needed > capacity:
+            while capacity < needed:
+                capacity *= 2
+            self._index.resize_index(capacity)
+
+    def add(self, ids: Sequence[str], embeddings: Sequence[Sequence[float]],
+            namespaces: Optional[Sequence[Optional[str]]] = None):
+        """增量写入，已存在的id先删除再写入"""
+        if not ids:
+            return
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        namespaces = namespaces or [None] * len(ids)
+        with self._lock:
+            if self._index is None:
+                self.dim = matrix.shape[1]
+                self._init_index(self.initial_capacity)
+            self.delete([doc_id for doc_id in ids if doc_id in self._labels])
+            self._reserve(len(ids))
+            labels = list(range(self._next_label, self._next_label + len(ids)))
+            self._next_label += len(ids)
+            self._index.add_items(matrix, labels, replace_deleted=True)
+            for doc_id, label, namespace in zip(ids, labels, namespaces):
+                code = self._namespace_code(namespace)
+                self._labels[doc_id] = label
+                self._ids[label] = doc_id
+                self._label_codes[label] = code
+                self._members.setdefault(code, set()).add(label)
+                if code in self._kept_codes:
+                    self._kept_count += 1
+
+    def delete(self, ids: Sequence[str]):
+        with self._lock:
+            for doc_id in ids:
+                label = self._labels.pop(doc_id, None)
+                if label is None:
+                    continue
+                self._index.mark_deleted(label)
+                del self._ids[label]
+                code = self._label_codes.pop(label)
+                if code in self._kept_codes:
+                    self._kept_count -= 1
+                members = self._members.get(code)
+                if members is not None:
+                    members.discard(label)
+                    if not members:
+                        del self._members[code]
+
+    def keep(self, namespace: str):
+        """把命名空间加入保留语料"""
+        with self._lock:
+            code = self._namespace_code(namespace)
+            if code not in self._kept_codes:
+                self._kept_codes.add(code)
+                self._kept_count += len(self._members.get(code, ()))
+
+    def drop_namespace(self, namespace: str):
+        with self._lock:
+            code = self._namespace_codes.pop(namespace, None)
+            if code in self._kept_codes:
+                self._kept_codes.discard(code)
+                self._kept_count -= len(self._members.get(code, ()))
+
+    def _exact(self, query: np.ndarray, labels: List[int], top_k: int) -> List[Tuple[str, float]]:
+        vectors = np.asarray(self._index.get_items(labels), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        q = query / max(float(np.linalg.norm(query)), 1e-12)
+        scores = vectors @ q
+        order = np.argsort(-scores)[:top_k]
+        return [(self._ids[labels[i]], float(scores[i])) for i in order]
+
+    def _search_kept(self, query: np.ndarray, top_k: int) -> List[Tuple[str, float]]:
+        """在保留语料中检索：不带过滤回调查询HNSW图，再从结果中去掉未保留的向量"""
+        if self._kept_count <= self.brute_force_threshold:
+            labels = [label for code in self._kept_codes for label in self._members.get(code, ())]
+            return self._exact(query, labels, top_k) if labels else []
+        total = len(self._labels)
+        # 按未保留向量的比例多取，结果不足top_k时加倍重试
+        k = min(total, top_k * total // self._kept_count + top_k)
+        while True:
+            self._index.set_ef(max(self.ef_search, k))
+            try:
+                labels, distances = self._index.knn_query(query, k=k)
+            except RuntimeError:
+                labels = [label for code in self._kept_codes for label in self._members.get(code, ())]
+                return self._exact(query, labels, top_k)
+            hits = [
+                (self._ids[int(label)], 1.0 - float(distance))
+                for label, distance in zip(labels[0], distances[0])
+                if self._label_codes.get(int(label)) in self._kept_codes
+            ]
+            if len(hits) >= top_k or k >= total:
+                return hits[:top_k]
+            k = min(total, k * 2)
+
+    def search(self, query: Sequence[float], top_k: int = 10,
+               namespace: Optional[Union[str, Collection[str]]] = None,
+               include_kept: bool = False) -> List[Tuple[str, float]]:
+        """
+        :param namespace: 只在该命名空间（或这组命名空间）内检索，None且include_kept为False时检索全部
+        :param include_kept: 同时检索保留语料
+        :returns: 按相似度降序的(id, 余弦相似度)列表
+        """
+        with self._lock:
+            if self._index is None or not self._labels or top_k <= 0:
+                return []
+            query = np.asarray(query, dtype=np.float32)
+            if include_kept:
+                names = [] if namespace is None else [namespace] if isinstance(namespace, str) else namespace
+                # 指定命名空间中已保留的向量由保留语料的检索覆盖，其余的（通常是当前请求）很少，精确计算
+                extra = []
+                for name in names:
+                    code = self._namespace_codes.get(name)
+                    if code is not None and code not in self._kept_codes:
+                        extra.extend(self._members.get(code, ()))
+                hits = self._search_kept(query, top_k)
+                if extra:
+                    hits = sorted(hits + self._exact(query, extra, top_k), key=lambda hit: -hit[1])[:top_k]
+                return hits
+            filter_fn = None
+            available = len(self._labels)
+            if namespace is not None:
+                names = [namespace] if isinstance(namespace, str) else namespace
+                groups = [self._members.get(self._namespace_codes.get(name, -1)) for name in names]
+                groups = [group for group in groups if group]
+                members = groups[0] if len(groups) == 1 else set().union(*groups)
+                if not members:
+                    return []
+                if len(members) <= self.brute_force_threshold:
+                    return self._exact(query, list(members), top_k)
+                filter_fn = members.__contains__
+                available = len(members)
+            k = min(top_k, available)
+            self._index.set_ef(max(self.ef_search, k))
+            try:
+                labels, distances = self._index.knn_query(query, k=k, filter=filter_fn)
+            except RuntimeError:
+                # 可达元素不足k个时hnswlib会报错，退化为精确计算
+                candidates = list(members) if filter_fn is not None else list(self._ids.keys())
+                return self._exact(query, candidates, top_k)
+            return [(self._ids[int(label)], 1.0 - float(distance)) for label, distance in zip(labels[0], distances[0])]
+
+    def save(self, path: str):
+        """把HNSW图和id、命名空间映射保存到目录"""
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            if self._index is None:
+                # 还没有写入过向量时只保存元数据，load时恢复为空索引
+                meta = {"dim": self.dim, "max_elements": 0, "next_label": 0, "labels": {}, "namespaces": {}}
+            else:
+                self._index.save_index(os.path.join(path, "hnsw.bin"))
+                meta = self._meta()
+        with open(os.path.join(path, "hnsw.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    def _meta(self) -> dict:
+        codes = {code: namespace for namespace, code in self._namespace_codes.items()}
+        return {
+            "dim": self.dim,
+            "max_elements": self._index.get_max_elements(),
+            "next_label": self._next_label,
+            "labels": {doc_id: label for doc_id, label in self._labels.items()},
+            "namespaces": {doc_id: codes.get(self._label_codes[label]) for doc_id, label in self._labels.items()},
+        }
+
+    def load(self, path: str):
+        """从save保存的目录恢复索引，目录中没有索引（如旧版本保存的空索引）时保持为空"""
+        meta_path = os.path.join(path, "hnsw.json")
+        if not os.path.exists(meta_path):
+            logger.warning(f"ANN索引快照不存在 {meta_path}")
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if not meta["labels"] or not os.path.exists(os.path.join(path, "hnsw.bin")):
+            return
+        with self._lock:
+            self.dim = meta["dim"]
+            self._index = hnswlib.Index(space="cosine", dim=self.dim)
+            self._index.load_index(os.path.join(path, "hnsw.bin"), max_elements=meta["max_elements"],
+                                   allow_replace_deleted=True)
+            self._index.set_ef(self.ef_search)
+            self._next_label = meta["next_label"]
+            self._labels, self._ids, self._label_codes, self._members = {}, {}, {}, {}
+            # 保留语料由调用方加载后重新keep
+            self._kept_codes, self._kept_count = set(), 0
+            for doc_id, label in meta["labels"].items():
+                code = self._namespace_code(meta["namespaces"].get(doc_id))
+                self._labels[doc_id] = label
+                self._ids[label] = doc_id
+                self._label_codes[label] = code
+                self._members.setdefault(code, set()).add(label)
+        logger.info(f"加载ANN索引 {path}，向量数: {len(self._labels)}")
@@ -0,0 +1,209 @@
+import json
+import os
+import threading
+import numpy as np
+from typing import Collection, Dict, List, Optional, Sequence, Tuple, Union
+
+
+class NumpyVectorIndex:
+    """
+    连续float32矩阵上的精确向量检索
+
+    - 写入时归一化，检索即一次矩阵向量乘法加argpartition取top-k
+    - 追加写入，容量不足时翻倍扩展
+    - 删除只打墓碑标记，墓碑超过存活行数时压缩
+    - 每行记录命名空间编码，检索可限定命名空间；`keep`标记的命名空间组成保留语料，
+      include_kept=True时检索保留语料加上指定的命名空间
+
+    使用示例：
+    ```python
+    index = NumpyVectorIndex()
+    index.add(["doc-1", "doc-2"], [[0.1, 0.2], [0.3, 0.1]], namespaces=["req-1", "req-1"])
+    hits = index.search([0.1, 0.2], top_k=1, namespace="req-1")  # [("doc-1", 1.0)]
+    ```
+    """
+    def __init__(self, dim: Optional[int] = None, initial_capacity: int = 1024):
+        self.dim = dim
+        self.initial_capacity = initial_capacity
+        self._lock = threading.RLock()
+        self._size = 0
+        self._vectors: Optional[np.ndarray] = None
+        self._alive = np.zeros(0, dtype=bool)
+        self._namespaces = np.zeros(0, dtype=np.int32)
+        self._ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._namespace_codes: Dict[Optional[str], int] = {None: 0}
+        self._next_code = 1
+        # drop_namespace回收的编码，新命名空间优先复用，编码数不随服务运行期间的请求数增长
+        self._free_codes: List[int] = []
+        # 命名空间编码 -> 是否保留，检索时按行的编码查表得到保留语料的掩码
+        self._kept_codes = np.zeros(1, dtype=bool)
+        if dim is not None:
+            self._allocate(initial_capacity)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self._rows.keys())
+
+    def _allocate(self, capacity: int):
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        alive = np.zeros(capacity, dtype=bool)
+        namespaces = np.zeros(capacity, dtype=np.int32)
+        if self._vectors is not None:
+            vectors[:self._size] = self._vectors[:self._size]
+            alive[:self._size] = self._alive[:self._size]
+            namespaces[:self._size] = self._namespaces[:self._size]
+        self._vectors, self._alive, self._namespaces = vectors, alive, namespaces
+
+    def _namespace_code(self, namespace: Optional[str]) -> int:
+        code = self._namespace_codes.get(namespace)
+        if code is None:
+            if self._free_codes:
+                code = self._free_codes.pop()
+            else:
+                code = self._next_code
+                self._next_code += 1
+            self._namespace_codes[namespace] = code
+            if code >= len(self._kept_codes):
+                self._kept_codes = np.concatenate([self._kept_codes, np.zeros(len(self._kept_codes), dtype=bool)])
+        return code
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def add(self, ids: Sequence[str], embeddings: Sequence[Sequence[float]],
+            namespaces: Optional[Sequence[Optional[str]]] = None):
+        """追加向量，已存在的id先删除再写入"""
+        if not ids:
+            return
+        matrix = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        namespaces = namespaces or [None] * len(ids)
+        with self._lock:
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+                self._allocate(self.initial_capacity)
+            if matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match index dimension {self.dim}")
+            self.delete([doc_id for doc_id in ids if doc_id in self._rows])
+            needed = self._size + len(ids)
+            if needed > len(self._alive):
+                capacity = len(self._alive) or self.initial_capacity
+                while capacity < needed:
+                    capacity *= 2
+                self._allocate(capacity)
+            start = self._size
+            self._vectors[start:needed] = matrix
+            self._alive[start:needed] = True
+            self._namespaces[start:needed] = [self._namespace_code(ns) for ns in namespaces]
+            for offset, doc_id in enumerate(ids):
+                self._rows[doc_id] = start + offset
+                self._ids.append(doc_id)
+            self._size = needed
+
+    def delete(self, ids: Sequence[str]):
+        """为已删除的行打墓碑标记"""
+        with self._lock:
+            for doc_id in ids:
+                row = self._rows.pop(doc_id, None)
+                if row is not None:
+                    self._alive[row] = False
+                    self._ids[row] = None
+            if self._size - len(self._rows) > max(self.initial_capacity, len(self._rows)):
+                self._compact()
+
+    def keep(self, namespace: str):
+        """把命名空间加入保留语料"""
+        with self._lock:
+            code = self._namespace_code(namespace)
+            self._kept_codes[code] = True
+
+    def drop_namespace(self, namespace: str):
+        """命名空间的文档删除后回收其编码"""
+        if namespace is None:
+            return
+        with self._lock:
+            code = self._namespace_codes.pop(namespace, None)
+            if code is None:
+                return
+            self._kept_codes[code] = False
+            # 仍有存活的行使用该编码时不复用，避免这些行被算作之后的命名空间
+            in_use = self._alive[:self._size] & (self._namespaces[:self._size] == code)
+            if not in_use.any():
+                self._free_codes.append(code)
+
+    def _compact(self):
+        """去掉墓碑行，重新编号"""
+        keep = np.flatnonzero(self._alive[:self._size])
+        self._vectors[:len(keep)] = self._vectors[keep]
+        self._namespaces[:len(keep)] = self._namespaces[keep]
+        self._alive[:] = False
+        self._alive[:len(keep)] = True
+        self._ids = [self._ids[row] for row in keep]
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._size = len(keep)
+
+    def save(self, path: str):
+        """把存活的向量保存到目录，配合load在重启后恢复"""
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            keep = np.flatnonzero(self._alive[:self._size])
+            codes = {code: namespace for namespace, code in self._namespace_codes.items()}
+            np.save(os.path.join(path, "vectors.npy"), self._vectors[keep] if len(keep) else np.zeros((0, self.dim or 0), dtype=np.float32))
+            meta = {
+                "ids": [self._ids[row] for row in keep],
+                "namespaces": [codes.get(int(self._namespaces[row])) for row in keep],
+            }
+        with open(os.path.join(path, "vectors.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    def load(self, path: str):
+        """从save保存的目录恢复向量"""
+        if not os.path.exists(os.path.join(path, "vectors.json")):
+            return
+        vectors = np.load(os.path.join(path, "vectors.npy"))
+        with open(os.path.join(path, "vectors.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if len(meta["ids"]):
+            self.add(meta["ids"], vectors, meta["namespaces"])
+
+    def search(self, query: Sequence[float], top_k: int = 10,
+               namespace: Optional[Union[str, Collection[str]]] = None,
+               include_kept: bool = False) -> List[Tuple[str, float]]:
+        """
+        :param namespace: 只在该命名空间（或这组命名空间）内检索，None且include_kept为False时检索全部
+        :param include_kept: 同时检索保留语料
+        :returns: 按相似度降序的(id, 余弦相似度)列表
+        """
+        with self._lock:
+            if self._size == 0 or top_k <= 0:
+                return []
+            q = self._normalize(np.asarray(query, dtype=np.float32))
+            mask = self._alive[:self._size]
+            if namespace is not None or include_kept:
+                names = [] if namespace is None else [namespace] if isinstance(namespace, str) else namespace
+                codes = [self._namespace_codes[name] for name in names if name in self._namespace_codes]
+                scope = self._kept_codes.copy() if include_kept else np.zeros_like(self._kept_codes)
+                scope[codes] = True
+                if not scope.any():
+                    return []
+                mask = mask & scope[self._namespaces[:self._size]]
+            candidates = np.flatnonzero(mask)
+            if len(candidates) == 0:
+                return []
+            if len(candidates) * 2 < self._size:
+                # 候选行较少（通常是限定了命名空间）时只计算候选行
+                candidate_scores = self._vectors[candidates] @ q
+            else:
+                candidate_scores = (self._vectors[:self._size] @ q)[candidates]
+            if len(candidates) > top_k:
+                part = np.argpartition(-candidate_scores, top_k - 1)[:top_k]
+            else:
+                part = np.arange(len(candidates))
+            order = part[np.argsort(-candidate_scores[part])]
+            return [(self._ids[candidates[i]], float(candidate_scores[i])) for i in order]
@@ -0,0 +1,287 @@
+from haystack import Document, logging
+from haystack.document_stores.errors import DuplicateDocumentError
+from haystack.document_stores.in_memory import InMemoryDocumentStore
+from haystack.document_stores.types import DuplicatePolicy
+from dataclasses import replace
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from .BM25Index import BM25Index
+from .NumpyVectorIndex import NumpyVectorIndex
+
+logger = logging.getLogger(__name__)
+
+
+class _Namespace:
+    """单个请求命名空间写入的文档"""
+    def __init__(self):
+        self.document_ids: Set[str] = set()
+        self.last_write = time.time()
+        self.kept = False
+
+
+class ScopedInMemoryDocumentStore(InMemoryDocumentStore):
+    """
+    按请求划分命名空间的InMemoryDocumentStore
+
+    - 文档的meta[namespace_field]（默认request_id）决定所属命名空间，检索时用`namespace_filter`只查当前请求
+    - 请求结束调用`release`：未标记保留的命名空间立即删除；请求异常退出没有调用release时，
+      未保留的命名空间超过request_ttl未写入也会被淘汰
+    - 通过`keep`保留的命名空间跨请求可见，超过document_ttl未更新或文档总数超过max_documents时，
+      从最旧的命名空间开始淘汰
+    - `keep`同时通知vector_index和lexical_index，它们各自维护保留语料的分区，
+      检索时用include_kept检索所有保留的文档，不需要列出保留的命名空间
+    - 带向量的文档同时写入`vector_index`（默认NumpyVectorIndex，大规模语料可换成HnswVectorIndex），
+      供NumpyEmbeddingRetriever检索
+    - 文档内容同时写入增量更新的`lexical_index`（BM25Index），供BM25Retriever按词项检索
+    - 存储中的文档不带向量，也不维护InMemoryDocumentStore自带的BM25统计，
+      向量和词项只在vector_index和lexical_index中各保存一份；因此不支持基类的bm25_retrieval和embedding_retrieval
+    - `save_snapshot`/`load_snapshot`保存并恢复保留的命名空间及向量索引
+    - `add_release_listener`注册的回调在请求结束（release）或命名空间被删除时调用，
+      用于释放与命名空间同生命周期的请求内状态；`add_delete_listener`注册的回调只在命名空间的文档被删除时调用
+
+    使用示例：
+    ```python
+    store = ScopedInMemoryDocumentStore(document_ttl=3600, max_documents=100000)
+    store.write_documents([Document(content="...", meta={"request_id": "req-1"})])
+    filters = store.namespace_filter("req-1")
+    store.release("req-1")
+    ```
+    """
+    def __init__(self,
+                 namespace_field: str = "request_id",
+                 document_ttl: Optional[float] = 3600,
+                 max_documents: Optional[int] = 100000,
+                 request_ttl: Optional[float] = 600,
+                 vector_index: Optional[Any] = None,
+                 lexical_index: Optional[BM25Index] = None,
+                 **kwargs):
+        """
+        :param namespace_field: 作为命名空间的meta字段
+        :param document_ttl: 保留的命名空间多久未写入后淘汰，None为不按时间淘汰
+        :param max_documents: 文档总数上限，None为不限制
+        :param request_ttl: 未保留的命名空间多久未写入后视为请求已异常结束并淘汰，应大于单个请求的最长耗时，None为不淘汰
+        :param vector_index: 向量索引，需实现add/delete/keep/drop_namespace/search/save/load，默认NumpyVectorIndex
+        :param lexical_index: 词法索引，默认BM25Index
+        :param kwargs: 传给InMemoryDocumentStore的参数
+        """
+        super().__init__(**kwargs)
+        self.namespace_field = namespace_field
+        self.document_ttl = document_ttl
+        self.max_documents = max_documents
+        self.request_ttl = request_ttl
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._lock = threading.RLock()
+        self.vector_index = vector_index if vector_index is not None else NumpyVectorIndex()
+        self.lexical_index = lexical_index if lexical_index is not None else BM25Index()
+        self._release_listeners: List[Callable[[str], None]] = []
+        self._delete_listeners: List[Callable[[str], None]] = []
+
+    def add_release_listener(self, listener: Callable[[str], None]):
+        """注册回调，参数为命名空间；同一命名空间可能被调用多次，回调应幂等"""
+        self._release_listeners.append(listener)
+
+    def add_delete_listener(self, listener: Callable[[str], None]):
+        """注册回调，参数为命名空间，在命名空间的文档被删除（释放、过期或容量淘汰）时调用"""
+        self._delete_listeners.append(listener)
+
+    def _notify_release(self, namespace: str, listeners: Optional[List[Callable[[str], None]]] = None):
+        for listener in self._release_listeners if listeners is None else listeners:
+            try:
+                listener(namespace)
+            except Exception as e:
+                logger.warning(f"命名空间释放回调失败 {namespace}: {str(e)}")
+
+    def _index_lexical(self, documents: List[Document]):
+        self.lexical_index.add(
+            [doc.id for doc in documents],
+            [doc.content for doc in documents],
+            [(doc.meta or {}).get(self.namespace_field) for doc in documents]
+        )
+
+    def namespace_filter(self, namespace: str) -> Dict[str, Any]:
+        """只检索某个命名空间的过滤条件"""
+        return {"field": f"meta.{self.namespace_field}", "operator": "==", "value": namespace}
+
+    def _store(self, documents: List[Document], policy: DuplicatePolicy) -> List[Document]:
+        """
+        写入基类的storage，返回实际写入的文档
+
+        不调用InMemoryDocumentStore.write_documents：它会保存向量并维护自己的BM25统计
+        """
+        if not isinstance(documents, list) or (documents and not isinstance(documents[0], Document)):
+            raise ValueError("Please provide a list of Documents.")
+        if policy == DuplicatePolicy.NONE:
+            policy = DuplicatePolicy.FAIL
+        storage = self.storage
+        written = []
+        for doc in documents:
+            if doc.id in storage:
+                if policy == DuplicatePolicy.FAIL:
+                    raise DuplicateDocumentError(f"ID '{doc.id}' already exists.")
+                if policy == DuplicatePolicy.SKIP:
+                    continue
+            # 向量只保存在vector_index中
+            storage[doc.id] = replace(doc, embedding=None) if doc.embedding is not None else doc
+            written.append(doc)
+        return written
+
+    def write_documents(self, documents: List[Document], policy: DuplicatePolicy = DuplicatePolicy.NONE) -> int:
+        documents = self._store(documents, policy)
+        embedded = [doc for doc in documents if doc.embedding is not None]
+        self.vector_index.add(
+            [doc.id for doc in embedded],
+            [doc.embedding for doc in embedded],
+            [(doc.meta or {}).get(self.namespace_field) for doc in embedded]
+        )
+        self._index_lexical(documents)
+        with self._lock:
+            for doc in documents:
+                namespace = (doc.meta or {}).get(self.namespace_field)
+                if namespace is None:
+                    continue
+                ns = self._namespaces.setdefault(namespace, _Namespace())
+                ns.document_ids.add(doc.id)
+                ns.last_write = time.time()
+        self.evict()
+        return len(documents)
+
+    def delete_documents(self, document_ids: List[str]) -> None:
+        storage = self.storage
+        for doc_id in document_ids:
+            storage.pop(doc_id, None)
+        self.vector_index.delete(document_ids)
+        self.lexical_index.delete(document_ids)
+
+    def keep(self, namespace: str):
+        """请求结束后保留该命名空间，之后只按TTL和容量淘汰"""
+        with self._lock:
+            self._namespaces.setdefault(namespace, _Namespace()).kept = True
+        # 索引维护保留语料的分区，检索所有保留的文档时不需要逐个列出命名空间
+        self.vector_index.keep(namespace)
+        self.lexical_index.keep(namespace)
+
+    def kept_namespaces(self) -> List[str]:
+        with self._lock:
+            return [name for name, ns in self._namespaces.items() if ns.kept]
+
+    def kept_documents(self) -> List[Document]:
+        """保留的命名空间中的所有文档（不含向量）"""
+        with self._lock:
+            document_ids = [doc_id for ns in self._namespaces.values() if ns.kept for doc_id in ns.document_ids]
+        storage = self.storage
+        return [storage[doc_id] for doc_id in document_ids if doc_id in storage]
+
+    def release(self, namespace: str):
+        """请求结束，删除未标记保留的命名空间"""
+        self._notify_release(namespace)
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns is None or ns.kept:
+                return
+        self.delete_namespace(namespace)
+
+    def delete_namespace(self, namespace: str):
+        with self._lock:
+            ns = self._namespaces.pop(namespace, None)
+        self._notify_release(namespace)
+        if ns is None:
+            return
+        self._notify_release(namespace, self._delete_listeners)
+        # 文档id由内容和meta计算，包含命名空间字段，不同命名空间之间不会共享文档
+        if ns.document_ids:
+            self.delete_documents(list(ns.document_ids))
+        self.vector_index.drop_namespace(namespace)
+        self.lexical_index.drop_namespace(namespace)
+        logger.debug(f"删除命名空间 {namespace}，文档数: {len(ns.document_ids)}")
+
+    def evict(self):
+        """按TTL和文档总数淘汰保留的命名空间，并清理请求异常结束后遗留的未保留命名空间"""
+        now = time.time()
+        with self._lock:
+            expired = [
+                name for name, ns in self._namespaces.items()
+                if (ns.kept and self.document_ttl is not None and now - ns.last_write > self.document_ttl)
+                or (not ns.kept and self.request_ttl is not None and now - ns.last_write > self.request_ttl)
+            ]
+        for name in expired:
+            self.delete_namespace(name)
+
+        if self.max_documents is None:
+            return
+        while self.count_documents() > self.max_documents:
+            with self._lock:
+                kept = [(ns.last_write, name) for name, ns in self._namespaces.items() if ns.kept]
+            if not kept:
+                break
+            self.delete_namespace(min(kept)[1])
+
+    def save_snapshot(self, path: str):
+        """保存保留的命名空间的文档（不含向量）和向量索引"""
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            kept = {name: ns for name, ns in self._namespaces.items() if ns.kept}
+        storage = self.storage
+        documents_path = os.path.join(path, "documents.jsonl")
+        count = 0
+        with open(f"{documents_path}.tmp", "w", encoding="utf-8") as f:
+            for name, ns in kept.items():
+                for doc_id in ns.document_ids:
+                    doc = storage.get(doc_id)
+                    if doc is None:
+                        continue
+                    data = doc.to_dict(flatten=False)
+                    # 向量由vector_index保存
+                    data.pop("embedding", None)
+                    f.write(json.dumps(
+                        {"namespace": name, "last_write": ns.last_write, "document": data},
+                        ensure_ascii=False
+                    ) + "\n")
+                    count += 1
+        os.replace(f"{documents_path}.tmp", documents_path)
+        self.vector_index.save(os.path.join(path, "vectors"))
+        logger.info(f"保存文档存储快照 {path}，文档数: {count}")
+
+    def load_snapshot(self, path: str):
+        """从save_snapshot保存的目录恢复文档和向量索引"""
+        documents_path = os.path.join(path, "documents.jsonl")
+        if not os.path.exists(documents_path):
+            return
+        documents = []
+        with open(documents_path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                doc = Document.from_dict(record["document"])
+                documents.append(doc)
+                with self._lock:
+                    ns = self._namespaces.setdefault(record["namespace"], _Namespace())
+                    ns.kept = True
+                    ns.document_ids.add(doc.id)
+                    ns.last_write = record["last_write"]
+        # 绕过write_documents，向量直接从索引快照恢复
+        self._store(documents, DuplicatePolicy.OVERWRITE)
+        # 词法索引由文档内容重建
+        self._index_lexical(documents)
+        self.vector_index.load(os.path.join(path, "vectors"))
+        # 快照时仍在处理中的请求只有向量没有文档，清理掉
+        storage = self.storage
+        orphans = [doc_id for doc_id in self.vector_index.ids() if doc_id not in storage]
+        self.vector_index.delete(orphans)
+        for namespace in self.kept_namespaces():
+            self.vector_index.keep(namespace)
+            self.lexical_index.keep(namespace)
+        logger.info(f"加载文档存储快照 {path}，文档数: {len(documents)}")
+        self.evict()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "documents": self.count_documents(),
+                "namespaces": len(self._namespaces),
+                "kept_namespaces": sum(1 for ns in self._namespaces.values() if ns.kept),
+                "indexed_vectors": len(self.vector_index),
+                "indexed_texts": len(self.lexical_index),
+            }
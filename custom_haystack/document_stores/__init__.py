@@ -0,0 +1,6 @@
+from .NumpyVectorIndex import NumpyVectorIndex
+from .HnswVectorIndex import HnswVectorIndex
+from .BM25Index import BM25Index
+from .ScopedDocumentStore import ScopedInMemoryDocumentStore
+
+__all__ = ["NumpyVectorIndex", "HnswVectorIndex", "BM25Index", "ScopedInMemoryDocumentStore"]
@@ -0,0 +1,4 @@
+from .cache import LRUCache
+from .tokenization import TokenCounter, estimate_tokens, get_tokenizer, lexical_terms
+
+__all__ = ["LRUCache", "TokenCounter", "estimate_tokens", "get_tokenizer", "lexical_terms"]
@@ -0,0 +1,40 @@
+"""
+重排子进程的入口
+
+spawn启动的子进程会先按父进程的__main__重新执行主模块（如api_server.py），重建应用和配置。
+`spawn_main`在启动子进程期间把__main__换成本模块，子进程只导入本模块和交叉编码器。
+"""
+import contextlib
+import sys
+from typing import List, Optional, Tuple
+
+# 重排子进程中的模型
+_worker_model = None
+
+
+def init_worker(model: str, device: str, max_length: int, max_threads: Optional[int]):
+    """在重排子进程中加载模型，线程数设置只作用于该进程"""
+    global _worker_model
+    import torch
+    from sentence_transformers import CrossEncoder
+    if max_threads:
+        torch.set_num_threads(max_threads)
+    _worker_model = CrossEncoder(model, device=device, max_length=max_length)
+
+
+def predict(pairs: List[Tuple[str, str]]) -> List[float]:
+    if not pairs:
+        return []
+    scores = _worker_model.predict(pairs, batch_size=len(pairs), show_progress_bar=False, convert_to_numpy=True)
+    return [float(score) for score in scores]
+
+
+@contextlib.contextmanager
+def spawn_main():
+    """启动子进程期间把__main__换成本模块，只应包住启动子进程的调用"""
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = sys.modules[__name__]
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
@@ -0,0 +1,110 @@
+from haystack import logging
+import functools
+import re
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 中日韩文字大致一字一个token，其它文字按约4个字符一个token估算
+_CJK_RANGES = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_CJK = re.compile(f"[{_CJK_RANGES}]")
+_ESTIMATED_TOKEN = re.compile(f"[{_CJK_RANGES}]|[^{_CJK_RANGES}]{{1,4}}")
+# 词法检索的词项：中日韩文字连续段，或以._-/:#连接的单词（错误码、版本号、型号等标识符）
+_LEXICAL_TERM = re.compile(f"[{_CJK_RANGES}]+|[^\\W{_CJK_RANGES}]+(?:[._\\-/:#][^\\W{_CJK_RANGES}]+)*")
+_TERM_SEPARATOR = re.compile(r"[._\-/:#]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """不依赖分词器的token数估算"""
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def lexical_terms(text: str) -> List[str]:
+    """
+    BM25等词法打分用的词项，不依赖分词器
+
+    中日韩文字按相邻两字切分；标识符既保留整体（如"0x80070005"、"v1.2.3"、"err_timeout"），
+    也拆出各部分，大小写不敏感
+    """
+    terms = []
+    for match in _LEXICAL_TERM.finditer(text.casefold()):
+        term = match.group()
+        if _CJK.match(term):
+            terms.extend([term] if len(term) == 1 else [term[i:i + 2] for i in range(len(term) - 1)])
+            continue
+        terms.append(term)
+        parts = _TERM_SEPARATOR.split(term)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part)
+    return terms
+
+
+@functools.lru_cache(maxsize=8)
+def get_tokenizer(name: str):
+    """
+    加载并缓存HuggingFace tokenizers分词器，同一名称只加载一次
+
+    未安装tokenizers或无法下载时返回None，调用方退化为estimate_tokens
+    """
+    try:
+        from tokenizers import Tokenizer
+        return Tokenizer.from_pretrained(name)
+    except Exception as e:
+        logger.warning(f"加载分词器 {name} 失败，按字符数估算token: {str(e)}")
+        return None
+
+
+class TokenCounter:
+    """
+    统一的token计数、截取和切分，分词器不可用时按字符估算
+
+    使用示例：
+    ```python
+    counter = TokenCounter("BAAI/bge-m3")
+    counter.count("你好，世界")
+    counter.split(long_text, max_tokens=400)
+    ```
+    """
+    def __init__(self, tokenizer: Optional[str] = None):
+        """
+        :param tokenizer: HuggingFace分词器名称，通常与嵌入模型一致；None为按字符估算
+        """
+        self.tokenizer_name = tokenizer
+        self.tokenizer = get_tokenizer(tokenizer) if tokenizer else None
+
+    def count(self, text: str) -> int:
+        if self.tokenizer is None:
+            return estimate_tokens(text)
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        """批量计数，分词器可用时由encode_batch并行处理"""
+        if self.tokenizer is None:
+            return [estimate_tokens(text) for text in texts]
+        return [len(encoding.ids) for encoding in self.tokenizer.encode_batch(texts, add_special_tokens=False)]
+
+    def _boundaries(self, text: str) -> List[int]:
+        """每个token的起始字符位置"""
+        if self.tokenizer is not None:
+            return [start for start, _ in self.tokenizer.encode(text, add_special_tokens=False).offsets]
+        return [match.start() for match in _ESTIMATED_TOKEN.finditer(text)]
+
+    def split(self, text: str, max_tokens: int) -> List[str]:
+        """按token数硬切分，用于没有结构可依的超长文本（如压缩过的页面）"""
+        boundaries = self._boundaries(text)
+        if len(boundaries) <= max_tokens:
+            return [text]
+        starts = boundaries[::max_tokens]
+        return [text[start:end] for start, end in zip(starts, starts[1:] + [len(text)])]
+
+    def tail(self, text: str, max_tokens: int) -> str:
+        """取文本末尾不超过max_tokens个token的部分，用于分片重叠"""
+        if max_tokens <= 0:
+            return ""
+        # 只对末尾一段分词，一个token最多按8个字符计
+        window = text[-max_tokens * 8:]
+        boundaries = self._boundaries(window)
+        if len(boundaries) <= max_tokens:
+            return window
+        return window[boundaries[-max_tokens]:]
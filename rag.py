@@ -1,58 +1,177 @@
 from haystack import AsyncPipeline
-from haystack.document_stores.in_memory import InMemoryDocumentStore
 from haystack.components.converters import MarkdownToDocument
+from haystack.components.joiners import DocumentJoiner
 from haystack.components.preprocessors import DocumentCleaner
-from haystack.components.preprocessors import DocumentSplitter
-from haystack.components.embedders import SentenceTransformersDocumentEmbedder, SentenceTransformersTextEmbedder
 from haystack.components.writers import DocumentWriter
-from haystack.components.retrievers import InMemoryEmbeddingRetriever
 from haystack.document_stores.types import DuplicatePolicy
 from haystack.utils import Secret
 
 from custom_haystack.components.fetcher.SearxngFetcher import SearXNGQueryFetcher
+from custom_haystack.components.fetcher.PageCache import PageCache
+from custom_haystack.components.fetcher.SearchResultCache import SearchResultCache
 from custom_haystack.components.embedders import SiliconFlowTextEmbedder, SiliconFlowDocumentEmberdder
+from custom_haystack.components.embedders import EmbeddingCache, CachedDocumentEmbedder, CachedTextEmbedder
+from custom_haystack.components.embedders import LocalDocumentEmbedder, LocalTextEmbedder
 from custom_haystack.components.builders import DocsPromptBuilder
-from custom_haystack.components.generators import CustomOpenAIGenerator
+from custom_haystack.components.preprocessors import MarkdownTokenSplitter, NearDuplicateFilter, LexicalPrefilter
+from custom_haystack.components.generators import CustomOpenAIGenerator, AnswerCache, CachedGenerator
+from custom_haystack.components.retrievers import NumpyEmbeddingRetriever, BM25Retriever
+from custom_haystack.components.rankers import CrossEncoderRanker
+from custom_haystack.document_stores import ScopedInMemoryDocumentStore, NumpyVectorIndex, HnswVectorIndex
 
+import asyncio
+import threading
 import time
 import json
 import logging
-from typing import Callable
+import uuid
+from typing import Callable, Dict, List
 
 logger = logging.getLogger(__name__)
 
 class RAGSystem:
+    MODES = ("full", "fast", "hybrid")
+
     def __init__(
         self,
-        split_lines: int = 10,
+        chunk_tokens: int = 400,
+        chunk_overlap: int = 50,
+        context_tokens: int = None,
+        embed_top_m: int = None,
         searxng_url: str = "http://127.0.0.1:8080/",
         result_per_query: int = 5,
         use_siliconflow_embedder: bool = True,
         streaming_callback: Callable = None,
         model: str = "qwen-qwq-32b",
-        language: str = "zh-CN"
+        language: str = "zh-CN",
+        page_cache_dir: str = None,
+        page_cache_ttl: float = 3600,
+        page_cache_domain_ttls: Dict[str, float] = None,
+        page_cache_revalidate: bool = True,
+        search_cache_ttl: float = 600,
+        search_cache_dir: str = None,
+        embedding_cache_dir: str = None,
+        embedding_cache_size: int = 1000000,
+        answer_cache_ttl: float = 0,
+        answer_cache_size: int = 1024,
+        keep_documents: bool = False,
+        retrieval_scope: str = "request",
+        lexical_retrieval: bool = True,
+        rerank_model: str = None,
+        rerank_top_k: int = 3,
+        rerank_budget: float = 1.0,
+        document_ttl: float = 3600,
+        max_documents: int = 100000,
+        vector_index: str = "numpy",
+        index_snapshot_dir: str = None,
+        snapshot_interval: float = 300,
+        min_indexed_chunks: int = None,
+        latency_budget: float = None,
+        drain_share: float = 0.25,
+        mode: str = "full"
     ):
-        self.split_lines = split_lines
+        """
+        :param chunk_tokens: 单个分片的token上限，按嵌入模型的分词器计算
+        :param chunk_overlap: 同一章节内相邻分片重叠的token数
+        :param context_tokens: 提示词中网页内容的token上限，按检索分数装入，None为不限制
+        :param embed_top_m: 设置后分片先按查询做BM25粗排，每个请求只有进入目前为止前embed_top_m名的分片嵌入，
+            其余分片不嵌入直接写入，只能被BM25检索；None为全部嵌入
+        :param page_cache_ttl: 页面缓存的默认有效期（秒）
+        :param page_cache_domain_ttls: 按域名（后缀匹配）设置的页面缓存有效期，如{"wikipedia.org": 86400}
+        :param page_cache_revalidate: 页面缓存过期后，有ETag/Last-Modified时发送条件请求，304则续期继续使用
+        :param embedding_cache_size: 向量缓存中每个模型保存的文档向量数上限，超出后覆盖最旧的；查询向量另存，上限为其十分之一
+        :param answer_cache_ttl: 提示词完全相同时复用LLM回答的有效期（秒），0为不缓存
+        :param answer_cache_size: 缓存的回答数
+        :param keep_documents: 请求结束后是否保留抓取的文档供之后的请求检索，保留的文档按document_ttl和max_documents淘汰
+        :param retrieval_scope: "request"只检索当前请求抓取的文档，"all"检索所有保留的文档和当前请求的文档
+        :param lexical_retrieval: 向量检索的同时并行做BM25检索，按倒数排名融合（RRF），改善错误码、版本号等精确标识符的召回
+        :param rerank_model: 设置后检索结果先由该交叉编码器在CPU上重排，只把前rerank_top_k个分片送入提示词；None为不重排
+        :param rerank_budget: 重排的时间预算（秒），超时按检索顺序取前rerank_top_k个
+        :param vector_index: "numpy"为精确检索，"hnsw"为hnswlib近似检索，适合保留的大规模语料
+        :param index_snapshot_dir: 设置后启动时从该目录恢复保留的文档和向量索引，关闭时保存
+        :param snapshot_interval: 保留新文档后最多隔多久（秒）在后台保存一次快照，进程崩溃时最多丢失这段时间的文档
+        :param min_indexed_chunks: 设置后嵌入并写入了这么多个分片就开始检索，取消其余抓取；None为等待全部页面
+        :param latency_budget: 搜索、抓取和嵌入阶段的默认时间预算（秒），None为不限制，可按请求覆盖。
+            用去(1 - drain_share)后取消其余抓取，剩余时间用于嵌入已抓取的页面和搜索摘要，到时未完成的不再等待
+        :param drain_share: latency_budget中留给嵌入已抓取页面的比例
+        :param mode: 默认回答模式，可按请求覆盖。"full"抓取全文后检索；"fast"只用搜索摘要构造提示词，不抓取也不嵌入；
+            "hybrid"先用搜索摘要回答，同时在后台抓取全文并保留，供后续请求检索，要求retrieval_scope="all"
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown mode: {mode}, expected one of {self.MODES}")
+        if mode == "hybrid" and retrieval_scope != "all":
+            # 只检索当前请求时，后台抓取的全文不会被任何请求检索到
+            raise ValueError('mode="hybrid" requires retrieval_scope="all"')
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+        self.context_tokens = context_tokens
+        self.embed_top_m = embed_top_m
         self.searxng_url = searxng_url
         self.result_per_query = result_per_query
         self.use_siliconflow_embedder = use_siliconflow_embedder
         self.streaming_callback = streaming_callback
         self.language = language
+        self.min_indexed_chunks = min_indexed_chunks
+        self.latency_budget = latency_budget
+        self.drain_share = drain_share
+        self.mode = mode
+        # hybrid模式下后台抓取全文的任务
+        self._background_tasks = set()
+        # 设置后把抓取结果缓存到本地目录，重复URL不再启动浏览器
+        self.page_cache = PageCache(
+            page_cache_dir,
+            default_ttl=page_cache_ttl,
+            domain_ttls=page_cache_domain_ttls,
+            revalidate=page_cache_revalidate
+        ) if page_cache_dir else None
+        # search_cache_ttl为0时关闭搜索结果缓存
+        self.search_cache = SearchResultCache(ttl=search_cache_ttl, cache_dir=search_cache_dir) if search_cache_ttl else None
+        # 设置后文档和查询向量按(模型, 文本哈希)持久化缓存，只嵌入未命中的文本
+        self.embedding_cache = EmbeddingCache(
+            embedding_cache_dir,
+            max_entries=embedding_cache_size,
+            max_query_entries=max(embedding_cache_size // 10, 1)
+        ) if embedding_cache_dir else None
+        # 按(模型, 生成参数, 提示词哈希)缓存回答，命中时重放为流式chunk
+        self.answer_cache = AnswerCache(maxsize=answer_cache_size, ttl=answer_cache_ttl) if answer_cache_ttl else None
         if self.language == "en":
             self.template_path = "./template/query_template.en.md"
         else:
             self.template_path = "./template/query_template.md"
-        # 初始化文档存储
-        self.document_store = InMemoryDocumentStore()
+        # 初始化文档存储，按请求划分命名空间
+        self.keep_documents = keep_documents
+        self.retrieval_scope = retrieval_scope
+        self.lexical_retrieval = lexical_retrieval
+        self.rerank_model = rerank_model
+        self.rerank_top_k = rerank_top_k
+        self.rerank_budget = rerank_budget
+        self.index_snapshot_dir = index_snapshot_dir
+        self.snapshot_interval = snapshot_interval
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_task = None
+        self._last_snapshot = time.time()
+        self.document_ttl = document_ttl
+        self.document_store = ScopedInMemoryDocumentStore(
+            document_ttl=document_ttl,
+            max_documents=max_documents,
+            vector_index=HnswVectorIndex() if vector_index == "hnsw" else NumpyVectorIndex()
+        )
+        if self.index_snapshot_dir:
+            self.document_store.load_snapshot(self.index_snapshot_dir)
         self.model = model
         
         # 初始化嵌入器
+        self.local_backend = None
         if self.use_siliconflow_embedder:
             self.siliconflow_api_key = Secret.from_env_var("SILICONFLOW_API_KEY").resolve_value()
             self.embedder = SiliconFlowDocumentEmberdder(api_key=self.siliconflow_api_key)
         else:
-            self.embedder = SentenceTransformersDocumentEmbedder(model="BAAI/bge-m3")
-            self.embedder.warm_up()
+            # 文档和查询嵌入器共用同一个模型实例，在start中加载；
+            # 并发请求的文本由后端的工作线程合并成批次推理
+            self.embedder = LocalDocumentEmbedder(model="BAAI/bge-m3")
+            self.local_backend = self.embedder.backend
+        if self.embedding_cache is not None:
+            self.embedder = CachedDocumentEmbedder(self.embedder, self.embedding_cache)
         
         self.api_key = ""
         self.api_base_url = ""
@@ -67,30 +186,49 @@ class RAGSystem:
             self.api_base_url = Secret.from_env_var("OPENAI_API_BASE_URL").resolve_value() or "https://api.openai.com/v1"
         else:
             raise ValueError("No API key found")
+        self._warm_up_task = None
+        self._ranker_task = None
         # 初始化管道
         self._init_pipeline()
         self._init_query_pipeline()
         
-    def split_by_passage(self, content: str):
-        lines = content.splitlines()
-        passages = []
-        for i in range(0, len(lines), self.split_lines):
-            passage = "\n".join(lines[i:i + self.split_lines])
-            passages.append(passage)
-        return passages
-    
     def _init_pipeline(self):
-        self.pipeline = AsyncPipeline()
-        self.pipeline.add_component("fetcher", SearXNGQueryFetcher(
+        # 抓取不在管道内：每个页面抓取完成后单独送入摄取管道，嵌入与其余页面的抓取重叠
+        self.fetcher = SearXNGQueryFetcher(
             searxng_url=self.searxng_url,
             result_per_query=self.result_per_query,
-            language=self.language
-        ))
+            language=self.language,
+            page_cache=self.page_cache,
+            search_cache=self.search_cache
+        )
+        self.pipeline = AsyncPipeline()
         self.pipeline.add_component("cleaner", DocumentCleaner())
-        self.pipeline.add_component("splitter", DocumentSplitter(
-            split_by="function",
-            splitting_function=self.split_by_passage
+        # 按token预算和Markdown结构切分，分词器与嵌入模型一致
+        self.pipeline.add_component("splitter", MarkdownTokenSplitter(
+            max_tokens=self.chunk_tokens,
+            overlap_tokens=self.chunk_overlap,
+            tokenizer=getattr(self.embedder, "model", None)
         ))
+        # 嵌入前去掉近似重复的分片；只有保留的文档对所有请求可见时才跨请求去重，
+        # 否则被去掉的分片在别的请求里检索不到
+        self.dedup = NearDuplicateFilter(
+            cross_request=self.keep_documents and self.retrieval_scope == "all",
+            document_ttl=self.document_ttl
+        )
+        self.pipeline.add_component("dedup", self.dedup)
+        # 请求内去重索引随命名空间释放，跨请求签名随命名空间的文档删除
+        self.document_store.add_release_listener(self.dedup.release)
+        self.document_store.add_delete_listener(self.dedup.forget)
+        # 从快照恢复的保留文档也参与跨请求去重
+        self.dedup.restore(self.document_store.kept_documents())
+        if self.embed_top_m:
+            prefilter = LexicalPrefilter(top_m=self.embed_top_m)
+            self.document_store.add_release_listener(prefilter.release)
+            self.pipeline.add_component("prefilter", prefilter)
+            self.pipeline.add_component("lexical_writer", DocumentWriter(
+                document_store=self.document_store,
+                policy=DuplicatePolicy.OVERWRITE
+            ))
         self.pipeline.add_component("embedder", self.embedder)
         self.pipeline.add_component("writer", DocumentWriter(
             document_store=self.document_store,
@@ -98,70 +236,356 @@ class RAGSystem:
         ))
         
         # 连接组件
-        self.pipeline.connect("fetcher", "cleaner")
         self.pipeline.connect("cleaner", "splitter")
-        self.pipeline.connect("splitter", "embedder")
-        self.pipeline.connect("embedder", "writer")
-        
+        self.pipeline.connect("splitter", "dedup")
+        if self.embed_top_m:
+            # 只嵌入与查询词项最相关的分片，其余分片只进入BM25索引
+            self.pipeline.connect("dedup.documents", "prefilter.documents")
+            self.pipeline.connect("prefilter.documents", "embedder.documents")
+            self.pipeline.connect("prefilter.skipped", "lexical_writer.documents")
+        else:
+            self.pipeline.connect("dedup.documents", "embedder.documents")
+        # 嵌入失败的文档从failed_documents输出，不写入文档存储
+        self.pipeline.connect("embedder.documents", "writer.documents")
+
+    async def _ingest_stream(self, query_str: str, request_id: str, progress_callback: Callable = None,
+                             latency_budget: float = None, results: List[Dict] = None) -> int:
+        """
+        搜索（或使用传入的搜索结果）后按抓取完成顺序逐个页面执行清洗、分割、嵌入和写入
+
+        达到min_indexed_chunks或用去latency_budget的(1 - drain_share)时取消剩余抓取，已抓取完成的页面继续摄取，
+        未抓取完成的URL改用搜索摘要；摄取最多等到latency_budget用完，未完成的取消。返回嵌入并写入的分片数
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + latency_budget if latency_budget else None
+        crawl_budget = latency_budget * (1 - self.drain_share) if latency_budget else None
+        indexed = 0
+        enough = asyncio.Event()
+        ingest_tasks = set()
+        searched = results is not None
+        results = list(results or [])
+        arrived = set()
+
+        async def ingest(docs):
+            nonlocal indexed
+            # 这一批通过去重的签名在处理期间就参与去重，处理结束后未写入的签名删除
+            batch = uuid.uuid4().hex
+            try:
+                data = {"cleaner": {"documents": docs}, "dedup": {"batch": batch}}
+                if self.embed_top_m:
+                    data["prefilter"] = {"query": query_str}
+                result = await self.pipeline.run_async(data, include_outputs_from={"embedder", "prefilter"})
+                # 嵌入器的documents只包含嵌入成功的分片，失败的从failed_documents输出，不写入
+                embedded = result.get("embedder", {}).get("documents", [])
+                # 写入成功的分片（嵌入成功的和粗排跳过的）确认签名
+                self.dedup.commit(embedded + result.get("prefilter", {}).get("skipped", []))
+            except Exception as e:
+                logger.warning(f"摄取失败 {[doc.meta.get('url') for doc in docs]}: {str(e)}")
+                return
+            finally:
+                self.dedup.discard(batch)
+            # 只有嵌入并写入的分片能被向量检索到，去重、粗排跳过和嵌入失败的不计入
+            indexed += len(embedded)
+            if self.min_indexed_chunks and indexed >= self.min_indexed_chunks:
+                enough.set()
+
+        async def crawl():
+            if not searched:
+                results.extend(await self.fetcher.search([query_str], progress_callback=progress_callback))
+            stream = self.fetcher.iter_crawls(
+                [result["url"] for result in results],
+                progress_callback=progress_callback,
+                request_id=request_id
+            )
+            try:
+                async for doc in stream:
+                    arrived.add(doc.meta.get("url"))
+                    ingest_tasks.add(asyncio.create_task(ingest([doc])))
+            finally:
+                await stream.aclose()
+            if ingest_tasks:
+                # 用wait而不是gather，截止时取消本任务不会连带取消已抓取页面的摄取
+                await asyncio.wait(ingest_tasks)
+
+        crawl_task = asyncio.create_task(crawl())
+        enough_task = asyncio.create_task(enough.wait())
+        try:
+            await asyncio.wait({crawl_task, enough_task}, timeout=crawl_budget, return_when=asyncio.FIRST_COMPLETED)
+            if not crawl_task.done():
+                # 提前开始检索：停止抓取，已抓取完成的页面继续摄取，其余URL用搜索摘要代替
+                crawl_task.cancel()
+                await asyncio.gather(crawl_task, return_exceptions=True)
+                snippets = self.fetcher.snippet_documents(
+                    [result for result in results if result["url"] not in arrived], request_id
+                )
+                logger.info(f"停止等待抓取，已抓取页面: {len(arrived)}，摘要代替: {len(snippets)}")
+                if snippets:
+                    ingest_tasks.add(asyncio.create_task(ingest(snippets)))
+                if ingest_tasks:
+                    # 摄取也受时间预算约束，到时仍未完成的在finally中取消
+                    timeout = max(deadline - loop.time(), 0) if deadline is not None else None
+                    _, unfinished = await asyncio.wait(ingest_tasks, timeout=timeout)
+                    if unfinished:
+                        logger.info(f"时间预算用完，放弃未完成的摄取: {len(unfinished)}")
+        finally:
+            # 请求被取消时，停止未完成的抓取和摄取
+            pending = [task for task in (crawl_task, enough_task, *ingest_tasks) if not task.done()]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if not crawl_task.cancelled() and crawl_task.exception() is not None:
+            raise crawl_task.exception()
+        logger.info(f"已索引分片数: {indexed}")
+        return indexed
+
+    def _create_llm(self):
+        llm = CustomOpenAIGenerator(
+            api_key=self.api_key,
+            api_base_url=self.api_base_url,
+            model=self.model
+        )
+        if self.answer_cache is not None:
+            llm = CachedGenerator(llm, self.answer_cache)
+        return llm
+
     def _init_query_pipeline(self):
-        self.retriever = InMemoryEmbeddingRetriever(self.document_store)
+        top_k = 10
+        # 融合时每路多取一些候选，融合后仍取top_k
+        self.ranker = CrossEncoderRanker(
+            model=self.rerank_model,
+            top_k=self.rerank_top_k,
+            time_budget=self.rerank_budget
+        ) if self.rerank_model else None
+        self.retriever = NumpyEmbeddingRetriever(self.document_store, top_k=top_k * 2 if self.lexical_retrieval else top_k)
         if self.use_siliconflow_embedder:
             self.query_embedder = SiliconFlowTextEmbedder(api_key=self.siliconflow_api_key)
         else:
-            self.query_embedder = SentenceTransformersTextEmbedder(model="BAAI/bge-m3")
+            self.query_embedder = LocalTextEmbedder(model="BAAI/bge-m3")
+        if self.embedding_cache is not None:
+            self.query_embedder = CachedTextEmbedder(self.query_embedder, self.embedding_cache)
         
         # 读取模板
         with open(self.template_path, "r", encoding="utf-8") as f:
             template = f.read()
             
         #logger.info(f"template: {template}")
-        self.prompt_builder = DocsPromptBuilder(template=template)
+        self.prompt_builder = DocsPromptBuilder(
+            template=template,
+            max_tokens=self.context_tokens,
+            tokenizer=getattr(self.embedder, "model", None)
+        )
 
 
         self.query_pipeline = AsyncPipeline()
         self.query_pipeline.add_component("embedder", self.query_embedder)
         self.query_pipeline.add_component("retriever", self.retriever)
+        if self.lexical_retrieval:
+            # BM25检索不依赖查询嵌入，与嵌入和向量检索并行运行
+            self.query_pipeline.add_component("bm25_retriever", BM25Retriever(self.document_store, top_k=top_k * 2))
+            self.query_pipeline.add_component("joiner", DocumentJoiner(join_mode="reciprocal_rank_fusion", top_k=top_k))
+        if self.ranker is not None:
+            self.query_pipeline.add_component("ranker", self.ranker)
         self.query_pipeline.add_component("prompt_builder", self.prompt_builder)
         self.query_pipeline.add_component("llm", 
-            CustomOpenAIGenerator(
-                api_key=self.api_key,
-                api_base_url=self.api_base_url,
-                model=self.model
-            ))
+            self._create_llm())
             
         # 连接组件
         self.query_pipeline.connect("embedder.embedding", "retriever.query_embedding")
-        self.query_pipeline.connect("retriever.documents", "prompt_builder.documents")
-        self.query_pipeline.connect("prompt_builder", "llm")
+        retrieved = "retriever.documents"
+        if self.lexical_retrieval:
+            self.query_pipeline.connect("retriever.documents", "joiner.documents")
+            self.query_pipeline.connect("bm25_retriever.documents", "joiner.documents")
+            retrieved = "joiner.documents"
+        if self.ranker is not None:
+            self.query_pipeline.connect(retrieved, "ranker.documents")
+            retrieved = "ranker.documents"
+        self.query_pipeline.connect(retrieved, "prompt_builder.documents")
+        self.query_pipeline.connect("prompt_builder.prompt", "llm.prompt")
+
+        # fast/hybrid模式：搜索摘要直接构造提示词，不经过嵌入和检索
+        self.snippet_pipeline = AsyncPipeline()
+        self.snippet_pipeline.add_component("prompt_builder", DocsPromptBuilder(
+            template=template,
+            max_tokens=self.context_tokens,
+            tokenizer=getattr(self.embedder, "model", None)
+        ))
+        self.snippet_pipeline.add_component("llm",
+            self._create_llm())
+        self.snippet_pipeline.connect("prompt_builder.prompt", "llm.prompt")
         
-    async def process_query(self, query_str: str, streaming_callback: Callable = None):
-        # 处理查询并获取文档
-        await self.pipeline.run_async(
-            {"fetcher": {"queries": [query_str]}},
-            include_outputs_from={"splitter"}
+    async def start(self):
+        """预热常驻资源（浏览器池、本地嵌入模型），应在服务启动时调用"""
+        await self.fetcher.start()
+        # 本地模型在后台线程加载，服务可以先接受连接，加载完成前is_ready为False
+        self._warm_up_task = asyncio.create_task(asyncio.to_thread(self._warm_up_embedders))
+        self._load_ranker()
+
+    def _warm_up_embedders(self):
+        for embedder in (self.embedder, self.query_embedder):
+            if hasattr(embedder, "warm_up"):
+                embedder.warm_up()
+
+    def _load_ranker(self):
+        """
+        在工作线程中启动重排子进程，子进程异常退出后也由这里重新启动
+
+        重排是可选的，不计入is_ready：加载完成前或加载失败时检索结果按原顺序使用
+        """
+        if self.ranker is None or not self.ranker.should_load:
+            return
+        if self._ranker_task is not None and not self._ranker_task.done():
+            return
+        self._ranker_task = asyncio.create_task(asyncio.to_thread(self.ranker.load))
+        self._background_tasks.add(self._ranker_task)
+        self._ranker_task.add_done_callback(self._background_tasks.discard)
+
+    def is_ready(self) -> bool:
+        """嵌入模型是否已加载完成"""
+        task = self._warm_up_task
+        return task is not None and task.done() and not task.cancelled() and task.exception() is None
+
+    async def wait_ready(self):
+        """等待嵌入模型加载完成，避免管道在事件循环中同步加载模型"""
+        if self._warm_up_task is None:
+            self._warm_up_task = asyncio.create_task(asyncio.to_thread(self._warm_up_embedders))
+        await asyncio.shield(self._warm_up_task)
+
+    async def close(self):
+        """释放常驻资源"""
+        for task in list(self._background_tasks):
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        await self.fetcher.close()
+        for embedder in (self.embedder, self.query_embedder):
+            if hasattr(embedder, "close"):
+                await embedder.close()
+        if self.local_backend is not None:
+            self.local_backend.close()
+        if self.ranker is not None:
+            self.ranker.close()
+        for pipeline in (self.query_pipeline, self.snippet_pipeline):
+            await pipeline.get_component("llm").close()
+        if self.embedding_cache is not None:
+            self.embedding_cache.close()
+        if self.index_snapshot_dir:
+            self._save_snapshot()
+
+    def _save_snapshot(self):
+        # 后台保存与关闭时的保存可能同时进行，写同一组文件需要互斥
+        with self._snapshot_lock:
+            self.document_store.save_snapshot(self.index_snapshot_dir)
+            self._last_snapshot = time.time()
+
+    def _keep(self, request_id: str):
+        """保留请求的文档，距上次快照超过snapshot_interval时在后台保存快照"""
+        self.document_store.keep(request_id)
+        if not self.index_snapshot_dir or time.time() - self._last_snapshot < self.snapshot_interval:
+            return
+        if self._snapshot_task is not None and not self._snapshot_task.done():
+            return
+        self._snapshot_task = asyncio.create_task(asyncio.to_thread(self._save_snapshot))
+        self._background_tasks.add(self._snapshot_task)
+        self._snapshot_task.add_done_callback(self._background_tasks.discard)
+
+    def _start_background_ingest(self, query_str: str, request_id: str, results: List[Dict]):
+        """hybrid模式：在后台抓取并索引全文，完成后保留命名空间供后续请求检索"""
+        async def ingest():
+            try:
+                await self.wait_ready()
+                await self._ingest_stream(query_str, request_id, results=results)
+                self._keep(request_id)
+            except Exception as e:
+                logger.warning(f"后台抓取失败: {str(e)}")
+            finally:
+                # 保留的命名空间不会被删除，只释放请求内的状态
+                self.document_store.release(request_id)
+
+        task = asyncio.create_task(ingest())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _answer_from_snippets(self, query_str: str, request_id: str, streaming_callback: Callable = None,
+                                    progress_callback: Callable = None, background_ingest: bool = False):
+        results = await self.fetcher.search([query_str], progress_callback=progress_callback)
+        if background_ingest:
+            self._start_background_ingest(query_str, request_id, results)
+        if progress_callback:
+            progress_callback("generating")
+        return await self.snippet_pipeline.run_async(
+            data={
+                "prompt_builder": {"question": query_str, "documents": self.fetcher.snippet_documents(results, request_id)},
+                "llm": {"streaming_callback": streaming_callback}
+            }
         )
-        
-        # 保存分割结果
-        # with open("./tmp/splite_result.json", "w", encoding="utf-8") as f:
-        #     f.write(json.dumps(
-        #         [{"content": doc.content} for doc in result["splitter"]["documents"]],
-        #         indent=4,
-        #         ensure_ascii=False
-        #     ))
+
+    async def _answer_from_pages(self, query_str: str, request_id: str, streaming_callback: Callable = None,
+                                 progress_callback: Callable = None, latency_budget: float = None):
+        try:
+            await self.wait_ready()
+            # 处理查询并获取文档，页面抓取完成即进入摄取管道
+            await self._ingest_stream(query_str, request_id, progress_callback, latency_budget or None)
             
-        # 执行查询
-        query_result = await self.query_pipeline.run_async(
-            data={
+            # 保存分割结果
+            # with open("./tmp/splite_result.json", "w", encoding="utf-8") as f:
+            #     f.write(json.dumps(
+            #         [{"content": doc.content} for doc in result["splitter"]["documents"]],
+            #         indent=4,
+            #         ensure_ascii=False
+            #     ))
+
+            if self.keep_documents:
+                self._keep(request_id)
+
+            # 执行查询
+            if progress_callback:
+                progress_callback("generating")
+            # retrieval_scope="all"时检索保留的文档和当前请求的文档；
+            # 其它进行中的请求未保留、可能只摄取了一部分的文档不参与检索
+            scope = {"namespace": request_id, "include_kept": self.retrieval_scope == "all"}
+            data = {
                 "embedder": {"text": query_str},
+                "retriever": scope,
                 "prompt_builder": {"question": query_str},
-                "llm": {"streaming_callback": streaming_callback if streaming_callback else self.streaming_callback}
+                "llm": {"streaming_callback": streaming_callback}
             }
-        )
-        
-        # 保存查询结果
-        with open("./tmp/query_result.json", "w", encoding="utf-8") as f:
-            f.write(json.dumps(query_result, indent=4, ensure_ascii=False))
-            
+            if self.lexical_retrieval:
+                data["bm25_retriever"] = {"query": query_str, **scope}
+            if self.ranker is not None:
+                self._load_ranker()
+                data["ranker"] = {"query": query_str}
+            return await self.query_pipeline.run_async(data=data)
+        finally:
+            # 未保留的文档随请求结束删除
+            self.document_store.release(request_id)
+
+    async def process_query(self, query_str: str, streaming_callback: Callable = None, progress_callback: Callable = None,
+                            latency_budget: float = None, mode: str = None):
+        """
+        :param streaming_callback: 接收LLM生成的每个chunk
+        :param progress_callback: 接收阶段进度描述（"searching"、"crawled 3/5"、"generating"），用于流式连接保活
+        :param latency_budget: 覆盖默认的搜索和抓取时间预算（秒），0为不限制
+        :param mode: 覆盖默认的回答模式（"full"、"fast"、"hybrid"）
+        """
+        mode = mode or self.mode
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown mode: {mode}, expected one of {self.MODES}")
+        if latency_budget is None:
+            latency_budget = self.latency_budget
+        streaming_callback = streaming_callback if streaming_callback else self.streaming_callback
+        background_ingest = mode == "hybrid"
+        if background_ingest and self.retrieval_scope != "all":
+            logger.warning('retrieval_scope不是"all"，后台抓取的全文不会被检索，hybrid模式按fast模式回答')
+            background_ingest = False
+        request_id = uuid.uuid4().hex
+        if mode == "full":
+            query_result = await self._answer_from_pages(
+                query_str, request_id, streaming_callback, progress_callback, latency_budget
+            )
+        else:
+            query_result = await self._answer_from_snippets(
+                query_str, request_id, streaming_callback, progress_callback, background_ingest=background_ingest
+            )
+
         return query_result['llm']['replies'][0]
 
 # 使用示例
@@ -190,7 +614,7 @@ if __name__ == "__main__":
     
     # 创建RAG系统实例
     rag_system = RAGSystem(
-        split_lines=10,
+        chunk_tokens=400,
         searxng_url="http://127.0.0.1:8080/",
         result_per_query=5
     )
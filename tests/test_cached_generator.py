@@ -0,0 +1,114 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("haystack")
+pytest.importorskip("openai")
+
+from openai.types.chat import ChatCompletionChunk
+from openai.types.chat.chat_completion_chunk import Choice, ChoiceDelta
+
+from custom_haystack.components.generators import AnswerCache, CachedGenerator
+from custom_haystack.utils import cache as cache_module
+
+PIECES = ["缓存", "的", "回答"]
+
+
+class FakeGenerator:
+    """按PIECES分段流式输出的生成器"""
+    model = "fake-model"
+    generation_kwargs = {"temperature": 0.6}
+    system_prompt = None
+    streaming_callback = None
+
+    def __init__(self, finish_reason="stop"):
+        self.finish_reason = finish_reason
+        self.calls = 0
+
+    def run(self, prompt, system_prompt=None, streaming_callback=None, generation_kwargs=None):
+        self.calls += 1
+        for piece in PIECES:
+            if streaming_callback is not None:
+                streaming_callback(ChatCompletionChunk(
+                    id="chatcmpl-1", object="chat.completion.chunk", created=0, model=self.model,
+                    choices=[Choice(index=0, delta=ChoiceDelta(content=piece), finish_reason=None)]
+                ))
+        return {"replies": ["".join(PIECES)], "meta": [{"model": self.model, "finish_reason": self.finish_reason}]}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def collect():
+    chunks = []
+    return chunks, chunks.append
+
+
+def test_replays_streamed_pieces_on_hit():
+    generator = FakeGenerator()
+    llm = CachedGenerator(generator, AnswerCache())
+    streamed, callback = collect()
+    first = llm.run(prompt="p", streaming_callback=callback)
+    replayed, callback = collect()
+    second = llm.run(prompt="p", streaming_callback=callback)
+
+    assert generator.calls == 1
+    assert second["replies"] == first["replies"]
+    assert second["meta"][0]["cache_hit"] is True
+    assert [chunk.choices[0].delta.content for chunk in replayed[:-1]] == PIECES
+    assert [chunk.choices[0].delta.content for chunk in streamed] == PIECES
+    assert replayed[-1].choices[0].finish_reason == "stop"
+    assert len({chunk.id for chunk in replayed}) == 1
+
+
+def test_replays_streamed_pieces_with_async_callback():
+    llm = CachedGenerator(FakeGenerator(), AnswerCache())
+    llm.run(prompt="p", streaming_callback=lambda chunk: None)
+    replayed = []
+
+    async def callback(chunk):
+        replayed.append(chunk.choices[0].delta.content)
+
+    result = asyncio.run(llm.run_async(prompt="p", streaming_callback=callback))
+    assert result["meta"][0]["cache_hit"] is True
+    assert replayed[:-1] == PIECES
+
+
+def test_answer_without_streaming_replays_as_one_piece():
+    llm = CachedGenerator(FakeGenerator(), AnswerCache())
+    llm.run(prompt="p")
+    replayed, callback = collect()
+    llm.run(prompt="p", streaming_callback=callback)
+    assert [chunk.choices[0].delta.content for chunk in replayed[:-1]] == ["".join(PIECES)]
+
+
+def test_entries_expire_after_ttl(clock):
+    generator = FakeGenerator()
+    llm = CachedGenerator(generator, AnswerCache(ttl=60))
+    llm.run(prompt="p")
+    clock[0] += 59
+    assert llm.run(prompt="p")["meta"][0].get("cache_hit") is True
+    clock[0] += 2
+    assert "cache_hit" not in llm.run(prompt="p")["meta"][0]
+    assert generator.calls == 2
+
+
+def test_truncated_answers_are_not_cached():
+    generator = FakeGenerator(finish_reason="length")
+    llm = CachedGenerator(generator, AnswerCache())
+    llm.run(prompt="p")
+    llm.run(prompt="p")
+    assert generator.calls == 2
+
+
+def test_key_changes_with_generation_kwargs():
+    generator = FakeGenerator()
+    llm = CachedGenerator(generator, AnswerCache())
+    llm.run(prompt="p")
+    llm.run(prompt="p", generation_kwargs={"temperature": 0.1})
+    assert generator.calls == 2
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("haystack")
+
+from custom_haystack.components.fetcher.CrawlScheduler import CrawlScheduler
+
+
+async def crawl_all(scheduler, urls_by_request):
+    """按请求并发抓取，记录每个域名和全局的最大并发数"""
+    peak = {"total": 0}
+    in_flight = {"total": 0}
+
+    async def crawl(url, request_id):
+        host = scheduler._host(url)
+        async with scheduler.slot(url, request_id=request_id):
+            for key in ("total", host):
+                in_flight[key] = in_flight.get(key, 0) + 1
+                peak[key] = max(peak.get(key, 0), in_flight[key])
+            await asyncio.sleep(0.01)
+            for key in ("total", host):
+                in_flight[key] -= 1
+
+    await asyncio.gather(*(
+        crawl(url, request_id)
+        for request_id, urls in urls_by_request.items()
+        for url in urls
+    ))
+    return peak
+
+
+def test_limits_pages_per_host():
+    scheduler = CrawlScheduler(max_concurrency=8, max_per_host=2)
+    urls = {
+        "req-1": [f"https://a.example.com/{i}" for i in range(6)],
+        "req-2": [f"https://B.example.com/{i}" for i in range(6)],
+    }
+    peak = asyncio.run(crawl_all(scheduler, urls))
+    assert peak["a.example.com"] == 2
+    assert peak["b.example.com"] == 2
+    stats = scheduler.stats()
+    assert stats["completed"] == 12
+    assert stats["in_flight"] == 0 and stats["queue_depth"] == 0
+
+
+def test_limits_global_concurrency():
+    scheduler = CrawlScheduler(max_concurrency=3, max_per_host=2)
+    urls = {"req-1": [f"https://host{i}.example.com/" for i in range(8)]}
+    peak = asyncio.run(crawl_all(scheduler, urls))
+    assert peak["total"] == 3
+
+
+def test_busy_host_does_not_block_other_hosts():
+    async def scenario():
+        scheduler = CrawlScheduler(max_concurrency=4, max_per_host=1)
+        async with scheduler.slot("https://a.example.com/1", request_id="req-1"):
+            blocked = asyncio.ensure_future(_enter(scheduler, "https://a.example.com/2", "req-1"))
+            other = asyncio.ensure_future(_enter(scheduler, "https://b.example.com/1", "req-2"))
+            await asyncio.wait_for(other, 1)
+            assert not blocked.done()
+            assert scheduler.stats()["queue_depth"] == 1
+        await asyncio.wait_for(blocked, 1)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = CrawlScheduler(max_concurrency=4, max_per_host=1)
+        async with scheduler.slot("https://a.example.com/1", request_id="req-1"):
+            waiting = asyncio.ensure_future(_enter(scheduler, "https://a.example.com/2", "req-1"))
+            await asyncio.sleep(0)
+            waiting.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiting
+            assert scheduler.stats()["queue_depth"] == 0
+        assert scheduler.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+async def _enter(scheduler, url, request_id):
+    async with scheduler.slot(url, request_id=request_id):
+        pass
@@ -0,0 +1,189 @@
+import asyncio
+import multiprocessing
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("haystack")
+pytest.importorskip("crawl4ai")
+
+from custom_haystack.components.fetcher import CrawlerPool as crawler_pool_module
+from custom_haystack.components.fetcher.CrawlerPool import CrawlerPool
+
+
+class FakeCrawler:
+    """代替AsyncWebCrawler，启动和抓取的时机由CrawlerFactory控制"""
+    def __init__(self, factory):
+        self.factory = factory
+        self.urls = []
+        self.closed = False
+        self.process = None
+
+    async def start(self):
+        if self.factory.fail_start:
+            raise RuntimeError("browser failed to start")
+        await self.factory.start_gate.wait()
+        if self.factory.spawn:
+            self.process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+
+    async def arun(self, url, config):
+        self.urls.append(url)
+        gate = self.factory.page_gates.get(url)
+        if gate is not None:
+            await gate.wait()
+        return SimpleNamespace(success=True, url=url)
+
+    async def close(self):
+        self.closed = True
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+
+
+class CrawlerFactory:
+    def __init__(self):
+        self.crawlers = []
+        self.fail_start = False
+        self.spawn = False
+        self.start_gate = asyncio.Event()
+        self.start_gate.set()
+        # url -> Event，设置前该页面一直在抓取中
+        self.page_gates = {}
+
+    def __call__(self, config=None):
+        crawler = FakeCrawler(self)
+        self.crawlers.append(crawler)
+        return crawler
+
+
+@pytest.fixture
+def factory(monkeypatch):
+    factory = CrawlerFactory()
+    monkeypatch.setattr(crawler_pool_module, "AsyncWebCrawler", factory)
+    return factory
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_retiring_browser_gets_no_pages_until_replaced(factory):
+    async def scenario():
+        pool = CrawlerPool(size=1, max_pages_per_crawler=2, health_check_interval=0)
+        await pool.start()
+        old = factory.crawlers[0]
+        await pool.arun("https://example.com/1", None)
+        # 第二个页面完成后达到上限，替换实例在后台启动
+        factory.start_gate.clear()
+        await pool.arun("https://example.com/2", None)
+        waiting = asyncio.create_task(pool.arun("https://example.com/3", None))
+        await settle()
+        assert not waiting.done()
+        assert old.urls == ["https://example.com/1", "https://example.com/2"]
+
+        factory.start_gate.set()
+        await asyncio.wait_for(waiting, 1)
+        await settle()
+        new = factory.crawlers[1]
+        assert new.urls == ["https://example.com/3"]
+        assert old.closed and not new.closed
+        await pool.close()
+        assert new.closed
+
+    asyncio.run(scenario())
+
+
+def test_pages_go_to_other_browser_while_one_retires(factory):
+    async def scenario():
+        pool = CrawlerPool(size=2, max_pages_per_crawler=1, health_check_interval=0)
+        await pool.start()
+        first, second = factory.crawlers
+        factory.start_gate.clear()
+        await pool.arun("https://example.com/1", None)
+        # first在替换中，即使second更忙新页面也不分配给first
+        factory.page_gates["https://example.com/2"] = asyncio.Event()
+        busy = asyncio.create_task(pool.arun("https://example.com/2", None))
+        await settle()
+        quick = asyncio.create_task(pool.arun("https://example.com/3", None))
+        await settle()
+        assert first.urls == ["https://example.com/1"]
+        assert second.urls == ["https://example.com/2", "https://example.com/3"]
+        factory.page_gates["https://example.com/2"].set()
+        factory.start_gate.set()
+        await asyncio.gather(busy, quick)
+        await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_retired_browser_closes_after_its_last_page(factory):
+    async def scenario():
+        pool = CrawlerPool(size=1, max_pages_per_crawler=1, health_check_interval=0)
+        await pool.start()
+        old = factory.crawlers[0]
+        factory.page_gates["https://example.com/slow"] = asyncio.Event()
+        slow = asyncio.create_task(pool.arun("https://example.com/slow", None))
+        await settle()
+        await pool.arun("https://example.com/fast", None)
+        await settle()
+        # 已被替换，但还有页面在抓取，暂不关闭
+        assert len(factory.crawlers) == 2
+        assert not old.closed
+        factory.page_gates["https://example.com/slow"].set()
+        await slow
+        await settle()
+        assert old.closed
+        await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_failed_replacement_keeps_serving_with_old_browser(factory):
+    async def scenario():
+        pool = CrawlerPool(size=1, max_pages_per_crawler=1, health_check_interval=0)
+        await pool.start()
+        old = factory.crawlers[0]
+        factory.fail_start = True
+        await pool.arun("https://example.com/1", None)
+        await asyncio.wait_for(pool.arun("https://example.com/2", None), 1)
+        assert old.urls == ["https://example.com/1", "https://example.com/2"]
+        assert not old.closed
+        await pool.close()
+
+    asyncio.run(scenario())
+
+
+def _idle():
+    time.sleep(30)
+
+
+def test_memory_counts_only_browser_processes(factory):
+    pytest.importorskip("psutil")
+    factory.spawn = True
+    # 与重排子进程一样由multiprocessing启动的子进程不属于浏览器
+    worker = multiprocessing.get_context("spawn").Process(target=_idle, daemon=True)
+    worker.start()
+
+    async def scenario():
+        pool = CrawlerPool(size=2, max_memory_mb=1024 * 1024, health_check_interval=0)
+        await pool.start()
+        try:
+            tracked = {process.pid for process in pool._browser_processes}
+            assert tracked == {crawler.process.pid for crawler in factory.crawlers}
+            assert worker.pid not in tracked
+            assert pool._browser_memory_mb() > 0
+        finally:
+            await pool.close()
+        # 浏览器关闭后不再计入
+        assert pool._browser_memory_mb() == 0
+        assert not pool._browser_processes
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        worker.kill()
+        worker.join()
@@ -0,0 +1,68 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+pytest.importorskip("haystack")
+
+from haystack import Document
+
+from custom_haystack.components.rankers import CrossEncoderRanker
+
+DOCUMENTS = [Document(content=f"chunk {i}", score=1.0 - i / 10) for i in range(4)]
+
+
+class FakeProcess:
+    """代替重排子进程，submit返回预先设置的Future"""
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.shut_down = False
+
+    def submit(self, fn, pairs):
+        future = Future()
+        if self.error is not None:
+            future.set_exception(self.error)
+        elif self.result is not None:
+            future.set_result(self.result(pairs))
+        # 两者都没有时Future一直不完成，模拟推理超时
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+def ranked_contents(ranker, top_k=2):
+    documents = ranker.run(documents=DOCUMENTS, query="q", top_k=top_k)["documents"]
+    return [doc.content for doc in documents]
+
+
+def test_reranks_by_cross_encoder_score():
+    ranker = CrossEncoderRanker(time_budget=None)
+    ranker._process = FakeProcess(result=lambda pairs: [float(content[-1]) for _, content in pairs])
+    assert ranked_contents(ranker) == ["chunk 3", "chunk 2"]
+    ranker.close()
+
+
+def test_falls_back_to_retriever_order_when_not_loaded():
+    ranker = CrossEncoderRanker()
+    assert ranked_contents(ranker) == ["chunk 0", "chunk 1"]
+    assert ranker.stats()["fallbacks"] == 1
+    ranker.close()
+
+
+def test_falls_back_to_retriever_order_on_timeout():
+    ranker = CrossEncoderRanker(time_budget=0.05)
+    ranker._process = FakeProcess()
+    assert ranked_contents(ranker) == ["chunk 0", "chunk 1"]
+    assert ranker.stats()["timeouts"] == 1
+    ranker.close()
+
+
+def test_falls_back_and_drops_a_broken_process():
+    ranker = CrossEncoderRanker()
+    process = ranker._process = FakeProcess(error=BrokenProcessPool("killed"))
+    assert ranked_contents(ranker) == ["chunk 0", "chunk 1"]
+    assert ranker._process is None and process.shut_down
+    assert ranker.should_load
+    ranker.close()
@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("haystack")
+pytest.importorskip("jinja2")
+
+from haystack import Document
+
+from custom_haystack.components.builders.DocsPromptBuilder import DocsPromptBuilder
+
+
+def _documents():
+    documents = []
+    for source in range(12):
+        for split_id in range(3):
+            documents.append(Document(
+                content=f"第{source}个网页的第{split_id}段，错误码 0x8007000{split_id} 的解决方法。\n" * 5,
+                score=1.0 - (source * 3 + split_id) / 100,
+                meta={"source_id": f"s{source}", "split_id": split_id, "title": f"网页{source}", "url": f"https://example.com/{source}"}
+            ))
+    return documents
+
+
+@pytest.mark.parametrize("max_tokens", [50, 200, 500, 1000])
+def test_rendered_contents_stay_within_budget(max_tokens):
+    builder = DocsPromptBuilder(template="{{contents}}", max_tokens=max_tokens)
+    result = builder.run(documents=_documents())
+    assert result["context_tokens"] == builder.counter.count(result["prompt"])
+    assert result["context_tokens"] <= max_tokens
+    assert result["dropped_tokens"] > 0
+
+
+def test_no_budget_keeps_everything():
+    builder = DocsPromptBuilder(template="{{contents}}")
+    result = builder.run(documents=_documents())
+    assert result["dropped_tokens"] == 0
+    assert result["prompt"].count("Document <") == 12
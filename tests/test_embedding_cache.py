@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip("haystack")
+
+from custom_haystack.components.embedders import EmbeddingCache
+
+
+def test_cache_overwrites_oldest_entries_when_full(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), dtype="float32", initial_capacity=2, max_entries=3)
+    texts = ["a", "b", "c", "d"]
+    cache.put_many("model", texts, [[float(i), 1.0] for i in range(len(texts))])
+    assert cache.get_many("model", texts) == [None, [1.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+    cache.close()
+
+    # 重启后仍按写入顺序继续覆盖
+    reopened = EmbeddingCache(str(tmp_path), dtype="float32", max_entries=3)
+    assert reopened.get_many("model", texts) == [None, [1.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+    reopened.put_many("model", ["e"], [[4.0, 1.0]])
+    assert reopened.get_many("model", ["b", "e"]) == [None, [4.0, 1.0]]
+    reopened.close()
+
+
+def test_index_log_is_compacted(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), dtype="float32", initial_capacity=4, max_entries=4)
+    texts = [str(i) for i in range(3000)]
+    cache.put_many("model", texts, [[float(i)] for i in range(len(texts))])
+    cache.close()
+    with open(tmp_path / "model" / "index.tsv", encoding="utf-8") as f:
+        assert len(f.readlines()) <= 2 * 1024 + 1
+    reopened = EmbeddingCache(str(tmp_path), dtype="float32", max_entries=4)
+    assert reopened.get_many("model", texts[-5:]) == [None, [2996.0], [2997.0], [2998.0], [2999.0]]
+    reopened.close()
+
+
+def test_query_vectors_do_not_evict_documents(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), dtype="float32", max_entries=2, max_query_entries=1)
+    cache.put_many("model", ["doc"], [[1.0]])
+    cache.put_many("model", ["q1", "q2"], [[2.0], [3.0]], query=True)
+    assert cache.get_many("model", ["doc"]) == [[1.0]]
+    assert cache.get_many("model", ["q1", "q2"], query=True) == [None, [3.0]]
+    assert cache.get_many("model", ["q2"]) == [None]
+    cache.close()
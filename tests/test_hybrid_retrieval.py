@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip("haystack")
+
+from haystack import Document
+from haystack.components.joiners import DocumentJoiner
+
+from custom_haystack.components.retrievers import BM25Retriever, NumpyEmbeddingRetriever
+from custom_haystack.document_stores import ScopedInMemoryDocumentStore
+
+QUERY = "0x80070005"
+QUERY_EMBEDDING = [1.0, 0.0]
+
+
+@pytest.fixture
+def store():
+    store = ScopedInMemoryDocumentStore()
+    store.write_documents([
+        Document(id="semantic-1", content="访问被拒绝时检查账户权限", embedding=[1.0, 0.0], meta={"request_id": "req-1"}),
+        Document(id="both", content="错误 0x80070005 表示访问被拒绝", embedding=[0.95, 0.05], meta={"request_id": "req-1"}),
+        Document(id="semantic-2", content="以管理员身份运行安装程序", embedding=[0.9, 0.1], meta={"request_id": "req-1"}),
+        Document(id="identifier", content="0x80070005", embedding=[0.0, 1.0], meta={"request_id": "req-1"}),
+        Document(id="other-request", content="0x80070005 访问被拒绝", embedding=[1.0, 0.0], meta={"request_id": "req-2"}),
+    ])
+    return store
+
+
+def fused(store, top_k=3):
+    """与rag.py中的查询管道相同：向量检索和BM25检索各取top_k，按倒数排名融合"""
+    vector = NumpyEmbeddingRetriever(store, top_k=top_k).run(query_embedding=QUERY_EMBEDDING, namespace="req-1")
+    lexical = BM25Retriever(store, top_k=top_k).run(query=QUERY, namespace="req-1")
+    joiner = DocumentJoiner(join_mode="reciprocal_rank_fusion", top_k=top_k)
+    return vector["documents"], lexical["documents"], joiner.run(documents=[vector["documents"], lexical["documents"]])["documents"]
+
+
+def test_bm25_recalls_identifier_missed_by_vectors(store):
+    vector, lexical, _ = fused(store)
+    assert "identifier" not in [doc.id for doc in vector]
+    assert [doc.id for doc in lexical] == ["identifier", "both"]
+
+
+def test_rrf_puts_documents_found_by_both_retrievers_first(store):
+    _, _, documents = fused(store)
+    ids = [doc.id for doc in documents]
+    assert ids[0] == "both"
+    # 只有一路召回的文档排在后面，向量和BM25各自的第一名都保留
+    assert set(ids[1:]) == {"semantic-1", "identifier"}
+    assert documents[0].score > documents[1].score
+    assert "other-request" not in ids
+
+
+def test_rrf_scores_are_descending(store):
+    _, _, documents = fused(store, top_k=4)
+    scores = [doc.score for doc in documents]
+    assert scores == sorted(scores, reverse=True)
@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("haystack")
+
+from haystack import Document
+
+from custom_haystack.components.preprocessors import LexicalPrefilter
+
+
+def _page(request_id, relevant):
+    return [
+        Document(content="0x80070005 错误 权限不足" if i < relevant else f"无关内容 第{i}段", meta={"request_id": request_id})
+        for i in range(10)
+    ]
+
+
+def test_top_m_applies_across_pages_of_a_request():
+    prefilter = LexicalPrefilter(top_m=5)
+    embedded = sum(len(prefilter.run(documents=_page("req-1", relevant=10), query="0x80070005 错误")["documents"]) for _ in range(20))
+    # 每页都取前5个时是100个；第一页填满请求的前5名后，之后页面的分片没有超过门槛，不再嵌入
+    assert embedded == 5
+
+
+def test_requests_have_separate_budgets():
+    prefilter = LexicalPrefilter(top_m=3)
+    first = prefilter.run(documents=_page("req-1", relevant=5), query="0x80070005")
+    second = prefilter.run(documents=_page("req-2", relevant=5), query="0x80070005")
+    assert len(first["documents"]) == 3 and len(second["documents"]) == 3
+    assert len(first["skipped"]) == 7
+    prefilter.release("req-1")
+    assert len(prefilter.run(documents=_page("req-1", relevant=5), query="0x80070005")["documents"]) == 3
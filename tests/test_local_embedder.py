@@ -0,0 +1,78 @@
+import asyncio
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("haystack")
+
+from haystack import Document
+
+from custom_haystack.components.embedders import LocalDocumentEmbedder, LocalTextEmbedder
+from custom_haystack.components.embedders.LocalEmbedder import LocalEmbeddingBackend
+from custom_haystack.utils import tokenization
+
+
+class FakeSentenceTransformer:
+    """记录加载次数的SentenceTransformer替身，向量为文本长度"""
+    loads = []
+
+    def __init__(self, model, device=None):
+        # 模拟加载耗时，让并发的warm_up有机会重叠
+        time.sleep(0.05)
+        FakeSentenceTransformer.loads.append((model, device))
+        self.max_seq_length = 512
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True, show_progress_bar=False):
+        return np.array([[float(len(text)), 1.0] for text in texts])
+
+
+@pytest.fixture(autouse=True)
+def fake_model(monkeypatch):
+    # 不下载分词器和模型
+    monkeypatch.setattr(tokenization, "get_tokenizer", lambda name: None)
+    monkeypatch.setitem(sys.modules, "sentence_transformers", SimpleNamespace(SentenceTransformer=FakeSentenceTransformer))
+    monkeypatch.setattr(FakeSentenceTransformer, "loads", [])
+    monkeypatch.setattr(LocalEmbeddingBackend, "_instances", {})
+    yield
+    for backend in LocalEmbeddingBackend._instances.values():
+        backend.close()
+
+
+def test_document_and_text_embedders_share_one_backend():
+    document_embedder = LocalDocumentEmbedder(model="bge-test")
+    text_embedder = LocalTextEmbedder(model="bge-test")
+    assert document_embedder.backend is text_embedder.backend
+    assert LocalTextEmbedder(model="bge-test", device="cuda").backend is not text_embedder.backend
+    assert LocalTextEmbedder(model="other").backend is not text_embedder.backend
+
+
+def test_model_is_loaded_once_per_model_and_device():
+    document_embedder = LocalDocumentEmbedder(model="bge-test")
+    text_embedder = LocalTextEmbedder(model="bge-test")
+    threads = [threading.Thread(target=embedder.warm_up) for embedder in (document_embedder, text_embedder) * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert FakeSentenceTransformer.loads == [("bge-test", None)]
+    assert document_embedder.is_ready and text_embedder.is_ready
+
+    documents = document_embedder.run(documents=[Document(content="abc"), Document(content="hello")])["documents"]
+    assert [doc.embedding for doc in documents] == [[3.0, 1.0], [5.0, 1.0]]
+    assert asyncio.run(text_embedder.run_async(text="你好"))["embedding"] == [2.0, 1.0]
+    assert FakeSentenceTransformer.loads == [("bge-test", None)]
+
+    LocalTextEmbedder(model="bge-test", device="cpu").warm_up()
+    assert FakeSentenceTransformer.loads == [("bge-test", None), ("bge-test", "cpu")]
+
+
+def test_first_embedding_loads_the_model_without_warm_up():
+    text_embedder = LocalTextEmbedder(model="bge-test")
+    assert not text_embedder.is_ready
+    assert text_embedder.run(text="abcd")["embedding"] == [4.0, 1.0]
+    assert LocalDocumentEmbedder(model="bge-test").is_ready
+    assert len(FakeSentenceTransformer.loads) == 1
@@ -0,0 +1,72 @@
+import pytest
+
+pytest.importorskip("haystack")
+
+from haystack import Document
+
+from custom_haystack.components.preprocessors import MarkdownTokenSplitter
+from custom_haystack.utils import TokenCounter
+
+HEADER = "| name | value |\n| --- | --- |"
+
+
+def split(markdown, **kwargs):
+    splitter = MarkdownTokenSplitter(**{"max_tokens": 60, "overlap_tokens": 10, **kwargs})
+    return [doc.content for doc in splitter.run(documents=[Document(content=markdown)])["documents"]]
+
+
+def test_long_table_repeats_header_in_every_piece():
+    rows = "\n".join(f"| key{i} | value number {i} |" for i in range(40))
+    chunks = split(f"{HEADER}\n{rows}")
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.startswith(HEADER)
+    # 每行只出现在一个分片中，且没有丢行
+    body = [line for chunk in chunks for line in chunk.split("\n")[2:]]
+    assert body == rows.split("\n")
+
+
+def test_long_code_block_closes_fence_in_every_piece():
+    code = "\n".join(f"print('line {i}', value_{i})" for i in range(40))
+    chunks = split(f"```python\n{code}\n```")
+    assert len(chunks) > 1
+    for chunk in chunks:
+        lines = chunk.split("\n")
+        assert lines[0] == "```python"
+        assert lines[-1] == "```"
+
+
+def test_unclosed_code_fence_is_closed_per_piece():
+    code = "\n".join(f"x_{i} = compute({i})" for i in range(40))
+    for chunk in split(f"```\n{code}"):
+        assert chunk.startswith("```\n") and chunk.endswith("\n```")
+
+
+def test_chunks_stay_within_token_budget():
+    paragraphs = "\n\n".join(
+        f"Paragraph {i} explains one detail. It has a second sentence! 第{i}段还有中文内容。"
+        for i in range(30)
+    )
+    rows = "\n".join(f"| k{i} | v{i} |" for i in range(30))
+    code = "\n".join(f"call({i})" for i in range(30))
+    markdown = f"# Title\n\n{paragraphs}\n\n## Table\n\n{HEADER}\n{rows}\n\n## Code\n\n```\n{code}\n```\n\n{'x' * 2000}"
+    counter = TokenCounter()
+    chunks = split(markdown)
+    assert len(chunks) > 3
+    for chunk in chunks:
+        assert counter.count(chunk) <= 60
+
+
+def test_sections_start_new_chunk_with_heading_context():
+    markdown = "# Guide\n\n## Install\n\n" + "\n\n".join(
+        f"Step {i} of the install guide runs a command." for i in range(20)
+    )
+    chunks = split(markdown)
+    assert len(chunks) > 1
+    for chunk in chunks[1:]:
+        assert chunk.startswith("# Guide\n## Install")
+
+
+def test_overlap_must_be_smaller_than_budget():
+    with pytest.raises(ValueError):
+        MarkdownTokenSplitter(max_tokens=50, overlap_tokens=50)
@@ -0,0 +1,61 @@
+import threading
+
+import pytest
+
+pytest.importorskip("haystack")
+
+from custom_haystack.components.embedders.MicroBatchWorker import MicroBatchEmbeddingWorker
+
+
+def test_concurrent_submissions_share_one_forward_pass():
+    batches = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def encode(texts):
+        batches.append(list(texts))
+        if len(batches) == 1:
+            started.set()
+            release.wait(timeout=5)
+        return [[float(len(text))] for text in texts]
+
+    worker = MicroBatchEmbeddingWorker(encode, max_wait_ms=0)
+    first = worker.submit(["warm-up"])
+    started.wait(timeout=5)
+    # 第一批计算期间提交的两个请求的文本合并成一批
+    second = worker.submit(["a", "bb"])
+    third = worker.submit(["ccc"])
+    release.set()
+    assert [f.result(timeout=5) for f in first + second + third] == [[7.0], [1.0], [2.0], [3.0]]
+    assert batches == [["warm-up"], ["a", "bb", "ccc"]]
+    worker.close()
+
+
+def test_batches_respect_the_token_budget():
+    batches = []
+
+    def encode(texts):
+        batches.append(list(texts))
+        return [[0.0] for _ in texts]
+
+    worker = MicroBatchEmbeddingWorker(encode, max_batch_tokens=8, max_wait_ms=50)
+    # 按字符估算，每个文本4个token
+    futures = worker.submit(["x" * 16] * 5)
+    assert all(f.result(timeout=5) == [0.0] for f in futures)
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    worker.close()
+
+
+def test_encode_errors_reach_every_caller_in_the_batch():
+    def encode(texts):
+        raise RuntimeError("out of memory")
+
+    worker = MicroBatchEmbeddingWorker(encode, max_wait_ms=50)
+    futures = worker.submit(["a", "b"])
+    for future in futures:
+        with pytest.raises(RuntimeError, match="out of memory"):
+            future.result(timeout=5)
+    # 工作线程出错后继续处理后续文本
+    worker.encode = lambda texts: [[1.0] for _ in texts]
+    assert worker.submit(["c"])[0].result(timeout=5) == [1.0]
+    worker.close()
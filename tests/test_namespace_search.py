@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("haystack")
+
+from custom_haystack.document_stores import BM25Index, HnswVectorIndex, NumpyVectorIndex
+
+
+def test_numpy_index_searches_several_namespaces():
+    index = NumpyVectorIndex()
+    index.add(["kept", "current", "other"], [[1.0, 0.0], [0.9, 0.1], [1.0, 0.01]], namespaces=["req-1", "req-2", "req-3"])
+    hits = index.search([1.0, 0.0], top_k=3, namespace=["req-1", "req-2"])
+    assert sorted(doc_id for doc_id, _ in hits) == ["current", "kept"]
+    assert index.search([1.0, 0.0], top_k=3, namespace=["missing"]) == []
+
+
+def test_bm25_index_searches_several_namespaces():
+    index = BM25Index()
+    index.add(["kept", "current", "other"], ["错误码 0x80070005", "0x80070005 权限", "0x80070005"], namespaces=["req-1", "req-2", "req-3"])
+    hits = index.search("0x80070005", top_k=3, namespace=["req-1", "req-2"])
+    assert sorted(doc_id for doc_id, _ in hits) == ["current", "kept"]
+    assert [doc_id for doc_id, _ in index.search("0x80070005", top_k=3, namespace="req-3")] == ["other"]
+
+
+def test_numpy_index_searches_kept_corpus_and_current_request():
+    index = NumpyVectorIndex()
+    index.add(["kept", "current", "other"], [[1.0, 0.0], [0.9, 0.1], [1.0, 0.01]], namespaces=["req-1", "req-2", "req-3"])
+    index.keep("req-1")
+    hits = index.search([1.0, 0.0], top_k=3, namespace="req-2", include_kept=True)
+    assert sorted(doc_id for doc_id, _ in hits) == ["current", "kept"]
+    index.delete(["kept"])
+    index.drop_namespace("req-1")
+    assert [doc_id for doc_id, _ in index.search([1.0, 0.0], top_k=3, include_kept=True)] == []
+
+
+def test_bm25_index_searches_kept_corpus_and_current_request():
+    index = BM25Index()
+    index.add(["kept", "current", "other"], ["错误码 0x80070005", "0x80070005 权限", "0x80070005"], namespaces=["req-1", "req-2", "req-3"])
+    index.keep("req-1")
+    hits = index.search("0x80070005", top_k=3, namespace="req-2", include_kept=True)
+    assert sorted(doc_id for doc_id, _ in hits) == ["current", "kept"]
+    # 保留后写入和删除的文档落在保留语料分区
+    index.add(["kept-2"], ["0x80070005 补丁"], namespaces=["req-1"])
+    index.delete(["kept"])
+    assert [doc_id for doc_id, _ in index.search("0x80070005", top_k=3, include_kept=True)] == ["kept-2"]
+
+
+def test_hnsw_index_searches_kept_corpus_without_other_requests():
+    pytest.importorskip("hnswlib")
+    rng = np.random.default_rng(0)
+    index = HnswVectorIndex(brute_force_threshold=10)
+    kept = rng.normal(size=(200, 8))
+    index.add([f"kept-{i}" for i in range(200)], kept, namespaces=["req-1"] * 200)
+    index.keep("req-1")
+    # 其它进行中的请求写入了与查询最接近的向量
+    index.add([f"other-{i}" for i in range(50)], np.tile(kept[0], (50, 1)), namespaces=["req-3"] * 50)
+    index.add(["current"], [kept[0] * 0.9 + 0.01], namespaces=["req-2"])
+    hits = [doc_id for doc_id, _ in index.search(kept[0], top_k=5, namespace="req-2", include_kept=True)]
+    assert len(hits) == 5
+    assert {"kept-0", "current"} <= set(hits)
+    assert not any(doc_id.startswith("other") for doc_id in hits)
+
+
+def test_numpy_index_reuses_codes_of_dropped_namespaces():
+    index = NumpyVectorIndex()
+    index.add(["kept"], [[1.0, 0.0]], namespaces=["kept-request"])
+    index.keep("kept-request")
+    for i in range(100):
+        request = f"req-{i}"
+        index.add([f"doc-{i}"], [[1.0, 0.0]], namespaces=[request])
+        assert [doc_id for doc_id, _ in index.search([1.0, 0.0], top_k=3, namespace=request, include_kept=True)] in (
+            [f"doc-{i}", "kept"], ["kept", f"doc-{i}"]
+        )
+        index.delete([f"doc-{i}"])
+        index.drop_namespace(request)
+    # 编码数只与同时存在的命名空间数有关，不随请求数增长
+    assert len(index._kept_codes) <= 4
+    assert [doc_id for doc_id, _ in index.search([1.0, 0.0], top_k=3, include_kept=True)] == ["kept"]
+
+
+def test_numpy_index_does_not_reuse_codes_of_live_rows():
+    index = NumpyVectorIndex()
+    index.add(["left-over"], [[1.0, 0.0]], namespaces=["req-1"])
+    index.drop_namespace("req-1")
+    index.add(["new"], [[1.0, 0.0]], namespaces=["req-2"])
+    assert [doc_id for doc_id, _ in index.search([1.0, 0.0], top_k=3, namespace="req-2")] == ["new"]
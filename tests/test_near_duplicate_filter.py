@@ -0,0 +1,60 @@
+import pytest
+
+pytest.importorskip("haystack")
+
+from haystack import Document
+
+from custom_haystack.components.preprocessors import NearDuplicateFilter
+from custom_haystack.document_stores import ScopedInMemoryDocumentStore
+
+TEXT = "SearXNG is a free internet metasearch engine which aggregates results from more than 70 search services."
+
+
+def page(url, request_id="req-1", text=TEXT):
+    return Document(content=text, meta={"request_id": request_id, "url": url})
+
+
+def test_concurrent_mirror_pages_are_deduplicated():
+    dedup = NearDuplicateFilter()
+    # 两个镜像页面都已通过去重、尚未写入
+    first = dedup.run(documents=[page("https://a.example.com")], batch="a")
+    second = dedup.run(documents=[page("https://b.example.com")], batch="b")
+    assert len(first["documents"]) == 1
+    assert second["documents"] == [] and second["dropped"] == 1
+
+
+def test_failed_batch_releases_its_signatures():
+    dedup = NearDuplicateFilter()
+    dedup.run(documents=[page("https://a.example.com")], batch="a")
+    # 第一个页面嵌入失败，没有commit
+    dedup.discard("a")
+    assert len(dedup.run(documents=[page("https://b.example.com")], batch="b")["documents"]) == 1
+
+
+def test_committed_signatures_survive_discard():
+    dedup = NearDuplicateFilter()
+    kept = dedup.run(documents=[page("https://a.example.com")], batch="a")["documents"]
+    dedup.commit(kept)
+    dedup.discard("a")
+    assert dedup.run(documents=[page("https://b.example.com")])["dropped"] == 1
+
+
+def test_corpus_signatures_follow_kept_namespaces():
+    store = ScopedInMemoryDocumentStore(max_documents=1)
+    dedup = NearDuplicateFilter(cross_request=True)
+    store.add_release_listener(dedup.release)
+    store.add_delete_listener(dedup.forget)
+
+    doc = page("https://a.example.com")
+    store.write_documents([doc])
+    store.keep("req-1")
+    # 例如从快照恢复后重建签名
+    dedup.restore(store.kept_documents())
+    assert dedup.run(documents=[page("https://b.example.com", request_id="req-2")])["dropped"] == 1
+
+    # req-1被容量淘汰后，它的签名不再挡住新请求
+    store.write_documents([page("https://c.example.com", request_id="req-3", text="other")])
+    store.keep("req-3")
+    store.write_documents([page("https://d.example.com", request_id="req-4", text="another")])
+    assert "req-1" not in store.kept_namespaces()
+    assert len(dedup.run(documents=[page("https://b.example.com", request_id="req-5")])["documents"]) == 1
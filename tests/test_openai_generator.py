@@ -0,0 +1,120 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("haystack")
+pytest.importorskip("openai")
+
+from haystack.utils import Secret
+from openai import AsyncStream
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from custom_haystack.components.generators import CustomOpenAIGenerator
+
+
+def test_build_message_usage_is_json_serializable():
+    completion = ChatCompletion.model_validate({
+        "id": "chatcmpl-1",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4o-mini",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "ok"}}],
+        "usage": {
+            "prompt_tokens": 3,
+            "completion_tokens": 1,
+            "total_tokens": 4,
+            "completion_tokens_details": {"reasoning_tokens": 0},
+            "prompt_tokens_details": {"cached_tokens": 0},
+        },
+    })
+    message = CustomOpenAIGenerator._build_message(completion, completion.choices[0])
+    assert json.loads(json.dumps(message.meta))["usage"]["prompt_tokens_details"]["cached_tokens"] == 0
+
+
+class FakeStream(AsyncStream):
+    """代替AsyncOpenAI的流式响应，stall为True时发完chunk后一直等待"""
+    def __init__(self, chunks, stall=False):
+        self.chunks = chunks
+        self.stall = stall
+        self.closed = False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+        if self.stall:
+            await asyncio.Event().wait()
+
+    async def close(self):
+        self.closed = True
+
+
+def chunk(content=None, finish_reason=None, usage=None):
+    return ChatCompletionChunk.model_validate({
+        "id": "chatcmpl-1",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "gpt-4o-mini",
+        "choices": [] if usage else [{"index": 0, "delta": {"content": content}, "finish_reason": finish_reason}],
+        "usage": usage,
+    })
+
+
+def generator_with(stream):
+    generator = CustomOpenAIGenerator(api_key=Secret.from_token("test"), model="gpt-4o-mini")
+    requests = []
+
+    async def create(**kwargs):
+        requests.append(kwargs)
+        return stream
+
+    generator.async_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return generator, requests
+
+
+def test_run_async_joins_streamed_reply():
+    stream = FakeStream([
+        chunk("你"),
+        chunk("好"),
+        chunk(finish_reason="stop"),
+        # 开启usage统计时最后一个chunk没有choices
+        chunk(usage={"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5}),
+    ])
+    generator, requests = generator_with(stream)
+    received = []
+
+    async def callback(chunk):
+        received.append(chunk.choices[0].delta.content)
+
+    result = asyncio.run(generator.run_async(prompt="hi", streaming_callback=callback))
+    assert result["replies"] == ["你好"]
+    assert result["meta"][0]["finish_reason"] == "stop"
+    assert received == ["你", "好", None]
+    assert requests[0]["stream"] is True
+    assert stream.closed
+
+
+def test_run_async_accepts_plain_callback():
+    generator, _ = generator_with(FakeStream([chunk("ok"), chunk(finish_reason="length")]))
+    received = []
+    result = asyncio.run(generator.run_async(prompt="hi", streaming_callback=received.append))
+    assert result["replies"] == ["ok"]
+    assert result["meta"][0]["finish_reason"] == "length"
+    assert len(received) == 2
+
+
+def test_cancelling_run_async_closes_stream():
+    stream = FakeStream([chunk("部分")], stall=True)
+    generator, _ = generator_with(stream)
+
+    async def scenario():
+        started = asyncio.Event()
+        task = asyncio.create_task(generator.run_async(prompt="hi", streaming_callback=lambda chunk: started.set()))
+        await asyncio.wait_for(started.wait(), 1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert stream.closed
@@ -0,0 +1,183 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("haystack")
+pytest.importorskip("aiohttp")
+
+from custom_haystack.components.fetcher import PageCache as page_cache_module
+from custom_haystack.components.fetcher.PageCache import PageCache, normalize_url
+
+
+def test_normalize_url_strips_tracking_params():
+    assert normalize_url("HTTPS://Example.com:443/a?utm_source=x&b=1&fbclid=y&mc_cid=z#top") == "https://example.com/a?b=1"
+
+
+def test_normalize_url_keeps_from_and_spm():
+    assert normalize_url("https://example.com/list?from=20") != normalize_url("https://example.com/list?from=40")
+    assert normalize_url("https://example.com/list?from=20") != normalize_url("https://example.com/list")
+    assert normalize_url("https://example.com/a?spm=1") != normalize_url("https://example.com/a")
+
+
+def test_page_cache_keeps_from_pages_apart(tmp_path):
+    cache = PageCache(str(tmp_path))
+    cache.put("https://example.com/list?from=20", content="page 2", meta={})
+    cache.put("https://example.com/list?from=40", content="page 3", meta={})
+    assert cache.get("https://example.com/list?from=20")["content"] == "page 2"
+    assert cache.get("https://example.com/list?from=40")["content"] == "page 3"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(page_cache_module, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = PageCache(str(tmp_path), default_ttl=60)
+    cache.put("https://example.com/a", content="a", meta={"title": "A"})
+    clock[0] += 59
+    assert cache.get("https://example.com/a")["meta"] == {"title": "A"}
+    clock[0] += 2
+    assert cache.get("https://example.com/a") is None
+    # 过期条目仍可取出用于条件请求
+    assert cache.get("https://example.com/a", allow_stale=True)["stale"] is True
+
+
+def test_domain_ttls_match_domain_suffix(tmp_path, clock):
+    cache = PageCache(str(tmp_path), default_ttl=10, domain_ttls={"wikipedia.org": 100})
+    for url in ("https://zh.wikipedia.org/wiki/Python", "https://wikipedia.org/", "https://notwikipedia.org/",
+                "https://example.com/"):
+        cache.put(url, content=url, meta={})
+    clock[0] += 50
+    assert cache.get("https://zh.wikipedia.org/wiki/Python") is not None
+    assert cache.get("https://wikipedia.org/") is not None
+    assert cache.get("https://notwikipedia.org/") is None
+    assert cache.get("https://example.com/") is None
+
+
+def test_evicts_least_recently_used_by_bytes(tmp_path, clock):
+    cache = PageCache(str(tmp_path))
+    cache.put("https://example.com/a", content="x" * 100, meta={})
+    entry_bytes = cache._total_bytes
+    cache.max_bytes = entry_bytes * 2 + entry_bytes // 2
+    clock[0] += 1
+    cache.put("https://example.com/b", content="y" * 100, meta={})
+    clock[0] += 1
+    # 访问a后，最久未访问的是b
+    assert cache.get("https://example.com/a") is not None
+    clock[0] += 1
+    cache.put("https://example.com/c", content="z" * 100, meta={})
+    assert cache.get("https://example.com/b") is None
+    assert cache.get("https://example.com/a") is not None
+    assert cache.get("https://example.com/c") is not None
+    assert cache._total_bytes <= cache.max_bytes
+    # 重启后从目录重建的索引与淘汰后的状态一致
+    assert len(PageCache(str(tmp_path))._index) == 2
+
+
+def test_stores_validators_from_headers(tmp_path):
+    cache = PageCache(str(tmp_path))
+    cache.put("https://example.com/a", content="a", meta={}, headers={"ETag": '"v1"', "Last-Modified": "Wed, 21 Oct 2026 07:28:00 GMT"})
+    entry = cache.get("https://example.com/a")
+    assert entry["etag"] == '"v1"'
+    assert entry["last_modified"] == "Wed, 21 Oct 2026 07:28:00 GMT"
+
+
+async def with_origin(scenario):
+    """本地源站：If-None-Match为"v1"时返回304，否则返回200，记录条件请求头"""
+    from aiohttp import web
+
+    requests = []
+
+    async def page(request):
+        requests.append(dict(request.headers))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(text="changed", headers={"ETag": '"v2"'})
+
+    app = web.Application()
+    app.router.add_get("/page", page)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    try:
+        return await scenario(f"http://127.0.0.1:{runner.addresses[0][1]}/page", requests)
+    finally:
+        await runner.cleanup()
+
+
+def test_revalidation_with_etag(tmp_path, clock):
+    cache = PageCache(str(tmp_path), default_ttl=10)
+
+    async def scenario(url, requests):
+        try:
+            cache.put(url, content="cached", meta={}, headers={"ETag": '"v1"'})
+            cache.put(url + "?changed=1", content="old", meta={}, headers={"ETag": '"v0"'})
+            clock[0] += 20
+            stale = cache.get(url, allow_stale=True)
+            not_modified = await cache.is_not_modified(stale)
+            changed = await cache.is_not_modified(cache.get(url + "?changed=1", allow_stale=True))
+            return stale, not_modified, changed, requests
+        finally:
+            await cache.close()
+
+    stale, not_modified, changed, requests = asyncio.run(with_origin(scenario))
+    assert not_modified is True
+    assert changed is False
+    assert requests[0]["If-None-Match"] == '"v1"'
+    # 304后续期，重新计算有效期
+    cache.refresh(stale["url"], stale)
+    assert cache.get(stale["url"])["content"] == "cached"
+
+
+def test_no_revalidation_without_validators_or_when_disabled(tmp_path):
+    cache = PageCache(str(tmp_path))
+    cache.put("https://example.com/a", content="a", meta={})
+    assert asyncio.run(cache.is_not_modified(cache.get("https://example.com/a"))) is False
+
+    disabled = PageCache(str(tmp_path / "disabled"), revalidate=False)
+    disabled.put("https://example.com/b", content="b", meta={}, headers={"ETag": '"v1"'})
+    assert asyncio.run(disabled.is_not_modified(disabled.get("https://example.com/b"))) is False
+    assert disabled._session is None
+
+
+class FakeCrawlerPool:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.urls = []
+
+    async def arun(self, url, config):
+        self.urls.append(url)
+        return SimpleNamespace(
+            success=True,
+            status_code=self.status_code,
+            metadata={"title": "T"},
+            markdown=SimpleNamespace(markdown_with_citations=f"body {self.status_code}"),
+            response_headers={"ETag": '"v1"'},
+        )
+
+
+@pytest.mark.parametrize("status_code, cached", [(200, True), (404, False), (503, False)])
+def test_fetcher_caches_only_2xx_pages(tmp_path, status_code, cached):
+    pytest.importorskip("crawl4ai")
+    from custom_haystack.components.fetcher.URLMarkdownFetcher import URLMarkdownFetcher
+
+    cache = PageCache(str(tmp_path))
+    pool = FakeCrawlerPool(status_code)
+    fetcher = URLMarkdownFetcher(crawler_pool=pool, page_cache=cache)
+
+    async def crawl_twice():
+        first = await fetcher._async_crawl("https://example.com/a", "req-1")
+        second = await fetcher._async_crawl("https://example.com/a", "req-1")
+        return first, second
+
+    first, second = asyncio.run(crawl_twice())
+    assert first.content == second.content == f"body {status_code}"
+    assert second.meta["request_id"] == "req-1"
+    assert (cache.get("https://example.com/a") is not None) == cached
+    # 命中缓存时不再打开浏览器
+    assert len(pool.urls) == (1 if cached else 2)
@@ -0,0 +1,225 @@
+import asyncio
+import os
+import time
+from dataclasses import replace
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+pytest.importorskip("haystack")
+pytest.importorskip("crawl4ai")
+
+from haystack import Document, component
+
+import rag
+from custom_haystack.components.fetcher.SearxngFetcher import SearXNGQueryFetcher
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# url -> (抓取耗时, 正文, 搜索摘要)
+PAGES = {
+    "https://fast.example.com/a": (0.01, "fast page a about asyncio event loops", "Event loops run coroutines."),
+    "https://fast.example.com/b": (0.02, "fast page b about asyncio tasks", "Tasks wrap scheduled coroutines concurrently."),
+    "https://slow.example.com/c": (5.0, "slow page c about asyncio streams", "Streams read and write network bytes."),
+}
+
+
+class FakeCrawlerPool:
+    """按PAGES中的耗时返回正文的浏览器池，记录抓取完成的顺序"""
+    def __init__(self, timeline, delays=None):
+        self.timeline = timeline
+        self.delays = delays or {}
+        self.calls = []
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def arun(self, url, config):
+        self.calls.append(url)
+        delay, content, _ = PAGES[url]
+        await asyncio.sleep(self.delays.get(url, delay))
+        self.timeline.append(("crawled", url))
+        return SimpleNamespace(
+            success=True,
+            status_code=200,
+            metadata={"title": url},
+            markdown=SimpleNamespace(markdown_with_citations=content),
+        )
+
+
+class StubFetcher(SearXNGQueryFetcher):
+    """搜索结果固定、页面由FakeCrawlerPool返回的SearXNGQueryFetcher"""
+    timeline = None
+    delays = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.crawler_pool = FakeCrawlerPool(self.timeline, self.delays)
+
+    async def _request_page(self, query, pageno):
+        if pageno > 1:
+            return []
+        return [{"url": url, "title": url, "content": snippet} for url, (_, _, snippet) in PAGES.items()]
+
+
+@component
+class StubDocumentEmbedder:
+    timeline = None
+
+    def __init__(self, model=None, **kwargs):
+        self.model = None
+        self.backend = None
+
+    @component.output_types(documents=List[Document])
+    async def run_async(self, documents: List[Document]):
+        for doc in documents:
+            self.timeline.append(("embedded", doc.meta.get("url")))
+        return {"documents": [replace(doc, embedding=[1.0, 0.0]) for doc in documents]}
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        return asyncio.run(self.run_async(documents))
+
+
+@component
+class StubTextEmbedder:
+    def __init__(self, model=None, **kwargs):
+        self.model = None
+
+    @component.output_types(embedding=List[float])
+    def run(self, text: str):
+        return {"embedding": [1.0, 0.0]}
+
+
+@component
+class EchoGenerator:
+    """把提示词原样作为回答返回，用于检查提示词里放了哪些内容"""
+    def __init__(self, **kwargs):
+        pass
+
+    @component.output_types(replies=List[str], meta=List[dict])
+    def run(self, prompt: str, streaming_callback=None):
+        return {"replies": [prompt], "meta": [{"finish_reason": "stop"}]}
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def timeline(monkeypatch):
+    timeline = []
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    monkeypatch.setenv("OPENAI_API_BASE_URL", "http://127.0.0.1:9/v1")
+    monkeypatch.setattr(StubFetcher, "timeline", timeline)
+    monkeypatch.setattr(StubFetcher, "delays", {})
+    monkeypatch.setattr(StubDocumentEmbedder, "timeline", timeline)
+    monkeypatch.setattr(rag, "SearXNGQueryFetcher", StubFetcher)
+    monkeypatch.setattr(rag, "LocalDocumentEmbedder", StubDocumentEmbedder)
+    monkeypatch.setattr(rag, "LocalTextEmbedder", StubTextEmbedder)
+    monkeypatch.setattr(rag, "CustomOpenAIGenerator", EchoGenerator)
+    return timeline
+
+
+def make_rag(**kwargs):
+    return rag.RAGSystem(use_siliconflow_embedder=False, search_cache_ttl=0, **kwargs)
+
+
+def written_urls(system):
+    return {doc.meta.get("url") for doc in system.document_store.storage.values()}
+
+
+def test_pages_are_ingested_as_each_crawl_finishes(timeline):
+    StubFetcher.delays = {"https://slow.example.com/c": 0.3}
+    system = make_rag()
+
+    async def scenario():
+        indexed = await system._ingest_stream("asyncio", "req-1")
+        await system.close()
+        return indexed
+
+    assert asyncio.run(scenario()) == 3
+    slow_crawled = timeline.index(("crawled", "https://slow.example.com/c"))
+    # 快的页面在最慢的页面抓取完成之前就已嵌入
+    assert timeline.index(("embedded", "https://fast.example.com/a")) < slow_crawled
+    assert timeline.index(("embedded", "https://fast.example.com/b")) < slow_crawled
+
+
+def test_enough_indexed_chunks_stop_waiting_for_slow_pages(timeline):
+    system = make_rag(min_indexed_chunks=2)
+
+    async def scenario():
+        start = time.monotonic()
+        await system._ingest_stream("asyncio", "req-1")
+        elapsed = time.monotonic() - start
+        await system.close()
+        return elapsed
+
+    assert asyncio.run(scenario()) < 1.0
+    assert ("crawled", "https://slow.example.com/c") not in timeline
+    contents = {doc.meta["url"]: doc.content for doc in system.document_store.storage.values()}
+    assert "fast page a" in contents["https://fast.example.com/a"]
+    # 未抓取完成的页面用搜索摘要代替
+    assert contents["https://slow.example.com/c"] == PAGES["https://slow.example.com/c"][2]
+
+
+def test_crawl_budget_falls_back_to_snippets(timeline):
+    StubFetcher.delays = {url: 10.0 for url in PAGES}
+    system = make_rag(latency_budget=0.4, drain_share=0.25)
+
+    async def scenario():
+        start = time.monotonic()
+        reply = await system.process_query("asyncio")
+        elapsed = time.monotonic() - start
+        await system.close()
+        return reply, elapsed
+
+    reply, elapsed = asyncio.run(scenario())
+    # 搜索、抓取和嵌入都在预算内结束，检索和生成不计入预算
+    assert elapsed < 1.0
+    assert not [event for event in timeline if event[0] == "crawled"]
+    for _, _, snippet in PAGES.values():
+        assert snippet in reply
+    # 请求结束后未保留的文档被删除
+    assert not system.document_store.storage
+
+
+def test_fast_mode_answers_from_snippets_without_crawling(timeline):
+    system = make_rag()
+
+    async def scenario():
+        reply = await system.process_query("asyncio", mode="fast")
+        await system.close()
+        return reply
+
+    reply = asyncio.run(scenario())
+    assert PAGES["https://fast.example.com/a"][2] in reply
+    assert system.fetcher.crawler_pool.calls == []
+    assert timeline == []
+    assert not system.document_store.storage
+
+
+def test_hybrid_mode_answers_from_snippets_and_keeps_crawled_chunks(timeline):
+    StubFetcher.delays = {"https://slow.example.com/c": 0.05}
+    system = make_rag(retrieval_scope="all")
+
+    async def scenario():
+        reply = await system.process_query("asyncio", mode="hybrid")
+        # 回答不等待后台抓取
+        crawled_before_reply = [event for event in timeline if event[0] == "crawled"]
+        await asyncio.gather(*list(system._background_tasks))
+        await system.close()
+        return reply, crawled_before_reply
+
+    reply, crawled_before_reply = asyncio.run(scenario())
+    assert PAGES["https://fast.example.com/a"][2] in reply
+    assert "fast page a" not in reply
+    assert crawled_before_reply == []
+    assert written_urls(system) == set(PAGES)
+    assert len(system.document_store.kept_namespaces()) == 1
+    kept = system.document_store.kept_documents()
+    assert any("slow page c" in doc.content for doc in kept)
@@ -0,0 +1,52 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+pytest.importorskip("haystack")
+
+from custom_haystack.components.fetcher.SearchResultCache import SearchResultCache
+
+
+def test_disk_promotion_keeps_fetched_at(tmp_path, monkeypatch):
+    now = time.time()
+    cache = SearchResultCache(ttl=10, stale_ttl=20, cache_dir=str(tmp_path))
+    key = cache.key("今天 星期几?", "zh-CN", 1, "general", 1)
+    with open(tmp_path / f"{key}.json", "w", encoding="utf-8") as f:
+        json.dump({"results": [{"url": "https://example.com"}], "fetched_at": now - 25}, f)
+
+    results, stale = cache.get(key)
+    assert results == [{"url": "https://example.com"}]
+    assert stale
+
+    # 距获取时间超过ttl + stale_ttl后，提升到内存的条目也要失效
+    monkeypatch.setattr(time, "time", lambda: now + 10)
+    assert cache.get(key) is None
+
+
+def test_async_disk_roundtrip(tmp_path):
+    async def roundtrip():
+        key = SearchResultCache.key("python asyncio", "en", 1, "general", 1)
+        await SearchResultCache(cache_dir=str(tmp_path)).put_async(key, [{"url": "https://example.com"}])
+        return await SearchResultCache(cache_dir=str(tmp_path)).get_async(key)
+
+    assert asyncio.run(roundtrip()) == ([{"url": "https://example.com"}], False)
+
+
+@pytest.mark.parametrize("query, other", [
+    ("C# tutorial", "C tutorial"),
+    ("F#", "f"),
+    (".NET 8", "NET 8"),
+])
+def test_key_keeps_punctuation_inside_tokens(query, other):
+    assert SearchResultCache.key(query, "en", 1, "general", 1) != SearchResultCache.key(other, "en", 1, "general", 1)
+
+
+@pytest.mark.parametrize("query, other", [
+    ("今天 星期几?", "今天，星期几？"),
+    ("  Hello, World! ", "hello world"),
+    ("「Python」 asyncio", "python asyncio"),
+])
+def test_key_ignores_edge_punctuation(query, other):
+    assert SearchResultCache.key(query, "en", 1, "general", 1) == SearchResultCache.key(other, "en", 1, "general", 1)
@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("haystack")
+pytest.importorskip("crawl4ai")
+pytest.importorskip("aiohttp")
+
+from aiohttp import web
+
+from custom_haystack.components.fetcher.SearxngFetcher import SearXNGQueryFetcher
+
+
+class StubSearxng:
+    """本地的SearXNG替身，每页返回per_page条结果，记录请求的页码、并发数和连接"""
+    def __init__(self, per_page=2, pages=3, delay=0.0, status=200):
+        self.per_page = per_page
+        self.pages = pages
+        self.delay = delay
+        self.status = status
+        self.requests = []
+        self.peers = set()
+        self.in_flight = 0
+        self.peak = 0
+
+    async def search(self, request):
+        query, pageno = request.query["q"], int(request.query["pageno"])
+        self.requests.append((query, pageno))
+        self.peers.add(request.transport.get_extra_info("peername"))
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if self.status != 200:
+            return web.Response(status=self.status, text="rate limited")
+        if pageno > self.pages:
+            return web.json_response({"results": []})
+        return web.json_response({"results": [
+            {"url": f"https://example.com/{query}/{pageno}/{i}", "title": f"{query} {i}", "content": f"{query} snippet {i}"}
+            for i in range(self.per_page)
+        ]})
+
+
+async def run_with_server(stub, scenario, **kwargs):
+    app = web.Application()
+    app.router.add_get("/search", stub.search)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    fetcher = SearXNGQueryFetcher(searxng_url=f"http://127.0.0.1:{port}/", **kwargs)
+    try:
+        return await scenario(fetcher)
+    finally:
+        await fetcher.close()
+        await runner.cleanup()
+
+
+def test_pages_until_enough_results():
+    stub = StubSearxng(per_page=2)
+
+    async def scenario(fetcher):
+        return await fetcher.search(["python"])
+
+    results = asyncio.run(run_with_server(stub, scenario, result_per_query=3, max_pages=5))
+    assert len(results) == 3
+    assert [pageno for _, pageno in stub.requests] == [1, 2]
+
+
+def test_paging_stops_at_max_pages():
+    stub = StubSearxng(per_page=2, pages=10)
+
+    async def scenario(fetcher):
+        return await fetcher.search(["python"])
+
+    results = asyncio.run(run_with_server(stub, scenario, result_per_query=10, max_pages=3))
+    assert len(results) == 6
+    assert [pageno for _, pageno in stub.requests] == [1, 2, 3]
+
+
+def test_paging_stops_when_a_page_is_empty():
+    stub = StubSearxng(per_page=2, pages=1)
+
+    async def scenario(fetcher):
+        return await fetcher.search(["python"])
+
+    results = asyncio.run(run_with_server(stub, scenario, result_per_query=10, max_pages=3))
+    assert len(results) == 2
+    assert [pageno for _, pageno in stub.requests] == [1, 2]
+
+
+def test_concurrent_queries_are_limited():
+    stub = StubSearxng(per_page=1, pages=1, delay=0.05)
+
+    async def scenario(fetcher):
+        return await fetcher.search([f"q{i}" for i in range(6)])
+
+    results = asyncio.run(run_with_server(stub, scenario, result_per_query=1, max_concurrent_queries=2))
+    assert len(results) == 6
+    assert stub.peak == 2
+
+
+def test_session_is_reused_across_searches():
+    stub = StubSearxng(per_page=1, pages=1)
+
+    async def scenario(fetcher):
+        await fetcher.search(["first"])
+        session = fetcher._session
+        await fetcher.search(["second"])
+        return session, fetcher._session
+
+    first, second = asyncio.run(run_with_server(stub, scenario, result_per_query=1))
+    assert first is second
+    # keep-alive连接在两次搜索之间复用
+    assert len(stub.peers) == 1
+
+
+def test_failed_search_returns_no_results():
+    stub = StubSearxng(status=429)
+
+    async def scenario(fetcher):
+        return await fetcher.search(["python"])
+
+    assert asyncio.run(run_with_server(stub, scenario)) == []
+    assert len(stub.requests) == 1
+
+
+def test_snippet_documents():
+    fetcher = SearXNGQueryFetcher()
+    documents = fetcher.snippet_documents([
+        {"url": "https://example.com/a", "title": "A", "content": "摘要A", "score": 1.5},
+        {"url": "https://example.com/b", "title": "B", "content": ""},
+    ], request_id="req-1")
+    assert len(documents) == 1
+    doc = documents[0]
+    assert doc.content == "摘要A"
+    assert doc.meta["url"] == "https://example.com/a"
+    assert doc.meta["title"] == "A"
+    assert doc.meta["request_id"] == "req-1"
+    assert doc.meta["source_id"] == doc.id
@@ -0,0 +1,75 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+pytest.importorskip("haystack")
+aiohttp = pytest.importorskip("aiohttp")
+
+from custom_haystack.components.embedders import SiliconFlowDocumentEmberdder
+from custom_haystack.utils import tokenization
+
+
+@pytest.fixture(autouse=True)
+def offline_tokenizer(monkeypatch):
+    # 不下载分词器，按字符估算token
+    monkeypatch.setattr(tokenization, "get_tokenizer", lambda name: None)
+
+
+def response_error(status, headers=None):
+    url = aiohttp.client.URL("https://api.siliconflow.cn/v1/embeddings")
+    request_info = aiohttp.RequestInfo(url, "POST", {}, url)
+    return aiohttp.ClientResponseError(request_info, (), status=status, headers=headers)
+
+
+def test_client_error_drops_only_the_bad_texts(monkeypatch):
+    embedder = SiliconFlowDocumentEmberdder(api_key="test")
+    requests = []
+
+    async def post_batch(texts):
+        requests.append(list(texts))
+        if "too long" in texts:
+            raise response_error(413)
+        return [[float(len(text))] for text in texts]
+
+    monkeypatch.setattr(embedder, "_post_batch", post_batch)
+    texts = ["a", "bb", "too long", "dddd"]
+    embeddings = asyncio.run(embedder._embed_batch(texts, asyncio.Semaphore(2)))
+    assert embeddings == [[1.0], [2.0], None, [4.0]]
+    # 4xx不重试，只二分
+    assert requests.count(["too long"]) == 1
+
+
+def test_retry_after_is_capped(monkeypatch):
+    embedder = SiliconFlowDocumentEmberdder(api_key="test", max_retry_after=2)
+    delays = []
+    attempts = iter([response_error(429, {"Retry-After": "3600"})])
+
+    async def post_batch(texts):
+        error = next(attempts, None)
+        if error is not None:
+            raise error
+        return [[1.0] for _ in texts]
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(embedder, "_post_batch", post_batch)
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    assert asyncio.run(embedder._embed_batch(["a"], asyncio.Semaphore(1))) == [[1.0]]
+    assert delays == [2]
+
+
+def test_retry_after_accepts_http_dates():
+    embedder = SiliconFlowDocumentEmberdder(api_key="test", max_retry_after=30)
+    soon = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=10), usegmt=True)
+    later = format_datetime(datetime.now(timezone.utc) + timedelta(hours=1), usegmt=True)
+    past = format_datetime(datetime.now(timezone.utc) - timedelta(minutes=1), usegmt=True)
+    assert 8 <= embedder._retry_after({"Retry-After": soon}) <= 10
+    assert embedder._retry_after({"Retry-After": later}) == 30
+    assert embedder._retry_after({"Retry-After": past}) == 0
+    assert embedder._retry_after({"Retry-After": "5"}) == 5
+    assert embedder._retry_after({"Retry-After": "soon"}) is None
+    assert embedder._retry_after({}) is None
+    assert embedder._retry_after(None) is None
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("haystack")
+pytest.importorskip("aiohttp")
+
+from custom_haystack.components.embedders import SiliconFlowTextEmbedder
+
+
+class FakeResponse:
+    def __init__(self, embedding):
+        self.embedding = embedding
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    async def json(self):
+        return {"data": [{"embedding": self.embedding}]}
+
+
+class FakeSession:
+    """代替aiohttp.ClientSession，记录每次POST的输入"""
+    closed = False
+
+    def __init__(self):
+        self.inputs = []
+
+    def post(self, url, json):
+        self.inputs.append(json["input"])
+        return FakeResponse([float(len(json["input"])), 1.0])
+
+    async def close(self):
+        self.closed = True
+
+
+def test_run_async_reuses_session_and_caches_queries():
+    embedder = SiliconFlowTextEmbedder(api_key="test")
+    session = embedder._session = FakeSession()
+
+    async def scenario():
+        first = await embedder.run_async(text="你好")
+        second = await embedder.run_async(text="你好")
+        other = await embedder.run_async(text="hello")
+        return first, second, other
+
+    first, second, other = asyncio.run(scenario())
+    assert first == second == {"embedding": [2.0, 1.0]}
+    assert other == {"embedding": [5.0, 1.0]}
+    # 第二次相同查询命中LRU，不发请求；两次请求使用同一个会话
+    assert session.inputs == ["你好", "hello"]
+    assert embedder._get_session() is session
+
+
+def test_cache_can_be_disabled():
+    embedder = SiliconFlowTextEmbedder(api_key="test", cache_size=0)
+    session = embedder._session = FakeSession()
+
+    async def scenario():
+        await embedder.run_async(text="你好")
+        await embedder.run_async(text="你好")
+
+    asyncio.run(scenario())
+    assert session.inputs == ["你好", "你好"]
+
+
+def test_sync_run_shares_the_query_cache(monkeypatch):
+    embedder = SiliconFlowTextEmbedder(api_key="test")
+    embedder._session = FakeSession()
+    asyncio.run(embedder.run_async(text="你好"))
+
+    def post(*args, **kwargs):
+        raise AssertionError("cached query should not be requested")
+
+    monkeypatch.setattr("requests.post", post)
+    assert embedder.run(text="你好") == {"embedding": [2.0, 1.0]}
@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("haystack")
+
+from custom_haystack.document_stores import NumpyVectorIndex, HnswVectorIndex
+
+
+def test_numpy_index_empty_snapshot_roundtrip(tmp_path):
+    NumpyVectorIndex().save(str(tmp_path))
+    index = NumpyVectorIndex()
+    index.load(str(tmp_path))
+    assert len(index) == 0
+    assert index.search([0.1, 0.2], top_k=3) == []
+
+
+def test_hnsw_index_empty_snapshot_roundtrip(tmp_path):
+    pytest.importorskip("hnswlib")
+    HnswVectorIndex().save(str(tmp_path))
+    assert (tmp_path / "hnsw.json").exists()
+    index = HnswVectorIndex()
+    index.load(str(tmp_path))
+    assert len(index) == 0
+    assert index.search([0.1, 0.2], top_k=3) == []
+
+
+def test_hnsw_index_load_missing_snapshot(tmp_path):
+    pytest.importorskip("hnswlib")
+    index = HnswVectorIndex()
+    index.load(str(tmp_path / "missing"))
+    assert len(index) == 0
+
+
+def test_hnsw_index_snapshot_roundtrip(tmp_path):
+    pytest.importorskip("hnswlib")
+    index = HnswVectorIndex()
+    index.add(["doc-1", "doc-2"], [[1.0, 0.0], [0.0, 1.0]], namespaces=["req-1", None])
+    index.save(str(tmp_path))
+    restored = HnswVectorIndex()
+    restored.load(str(tmp_path))
+    assert sorted(restored.ids()) == ["doc-1", "doc-2"]
+    assert restored.search([1.0, 0.0], top_k=1, namespace="req-1")[0][0] == "doc-1"